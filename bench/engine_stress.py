@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2013-2018 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Stress the engine layer (UciEngine, Informer, BEST_MOVE handling) with the stub engine - no real engine needed.
+
+Usage: bench/engine_stress.py [-i 5000] [-n 20] [-l 0.2] [-c 0] [-r] [-s]
+With -c and -r the crashed engine gets respawned - the recovery time is in the engine latency stats.
+"""
+
+import sys
+import os
+import time
+import queue
+import argparse
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+import chess  # noqa: E402 (needs the path above)
+import chess.uci  # noqa: E402
+from dgt.api import Event  # noqa: E402
+from utilities import evtobserver_queue  # noqa: E402
+from uci.engine import UciShell, UciEngine  # noqa: E402
+from uci.stub import STUB_FILE, stub_args  # noqa: E402
+
+
+class LineCounter(chess.uci.InfoHandler):
+
+    """Count the info lines python-chess received from the engine."""
+
+    def __init__(self):
+        super(LineCounter, self).__init__()
+        self.lines = 0
+
+    def pre_info(self, line):
+        """Count each info line."""
+        self.lines += 1
+        super(LineCounter, self).pre_info(line)
+
+
+def wait_best_move(events: Counter, timeout: float):
+    """Collect the events till a BEST_MOVE arrives - return its time (or None)."""
+    end = time.time() + timeout
+    while time.time() < end:
+        try:
+            event = evtobserver_queue.get(timeout=end - time.time())
+        except queue.Empty:
+            break
+        events[repr(event)] += 1
+        if isinstance(event, Event.BEST_MOVE):
+            return time.time()
+    return None
+
+
+def percentile(values: list, perc: int):
+    """Return the percentile (in ms) of the values."""
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * perc / 100))] * 1000, 1)
+
+
+def main():
+    """Run go and ponder/stop cycles against the stub engine and report the numbers."""
+    parser = argparse.ArgumentParser(description='picochess engine layer stress test')
+    parser.add_argument('-i', '--info-rate', type=int, default=5000, help='info lines per sec the engine sends')
+    parser.add_argument('-n', '--searches', type=int, default=20, help='number of go (and ponder) searches')
+    parser.add_argument('-l', '--latency', type=float, default=0.2, help='secs the engine needs for a move')
+    parser.add_argument('-c', '--crash-after', type=int, default=0, help='let the engine crash in the n-th search')
+    parser.add_argument('-r', '--recover', action='store_true', help='respawn a crashed engine')
+    parser.add_argument('-s', '--spare', action='store_true', help='respawn it from a warm spare process')
+    args = parser.parse_args()
+
+    engine = UciEngine(file=STUB_FILE, uci_shell=UciShell(),
+                       args=stub_args(args.latency, info_rate=args.info_rate, crash_after=args.crash_after))
+    counter = LineCounter()
+    engine.engine.info_handlers.append(counter)
+    if args.recover:
+        engine.set_supervision(args.spare)
+    engine.startup({}, chess.Board())
+
+    events = Counter()
+    overheads, stop_times, lost = [], [], 0
+    board = chess.Board()
+    start = time.time()
+    for search in range(args.searches):
+        engine.position(board)
+        sent = time.time()
+        engine.go({'movetime': int(args.latency * 1000)})
+        arrived = wait_best_move(events, args.latency + 5)
+        if arrived is None:
+            lost += 1
+            print('search {}: no best move (engine crashed?)'.format(search + 1))
+            break
+        overheads.append(arrived - sent - args.latency)
+
+        engine.position(board)
+        engine.ponder()
+        time.sleep(args.latency)
+        sent = time.time()
+        engine.stop()
+        stop_times.append(time.time() - sent)
+    duration = time.time() - start
+    while not evtobserver_queue.empty():
+        events[repr(evtobserver_queue.get())] += 1
+
+    print('info lines received: {} ({:.0f}/sec)'.format(counter.lines, counter.lines / duration))
+    print('events fired:', dict(events))
+    print('best move overhead p50: {}ms p90: {}ms max: {}ms'.format(
+        percentile(overheads, 50), percentile(overheads, 90), percentile(overheads, 100)))
+    print('stop p50: {}ms p90: {}ms max: {}ms'.format(
+        percentile(stop_times, 50), percentile(stop_times, 90), percentile(stop_times, 100)))
+    print('engine latency stats:', engine.get_latency())
+    if lost:
+        print('lost best moves:', lost)
+    try:
+        engine.quit()
+    except chess.uci.EngineTerminatedException:
+        pass
+
+
+if __name__ == '__main__':
+    main()
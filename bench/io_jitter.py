@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2013-2018 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure how late the board polling loop wakes up - idle, under full engine load, and with the engine isolated.
+
+The load is a real engine searching "go infinite" (-e) or one busy process per core.
+Usage: bench/io_jitter.py [-e engines/armv7l/a-stockf] [-s 10] [-c 1-3] [-n 10] [-i -5]
+"""
+
+import sys
+import os
+import time
+import argparse
+import threading
+import subprocess
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)))
+from scheduling import Scheduler  # noqa: E402 (needs the path above)
+
+
+def start_load(engine_file: str):
+    """Start the cpu load - return its processes."""
+    if engine_file:
+        threads = os.cpu_count() or 1
+        proc = subprocess.Popen([engine_file], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                universal_newlines=True)
+        proc.stdin.write('uci\nsetoption name Threads value {}\nisready\ngo infinite\n'.format(threads))
+        proc.stdin.flush()
+        return [proc]
+    return [subprocess.Popen([sys.executable, '-c', 'while True: pass']) for _ in range(os.cpu_count() or 1)]
+
+
+def stop_load(procs: list):
+    """Stop the cpu load."""
+    for proc in procs:
+        proc.kill()
+        proc.wait()
+
+
+def poll(scheduler: Scheduler, secs: float):
+    """Run a board like polling loop (0.1secs) for secs in its own thread."""
+    def _loop():
+        scheduler.io_thread('board')
+        end = time.monotonic() + secs
+        while time.monotonic() < end:
+            scheduler.sleep('board', 0.1)
+    thread = threading.Thread(target=_loop)
+    thread.start()
+    thread.join()
+    return scheduler.stats()['wakeup_late'].get('board')
+
+
+def main():
+    """Run the three phases and print the board wakeup lateness (in ms) of each."""
+    parser = argparse.ArgumentParser(description='picochess board reading under engine load')
+    parser.add_argument('-e', '--engine', type=str, default=None, help='engine file for the load (else busy loops)')
+    parser.add_argument('-s', '--secs', type=float, default=10, help='secs each phase runs')
+    parser.add_argument('-c', '--engine-cores', type=str, default=None, help="engine cores such as '1-3'")
+    parser.add_argument('-n', '--engine-nice', type=int, default=10, help='nice value of the engine')
+    parser.add_argument('-i', '--io-nice', type=int, default=0, help='nice value of the polling thread')
+    args = parser.parse_args()
+
+    print('idle              :', poll(Scheduler(), args.secs))
+
+    procs = start_load(args.engine)
+    try:
+        print('engine load       :', poll(Scheduler(), args.secs))
+        scheduler = Scheduler()
+        scheduler.configure(args.engine_cores, args.engine_nice, args.io_nice)
+        for proc in procs:
+            scheduler.pin_engine(proc.pid)
+        print('engine isolated   :', poll(scheduler, args.secs))
+        print('config            :', {key: val for key, val in scheduler.stats().items() if key != 'wakeup_late'})
+    finally:
+        stop_load(procs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2013-2018 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""End-to-end latency benchmark: drive picochess with a virtual DGT board (on a pty) and the uci stub engine.
+
+Measured per move (all in ms):
+  board_clock     last board byte in => first clock command out
+  board_go        last board byte in => engine receives "go"
+  bestmove_clock  engine sends "bestmove" => first clock command out
+plus the cpu use, the max thread count and the max rss of the picochess process.
+
+Usage: bench/latency.py [-s standard slides takebacks bullet] [-o result.json] [-c baseline.json -t 20]
+"""
+
+import sys
+import os
+import pty
+import tty
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+
+PROGRAM_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, PROGRAM_PATH)
+import chess  # noqa: E402 (needs the path above)
+
+# Morphy's opera game - captures, checks, long castling and a mate
+GAME = ('e4 e5 Nf3 d6 d4 Bg4 dxe5 Bxf3 Qxf3 dxe5 Bc4 Nf6 Qb3 Qe7 Nc3 c6 Bg5 b5 Nxb5 cxb5 Bxb5+ Nbd7 O-O-O Rd8 '
+        'Rxd7 Rxd7 Rd1 Qe6 Bxd7+ Nxd7 Qb8+ Nxb8 Rd8#')
+
+PIECE_CODES = {'P': 0x01, 'R': 0x02, 'N': 0x03, 'B': 0x04, 'K': 0x05, 'Q': 0x06,
+               'p': 0x07, 'r': 0x08, 'n': 0x09, 'b': 0x0a, 'k': 0x0b, 'q': 0x0c}
+
+SCENARIOS = {
+    # name: (time control, engine latency, pause between user actions, slide moves, takeback every n moves)
+    'standard': ('5 0', 0.1, 0.5, False, 0),
+    'slides': ('5 0', 0.1, 0.5, True, 0),
+    'takebacks': ('5 0', 0.1, 0.5, False, 3),
+    'bullet': ('1 0', 0.01, 0.0, False, 0),
+}
+
+
+def square_index(square: int):
+    """Return the dgt board index (a8=0 ... h1=63) of a python-chess square."""
+    return (7 - chess.square_rank(square)) * 8 + chess.square_file(square)
+
+
+class VirtualBoard(object):
+
+    """Emulate a DGT board with a DGT3000 clock on the master side of a pty."""
+
+    def __init__(self):
+        super(VirtualBoard, self).__init__()
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.device = os.ttyname(self.slave)
+        self.board = chess.Board()
+        self.write_lock = threading.Lock()
+        self.condition = threading.Condition()
+        self.clock_commands = []  # time stamps of all received clock commands
+        self.board_requests = 0
+        self.last_write = 0.0
+        threading.Thread(target=self._read_forever, daemon=True).start()
+
+    def _write(self, data: list):
+        with self.write_lock:
+            os.write(self.master, bytes(data))
+            self.last_write = time.time()
+
+    def _read(self, count: int):
+        data = b''
+        while len(data) < count:
+            data += os.read(self.master, count - len(data))
+        return data
+
+    def _dump(self):
+        squares = [0] * 64
+        for square, piece in self.board.piece_map().items():
+            squares[square_index(square)] = PIECE_CODES[piece.symbol()]
+        return squares
+
+    def _answer_clock(self, command: int):
+        version = 0x21 if command == 0x09 else 0x00
+        self._write([0x8d, 0x00, 0x0a, 0x0a, 0x10, command, 0x0a, version, 0x00, 0x00])
+
+    def _read_forever(self):
+        while True:
+            try:
+                command = self._read(1)[0]
+            except OSError:
+                return
+            if command in (0x2b, 0x60):  # clock message & revelation leds have a length byte
+                length = self._read(1)[0]
+                payload = self._read(length)
+                if command == 0x2b:
+                    with self.condition:
+                        self.clock_commands.append(time.time())
+                        self.condition.notify_all()
+                    self._answer_clock(payload[1])  # payload[0] is the start byte
+            elif command == 0x42:  # send board
+                with self.condition:
+                    self.board_requests += 1
+                    self.condition.notify_all()
+                self._write([0x86, 0x00, 0x43] + self._dump())
+            elif command == 0x4d:  # send version
+                self._write([0x93, 0x00, 0x05, 0x03, 0x01])
+            elif command == 0x45:  # serial number
+                self._write([0x91, 0x00, 0x08] + list(b'00001'))
+
+    def _field_update(self, square: int, piece):
+        self._write([0x8e, 0x00, 0x05, square_index(square), PIECE_CODES[piece.symbol()] if piece else 0x00])
+
+    def set_position(self, board: chess.Board, slide_via=None):
+        """Move the pieces on the board till it shows the given position - like a human, removing pieces first."""
+        old_map, new_map = self.board.piece_map(), board.piece_map()
+        removed = [square for square in old_map if new_map.get(square) != old_map[square]]
+        placed = [square for square in new_map if old_map.get(square) != new_map[square]]
+        self.board = board.copy()
+        for square in removed:
+            self._field_update(square, None)
+        for square in placed:
+            if slide_via is not None:
+                self._field_update(slide_via, new_map[square])  # the piece is shortly on the way square
+                time.sleep(0.03)
+                self._field_update(slide_via, old_map.get(slide_via))
+            self._field_update(square, new_map[square])
+        return self.last_write
+
+    def wait_clock(self, after: float, timeout=5.0):
+        """Return the time of the first clock command after the given time (or None)."""
+        end = time.time() + timeout
+        with self.condition:
+            while True:
+                for stamp in self.clock_commands:
+                    if stamp > after:
+                        return stamp
+                remaining = end - time.time()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+    def wait_board_request(self, timeout=60.0):
+        """Wait till picochess asked for the board the first time."""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.board_requests, timeout)
+
+    def close(self):
+        """Close the pty."""
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class EngineLog(object):
+
+    """Read the time stamped go & bestmove lines of the stub engine."""
+
+    def __init__(self, file_name: str):
+        super(EngineLog, self).__init__()
+        self.file_name = file_name
+
+    def wait(self, what: str, after: float, timeout=10.0):
+        """Return the time of the first "what" line after the given time (or None)."""
+        end = time.time() + timeout
+        while time.time() < end:
+            try:
+                with open(self.file_name) as log:
+                    for line in log:
+                        stamp, command = line.split()[:2]
+                        if command == what and float(stamp) > after:
+                            return float(stamp)
+            except OSError:
+                pass
+            time.sleep(0.005)
+        return None
+
+
+class ProcessStats(threading.Thread):
+
+    """Sample the thread count and rss of a process and measure its cpu use."""
+
+    def __init__(self, pid: int):
+        super(ProcessStats, self).__init__(daemon=True)
+        self.pid = pid
+        self.threads_max = 0
+        self.rss_max = 0
+        self.running = True
+        self.start_cpu = self._cpu()
+        self.start_time = time.time()
+
+    def _cpu(self):
+        try:
+            with open('/proc/{}/stat'.format(self.pid)) as stat:
+                fields = stat.read().rsplit(')', 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        except OSError:
+            return 0.0
+
+    def run(self):
+        """Sample the /proc values twice a second."""
+        while self.running:
+            try:
+                with open('/proc/{}/status'.format(self.pid)) as status:
+                    for line in status:
+                        if line.startswith('Threads:'):
+                            self.threads_max = max(self.threads_max, int(line.split()[1]))
+                        elif line.startswith('VmRSS:'):
+                            self.rss_max = max(self.rss_max, int(line.split()[1]))
+            except OSError:
+                break
+            time.sleep(0.5)
+
+    def result(self):
+        """Stop sampling and return the stats."""
+        self.running = False
+        wall = time.time() - self.start_time
+        cpu = self._cpu() - self.start_cpu
+        return {'cpu_percent': round(100 * cpu / wall, 1) if wall else 0.0,
+                'threads_max': self.threads_max, 'rss_max_kb': self.rss_max}
+
+
+def percentiles(values: list):
+    """Return the count, p50, p90, p99 and max of the values (in ms)."""
+    if not values:
+        return {'n': 0}
+    values = sorted(values)
+
+    def _perc(perc):
+        return round(values[min(len(values) - 1, int(len(values) * perc / 100))] * 1000, 1)
+    return {'n': len(values), 'p50': _perc(50), 'p90': _perc(90), 'p99': _perc(99), 'max': _perc(100)}
+
+
+def build_workdir(engine_latency: float, moves: list):
+    """Create a picochess copy (by symlinks) with own games/logs folders and only the stub engine installed."""
+    workdir = tempfile.mkdtemp(prefix='picobench-')
+    private = ('engines', 'games', 'logs', 'mail', 'picochess.ini', 'location.json')
+    for name in os.listdir(PROGRAM_PATH):
+        if name not in private and not name.startswith('.'):
+            os.symlink(os.path.join(PROGRAM_PATH, name), os.path.join(workdir, name))
+    for name in ('games', 'logs'):
+        os.mkdir(os.path.join(workdir, name))
+    engine_path = os.path.join(workdir, 'engines', platform.machine())
+    os.makedirs(engine_path)
+    with open(os.path.join(workdir, 'script.txt'), 'w') as script:
+        script.write(' '.join(moves))
+    with open(os.path.join(engine_path, 'stub'), 'w') as stub:
+        stub.write('#!/bin/sh\nexec {} {} --latency {} --script {} --log {}\n'.format(
+            sys.executable, os.path.join(PROGRAM_PATH, 'uci', 'stub.py'), engine_latency,
+            os.path.join(workdir, 'script.txt'), os.path.join(workdir, 'engine.log')))
+    os.chmod(os.path.join(engine_path, 'stub'), 0o755)
+    with open(os.path.join(engine_path, 'engines.ini'), 'w') as ini:
+        ini.write('[stub]\nname = PicoStub\nsmall = stub\nmedium = PicoStub\nlarge = PicoStub\nelo = 1000\n')
+    return workdir
+
+
+def run_scenario(name: str, verbose: bool):
+    """Play the game in the given scenario and return the measured values."""
+    time_control, engine_latency, pause, slides, takeback_every = SCENARIOS[name]
+    board = chess.Board()
+    moves = []
+    for san in GAME.split():
+        moves.append(board.push_san(san).uci())
+
+    workdir = build_workdir(engine_latency, moves)
+    vboard = VirtualBoard()
+    engine_log = EngineLog(os.path.join(workdir, 'engine.log'))
+    command = [sys.executable, 'picochess.py', '--dgt-port', vboard.device, '--engine', 'stub',
+               '--time', time_control, '--log-level', 'debug' if verbose else 'warning', '--log-file', 'bench.log']
+    proc = subprocess.Popen(command, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {'board_clock': [], 'board_go': [], 'bestmove_clock': [], 'errors': 0}
+    try:
+        if not vboard.wait_board_request():
+            raise RuntimeError('picochess didnt ask for the board')
+        time.sleep(3)  # let the startup messages pass
+        stats = ProcessStats(proc.pid)
+        stats.start()
+
+        game = chess.Board()
+        ply = 0
+        while ply < len(moves):
+            user_move = chess.Move.from_uci(moves[ply])
+            game.push(user_move)
+            slide_via = None
+            if slides:  # the piece touches the first square on its way for a moment
+                between = chess.SquareSet(chess.BB_BETWEEN[user_move.from_square][user_move.to_square])
+                slide_via = next(iter(between), None)
+            sent = vboard.set_position(game, slide_via=slide_via)
+            clock = vboard.wait_clock(sent)
+            if clock:
+                result['board_clock'].append(clock - sent)
+            if game.is_game_over() or ply + 1 >= len(moves):
+                break
+            go_time = engine_log.wait('go', sent)
+            best_time = engine_log.wait('bestmove', sent)
+            if go_time is None or best_time is None:
+                result['errors'] += 1
+                break
+            result['board_go'].append(go_time - sent)
+            clock = vboard.wait_clock(best_time)
+            if clock:
+                result['bestmove_clock'].append(clock - best_time)
+            time.sleep(pause)
+
+            game.push(chess.Move.from_uci(moves[ply + 1]))
+            sent = vboard.set_position(game)
+            clock = vboard.wait_clock(sent)
+            if clock:
+                result['board_clock'].append(clock - sent)
+            ply += 2
+            time.sleep(pause)
+
+            if takeback_every and (ply // 2) % takeback_every == 0 and ply < len(moves) - 1:
+                game.pop()
+                game.pop()
+                sent = vboard.set_position(game)  # take back the last move pair - user replays it next
+                clock = vboard.wait_clock(sent)
+                if clock:
+                    result['board_clock'].append(clock - sent)
+                ply -= 2
+                time.sleep(pause)
+        result.update(stats.result())
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        vboard.close()
+        if verbose:
+            print('picochess log kept in', workdir)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    for metric in ('board_clock', 'board_go', 'bestmove_clock'):
+        result[metric] = percentiles(result[metric])
+    return result
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """Return the list of p90 values which got worse than the baseline (plus the tolerance in percent)."""
+    regressions = []
+    for scenario, metrics in results.items():
+        for metric, values in metrics.items():
+            old = baseline.get(scenario, {}).get(metric)
+            if not isinstance(values, dict) or not isinstance(old, dict) or 'p90' not in values or 'p90' not in old:
+                continue
+            if values['p90'] > old['p90'] * (1 + tolerance / 100) and values['p90'] - old['p90'] > 5:
+                regressions.append('{} {}: p90 {}ms (was {}ms)'.format(scenario, metric, values['p90'], old['p90']))
+    return regressions
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description='picochess end-to-end latency benchmark')
+    parser.add_argument('-s', '--scenarios', nargs='+', choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument('-o', '--output', type=str, help='write the results as json to this file')
+    parser.add_argument('-c', '--compare', type=str, help='json file of an earlier run to compare with')
+    parser.add_argument('-t', '--tolerance', type=float, default=20, help='allowed p90 regression in percent')
+    parser.add_argument('-v', '--verbose', action='store_true', help='keep the picochess debug log')
+    args = parser.parse_args()
+
+    results = {}
+    for scenario in args.scenarios:
+        results[scenario] = run_scenario(scenario, args.verbose)
+        print('{:<10}'.format(scenario), json.dumps(results[scenario]), flush=True)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION', regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
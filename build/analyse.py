@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2013-2018 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Annotate the stored games with engine evals and bad moves - one engine process per core.
+
+A stopped run continues with the games not written yet.
+Usage: build/analyse.py [-i games/games.pgn] [-o games/games-analysed.pgn] [-e a-stockf] [-l Level@20] [-t 500]
+"""
+
+import sys
+import os
+import argparse
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from uci.batch import BatchAnalysis, find_engine, host_cores  # noqa: E402 (needs the path above)
+
+
+def main():
+    """Run the analysis and print the throughput."""
+    parser = argparse.ArgumentParser(description='picochess batch analysis of the stored games')
+    parser.add_argument('-i', '--input', type=str, default='games' + os.sep + 'games.pgn', help='pgn archive')
+    parser.add_argument('-o', '--output', type=str, default=None, help='annotated pgn (default: <input>-analysed)')
+    parser.add_argument('-e', '--engine', type=str, default=None, help='engine (file or name) out of engines.ini')
+    parser.add_argument('-ep', '--engine-path', type=str, default=None, help='folder of engines.ini (default: local)')
+    parser.add_argument('-l', '--level', type=str, default=None, help='engine level (section of its .uci file)')
+    parser.add_argument('-t', '--movetime', type=int, default=500, help='msecs per position')
+    parser.add_argument('-d', '--depth', type=int, default=None, help='search depth per position (instead of time)')
+    parser.add_argument('-w', '--workers', type=int, default=host_cores(), help='engine processes')
+    args = parser.parse_args()
+
+    root, ext = os.path.splitext(args.input)
+    output = args.output or root + '-analysed' + ext
+    limits = {'depth': args.depth} if args.depth else {'movetime': args.movetime}
+    entry = find_engine(args.engine, args.engine_path)
+    analysis = BatchAnalysis(args.input, output, entry, args.level, args.workers, limits)
+
+    def _progress(games, positions, secs):
+        if secs:
+            print('\r{} games {} positions {:.1f} positions/sec'.format(games, positions, positions / secs), end='')
+
+    try:
+        stats = analysis.run(_progress)
+    except RuntimeError as exc:
+        sys.exit('\n' + str(exc))
+    print('\n{} written: {}'.format(output, stats))
+
+
+if __name__ == '__main__':
+    main()
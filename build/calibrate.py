@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2013-2018 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Play engines & levels out of engines.ini against each other and estimate their elo - one game per core.
+
+Each book opening is played with both colors by each pair of players. The estimates get anchored to the mean of
+the nominal elos (engines.ini "elo" or "Elo@" levels) and are written to "calibration.ini" next to engines.ini.
+Usage: build/calibrate.py -p a-stockf:Level@05 b-texel [-a c-arasan] [-n 10] [-tc 10+0.1] [-pgn match.pgn]
+"""
+
+import sys
+import os
+import argparse
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from uci.batch import find_engine, host_cores  # noqa: E402 (needs the path above)
+from uci.match import Match, book_openings, make_player, write_calibration  # noqa: E402
+
+
+def main():
+    """Run the match, print the table and write the calibration file."""
+    parser = argparse.ArgumentParser(description='picochess engine level calibration')
+    parser.add_argument('-p', '--players', nargs='*', default=[], help="players like 'a-stockf:Level@05' or 'b-texel'")
+    parser.add_argument('-a', '--all-levels', nargs='*', default=[], help='engines playing with each of their levels')
+    parser.add_argument('-ep', '--engine-path', type=str, default=None, help='folder of engines.ini (default: local)')
+    parser.add_argument('-b', '--book', type=str, default='books' + os.sep + 'h-varied.bin', help='opening book')
+    parser.add_argument('-n', '--openings', type=int, default=10, help='openings each pair plays (with both colors)')
+    parser.add_argument('-op', '--opening-plies', type=int, default=8, help='half moves taken from the book')
+    parser.add_argument('-tc', '--time-control', type=str, default='10+0.1', help='secs per game + increment')
+    parser.add_argument('-w', '--workers', type=int, default=host_cores(), help='concurrent games')
+    parser.add_argument('-o', '--output', type=str, default=None, help='calibration file')
+    parser.add_argument('-pgn', '--pgn-file', type=str, default=None, help='also store the games')
+    parser.add_argument('-s', '--seed', type=int, default=None, help='seed for the opening choice')
+    args = parser.parse_args()
+
+    players = []
+    for text in args.players:
+        name, _, level = text.partition(':')
+        players.append(make_player(find_engine(name, args.engine_path), level or None))
+    for name in args.all_levels:
+        entry = find_engine(name, args.engine_path)
+        players.extend(make_player(entry, level) for level in entry['level_dict'])
+    if len(players) < 2:
+        parser.error('at least 2 players needed')
+
+    base, _, inc = args.time_control.partition('+')
+    openings = book_openings(args.book, args.openings, args.opening_plies, args.seed)
+    match = Match(players, openings, (float(base), float(inc or 0)), args.workers, args.pgn_file)
+
+    def _progress(games, secs):
+        if secs:
+            print('\r{} games {:.1f} games/hour'.format(games, games * 3600 / secs), end='')
+
+    try:
+        stats = match.run(_progress)
+    except RuntimeError as exc:
+        sys.exit('\n' + str(exc))
+    print('\n{} games in {}secs ({} games/hour)'.format(stats['games'], stats['secs'], stats['games_per_hour']))
+    for row in sorted(stats['players'], key=lambda row: -(row['elo'] or 0)):
+        line = '{:30} elo {:>5} nominal {:>5} score {}/{}'
+        print(line.format(row['name'], str(row['elo']), str(row['nominal']), row['score'], row['games']))
+    output = args.output or os.path.join(os.path.dirname(players[0].entry['file']), 'calibration.ini')
+    write_calibration(output, players, stats)
+    print('written to', output)
+
+
+if __name__ == '__main__':
+    main()
@@ -22,12 +22,14 @@ class BaseClass(object):
 
     def __init__(self, classtype):
         self._type = classtype
+        self.trace_id = 0  # set by the tracer (utilities.py)
 
     def __repr__(self):
         return self._type
 
     def __hash__(self):
-        return hash(str(self.__class__) + ": " + str(self.__dict__))
+        values = {key: value for key, value in self.__dict__.items() if key != 'trace_id'}
+        return hash(str(self.__class__) + ": " + str(values))
 
 
 def ClassFactory(name, argnames, BaseClass=BaseClass):
@@ -75,6 +77,7 @@ class EventApi():
     NEW_PV = 'EVT_NEW_PV'  # Engine sends a new principal variation
     NEW_SCORE = 'EVT_NEW_SCORE'  # Engine sends a new score
     NEW_DEPTH = 'EVT_NEW_DEPTH'  # Engine sends a new depth
+    NEW_ANALYSIS = 'EVT_NEW_ANALYSIS'  # Engine sends its (multipv) analysis lines
     START_SEARCH = 'EVT_START_SEARCH'  # Engine starts the search
     STOP_SEARCH = 'EVT_STOP_SEARCH'  # Engine stops the search
     # Timecontrol events
@@ -130,6 +133,8 @@ class MessageApi():
     IP_INFO = 'MSG_IP_INFO'  # Information about the IP adr
     NEW_SCORE = 'MSG_NEW_SCORE'  # Shows a new score
     NEW_DEPTH = 'MSG_NEW_DEPTH'  # Shows a new depth
+    NEW_ANALYSIS = 'MSG_NEW_ANALYSIS'  # Shows the (multipv) analysis lines
+    TABLEBASE_RESULT = 'MSG_TABLEBASE_RESULT'  # Shows the exact result of a tablebase position
     ALTERNATIVE_MOVE = 'MSG_ALTERNATIVE_MOVE'  # User wants another move to be calculated
     SWITCH_SIDES = 'MSG_SWITCH_SIDES'  # Forget the engines move, and let it be user's turn
     SYSTEM_SHUTDOWN = 'MSG_SYSTEM_SHUTDOWN'  # Sends a Shutdown
@@ -221,6 +226,8 @@ class Message():
     IP_INFO = ClassFactory(MessageApi.IP_INFO, ['info'])
     NEW_SCORE = ClassFactory(MessageApi.NEW_SCORE, ['score', 'mate', 'mode', 'turn'])
     NEW_DEPTH = ClassFactory(MessageApi.NEW_DEPTH, ['depth'])
+    NEW_ANALYSIS = ClassFactory(MessageApi.NEW_ANALYSIS, ['lines', 'game'])
+    TABLEBASE_RESULT = ClassFactory(MessageApi.TABLEBASE_RESULT, ['result', 'dtz', 'game'])
     ALTERNATIVE_MOVE = ClassFactory(MessageApi.ALTERNATIVE_MOVE, ['game', 'play_mode'])
     SWITCH_SIDES = ClassFactory(MessageApi.SWITCH_SIDES, ['game', 'move'])
     SYSTEM_SHUTDOWN = ClassFactory(MessageApi.SYSTEM_SHUTDOWN, [])
@@ -264,6 +271,7 @@ class Event():
     NEW_PV = ClassFactory(EventApi.NEW_PV, ['pv'])
     NEW_SCORE = ClassFactory(EventApi.NEW_SCORE, ['score', 'mate'])
     NEW_DEPTH = ClassFactory(EventApi.NEW_DEPTH, ['depth'])
+    NEW_ANALYSIS = ClassFactory(EventApi.NEW_ANALYSIS, ['lines'])
     START_SEARCH = ClassFactory(EventApi.START_SEARCH, [])
     STOP_SEARCH = ClassFactory(EventApi.STOP_SEARCH, [])
     # Timecontrol events
@@ -27,6 +27,7 @@ import time
 from dgt.util import DgtAck, DgtClk, DgtCmd, DgtMsg, ClockIcons, ClockSide, enum
 from dgt.api import Message, Dgt
 from utilities import RepeatedTimer, MsgDisplay, hms_time
+from scheduling import scheduler
 
 
 class DgtBoard(object):
@@ -449,6 +450,7 @@ class DgtBoard(object):
 
     def _process_incoming_board_forever(self):
         counter = 0
+        scheduler.io_thread('board')
         logging.info('incoming_board ready')
         while True:
             byte = b''
@@ -467,7 +469,7 @@ class DgtBoard(object):
                 counter = (counter + 1) % 10
                 if counter == 0 and not self.watchdog_timer.is_running():
                     self._watchdog()  # issue 150 - check for alive connection, so write something to the board
-                time.sleep(0.1)
+                scheduler.sleep('board', 0.1)
 
     def ask_battery_status(self):
         """Ask the BT board for the battery status."""
@@ -22,7 +22,7 @@ import queue
 import threading
 
 import chess
-from utilities import MsgDisplay, EvtObserver, DgtObserver, write_picochess_ini
+from utilities import MsgDisplay, EvtObserver, DgtObserver, write_picochess_ini, tracer
 from dgt.translate import DgtTranslate
 from dgt.menu import DgtMenu
 from dgt.util import ClockSide, ClockIcons, BeepLevel, Mode, GameResult, TimeMode, PlayMode
@@ -52,6 +52,48 @@ class DgtDisplay(MsgDisplay, threading.Thread):
         self.uci960 = False
         self.play_mode = PlayMode.USER_WHITE
         self.low_time = False
+        self.subscribe({
+            Message.ENGINE_READY: self._process_engine_ready,
+            Message.ENGINE_STARTUP: self._process_engine_startup,
+            Message.ENGINE_FAIL: self._on_engine_fail,
+            Message.COMPUTER_MOVE: self._process_computer_move,
+            Message.NEW_GAME: self._process_new_game,
+            Message.COMPUTER_MOVE_DONE: self._on_computer_move_done,
+            Message.USER_MOVE_DONE: self._process_user_move_done,
+            Message.REVIEW_MOVE_DONE: self._process_review_move_done,
+            Message.ALTERNATIVE_MOVE: self._on_alternative_move,
+            Message.NEW_LEVEL: self._on_new_level,
+            Message.TIME_CONTROL: self._process_time_control,
+            Message.NEW_BOOK: self._on_new_book,
+            Message.TAKE_BACK: self._on_take_back,
+            Message.GAME_ENDS: self._on_game_ends,
+            Message.INTERACTION_MODE: self._on_interaction_mode,
+            Message.PLAY_MODE: self._on_play_mode,
+            Message.NEW_SCORE: self._process_new_score,
+            Message.BOOK_MOVE: self._on_book_move,
+            Message.NEW_PV: self._process_new_pv,
+            Message.NEW_DEPTH: self._on_new_depth,
+            Message.IP_INFO: self._on_ip_info,
+            Message.STARTUP_INFO: self._process_startup_info,
+            Message.SEARCH_STARTED: self._on_search_started,
+            Message.SEARCH_STOPPED: self._on_search_stopped,
+            Message.CLOCK_START: self._process_clock_start,
+            Message.CLOCK_STOP: self._on_clock_stop,
+            Message.DGT_BUTTON: self._process_button,
+            Message.DGT_FEN: self._on_dgt_fen,
+            Message.DGT_CLOCK_VERSION: self._on_dgt_clock_version,
+            Message.DGT_CLOCK_TIME: self._on_dgt_clock_time,
+            Message.CLOCK_TIME: self._on_clock_time,
+            Message.DGT_SERIAL_NR: self._on_dgt_serial_nr,
+            Message.DGT_JACK_ERROR: self._on_dgt_jack_error,
+            Message.DGT_EBOARD_VERSION: self._on_dgt_eboard_version,
+            Message.DGT_EBOARD_ERROR: self._on_dgt_eboard_error,
+            Message.SWITCH_SIDES: self._on_switch_sides,
+            Message.EXIT_MENU: self._on_exit_menu,
+            Message.WRONG_FEN: self._on_wrong_fen,
+            Message.BATTERY_BT: self._on_battery_bt,
+            Message.REMOTE_ROOM: self._on_remote_room,
+        })
 
     def _exit_menu(self):
         if self.dgtmenu.exit_menu():
@@ -484,7 +526,7 @@ class DgtDisplay(MsgDisplay, threading.Thread):
         self.play_fen = message.game.fen()
         self.play_turn = message.game.turn
         if ponder:
-            game_copy = message.game.copy()
+            game_copy = message.game.board()
             game_copy.push(move)
             self.hint_move = ponder
             self.hint_fen = game_copy.fen()
@@ -674,195 +716,149 @@ class DgtDisplay(MsgDisplay, threading.Thread):
                 text = Dgt.DISPLAY_TIME(force=True, wait=True, devs=devs)
         DgtObserver.fire(text)
 
-    def _process_message(self, message):
-        if False:  # switch-case
-            pass
-
-        elif isinstance(message, Message.ENGINE_READY):
-            self._process_engine_ready(message)
-
-        elif isinstance(message, Message.ENGINE_STARTUP):
-            self._process_engine_startup(message)
-
-        elif isinstance(message, Message.ENGINE_FAIL):
-            DgtObserver.fire(self.dgttranslate.text('Y10_erroreng'))
-            self.dgtmenu.set_engine_restart(False)
-
-        elif isinstance(message, Message.COMPUTER_MOVE):
-            self._process_computer_move(message)
-
-        elif isinstance(message, Message.NEW_GAME):
-            self._process_new_game(message)
-
-        elif isinstance(message, Message.COMPUTER_MOVE_DONE):
-            self._process_computer_move_done()
-
-        elif isinstance(message, Message.USER_MOVE_DONE):
-            self._process_user_move_done(message)
-
-        elif isinstance(message, Message.REVIEW_MOVE_DONE):
-            self._process_review_move_done(message)
-
-        elif isinstance(message, Message.ALTERNATIVE_MOVE):
-            self.force_leds_off()
-            self.play_mode = message.play_mode
-            DgtObserver.fire(self.dgttranslate.text('B05_altmove'))
-
-        elif isinstance(message, Message.NEW_LEVEL):
-            if not self.dgtmenu.get_engine_restart():
-                DgtObserver.fire(message.level_text)
-
-        elif isinstance(message, Message.TIME_CONTROL):
-            self._process_time_control(message)
-
-        elif isinstance(message, Message.NEW_BOOK):
-            if not self.dgtmenu.get_confirm() or not message.show_ok:
-                DgtObserver.fire(message.book_text)
-
-        elif isinstance(message, Message.TAKE_BACK):
-            self.force_leds_off()
-            self._reset_moves_and_score()
-            DgtObserver.fire(self.dgttranslate.text('C10_takeback'))
-            DgtObserver.fire(Dgt.DISPLAY_TIME(force=True, wait=True, devs={'ser', 'i2c', 'web'}))
-
-        elif isinstance(message, Message.GAME_ENDS):
-            if not self.dgtmenu.get_engine_restart():  # filter out the shutdown/reboot process
-                text = self.dgttranslate.text(message.result.value)
-                text.beep = self.dgttranslate.bl(BeepLevel.CONFIG)
-                text.maxtime = 0.5
-                DgtObserver.fire(text)
-                if self.dgtmenu.get_mode() == Mode.PONDER:
-                    self._reset_moves_and_score()
-                    text.beep = False
-                    text.maxtime = 1
-                    self.score = text
-
-        elif isinstance(message, Message.INTERACTION_MODE):
-            if not self.dgtmenu.get_confirm() or not message.show_ok:
-                DgtObserver.fire(message.mode_text)
-
-        elif isinstance(message, Message.PLAY_MODE):
-            self.play_mode = message.play_mode
-            DgtObserver.fire(message.play_mode_text)
+    def _on_engine_fail(self, message):
+        DgtObserver.fire(self.dgttranslate.text('Y10_erroreng'))
+        self.dgtmenu.set_engine_restart(False)
 
-        elif isinstance(message, Message.NEW_SCORE):
-            self._process_new_score(message)
+    def _on_computer_move_done(self, message):
+        self._process_computer_move_done()
 
-        elif isinstance(message, Message.BOOK_MOVE):
-            self.score = self.dgttranslate.text('N10_score', None)
-            DgtObserver.fire(self.dgttranslate.text('N10_bookmove'))
+    def _on_alternative_move(self, message):
+        self.force_leds_off()
+        self.play_mode = message.play_mode
+        DgtObserver.fire(self.dgttranslate.text('B05_altmove'))
 
-        elif isinstance(message, Message.NEW_PV):
-            self._process_new_pv(message)
+    def _on_new_level(self, message):
+        if not self.dgtmenu.get_engine_restart():
+            DgtObserver.fire(message.level_text)
 
-        elif isinstance(message, Message.NEW_DEPTH):
-            self.depth = message.depth
+    def _on_new_book(self, message):
+        if not self.dgtmenu.get_confirm() or not message.show_ok:
+            DgtObserver.fire(message.book_text)
 
-        elif isinstance(message, Message.IP_INFO):
-            self.dgtmenu.int_ip = message.info['int_ip']
-            self.dgtmenu.ext_ip = message.info['ext_ip']
+    def _on_take_back(self, message):
+        self.force_leds_off()
+        self._reset_moves_and_score()
+        DgtObserver.fire(self.dgttranslate.text('C10_takeback'))
+        DgtObserver.fire(Dgt.DISPLAY_TIME(force=True, wait=True, devs={'ser', 'i2c', 'web'}))
+
+    def _on_game_ends(self, message):
+        if not self.dgtmenu.get_engine_restart():  # filter out the shutdown/reboot process
+            text = self.dgttranslate.text(message.result.value)
+            text.beep = self.dgttranslate.bl(BeepLevel.CONFIG)
+            text.maxtime = 0.5
+            DgtObserver.fire(text)
+            if self.dgtmenu.get_mode() == Mode.PONDER:
+                self._reset_moves_and_score()
+                text.beep = False
+                text.maxtime = 1
+                self.score = text
 
-        elif isinstance(message, Message.STARTUP_INFO):
-            self._process_startup_info(message)
+    def _on_interaction_mode(self, message):
+        if not self.dgtmenu.get_confirm() or not message.show_ok:
+            DgtObserver.fire(message.mode_text)
 
-        elif isinstance(message, Message.SEARCH_STARTED):
-            logging.debug('search started')
+    def _on_play_mode(self, message):
+        self.play_mode = message.play_mode
+        DgtObserver.fire(message.play_mode_text)
 
-        elif isinstance(message, Message.SEARCH_STOPPED):
-            logging.debug('search stopped')
+    def _on_book_move(self, message):
+        self.score = self.dgttranslate.text('N10_score', None)
+        DgtObserver.fire(self.dgttranslate.text('N10_bookmove'))
 
-        elif isinstance(message, Message.CLOCK_START):
-            self._process_clock_start(message)
+    def _on_new_depth(self, message):
+        self.depth = message.depth
 
-        elif isinstance(message, Message.CLOCK_STOP):
-            DgtObserver.fire(Dgt.CLOCK_STOP(devs=message.devs, wait=True))
+    def _on_ip_info(self, message):
+        self.dgtmenu.int_ip = message.info['int_ip']
+        self.dgtmenu.ext_ip = message.info['ext_ip']
 
-        elif isinstance(message, Message.DGT_BUTTON):
-            self._process_button(message)
+    def _on_search_started(self, message):
+        logging.debug('search started')
 
-        elif isinstance(message, Message.DGT_FEN):
-            if self.dgtmenu.inside_updt_menu():
-                logging.debug('inside update menu => ignore fen %s', message.fen)
-            else:
-                self._process_fen(message.fen, message.raw)
+    def _on_search_stopped(self, message):
+        logging.debug('search stopped')
 
-        elif isinstance(message, Message.DGT_CLOCK_VERSION):
-            DgtObserver.fire(Dgt.CLOCK_VERSION(main=message.main, sub=message.sub, devs={message.dev}))
-            text = self.dgttranslate.text('Y21_picochess', devs={message.dev})
-            text.rd = ClockIcons.DOT
-            DgtObserver.fire(text)
+    def _on_clock_stop(self, message):
+        DgtObserver.fire(Dgt.CLOCK_STOP(devs=message.devs, wait=True))
 
-            if message.dev == 'ser':  # send the "board connected message" to serial clock
-                DgtObserver.fire(message.text)
-            self._set_clock(devs={message.dev})
-            self._exit_display(devs={message.dev})
-
-        elif isinstance(message, Message.DGT_CLOCK_TIME):
-            time_white = message.time_left
-            time_black = message.time_right
-            if self.dgtmenu.get_flip_board():
-                time_white, time_black = time_black, time_white
-            EvtObserver.fire(Event.CLOCK_TIME(time_white=time_white, time_black=time_black, connect=message.connect,
-                                              dev=message.dev))
-
-        elif isinstance(message, Message.CLOCK_TIME):
-            self.low_time = message.low_time
-            if self.low_time:
-                logging.debug('time too low, disable confirm - w: %i, b: %i', message.time_white, message.time_black)
-
-        elif isinstance(message, Message.DGT_SERIAL_NR):
-            self._process_dgt_serial_nr()
-
-        elif isinstance(message, Message.DGT_JACK_ERROR):  # only working in case of 2 clocks connected!
-            DgtObserver.fire(self.dgttranslate.text('Y00_errorjack'))
-
-        elif isinstance(message, Message.DGT_EBOARD_VERSION):
-            if self.dgtmenu.inside_updt_menu():
-                logging.debug('inside update menu => board channel not displayed')
-            else:
-                DgtObserver.fire(message.text)
-                self._exit_display(devs={'i2c', 'web'})  # ser is done, when clock found
+    def _on_dgt_fen(self, message):
+        if self.dgtmenu.inside_updt_menu():
+            logging.debug('inside update menu => ignore fen %s', message.fen)
+        else:
+            self._process_fen(message.fen, message.raw)
 
-        elif isinstance(message, Message.DGT_EBOARD_ERROR):
-            if self.dgtmenu.inside_updt_menu() or self.dgtmenu.inside_main_menu():
-                logging.debug('inside menu => board error not displayed')
-            else:
-                DgtObserver.fire(message.text)
+    def _on_dgt_clock_version(self, message):
+        DgtObserver.fire(Dgt.CLOCK_VERSION(main=message.main, sub=message.sub, devs={message.dev}))
+        text = self.dgttranslate.text('Y21_picochess', devs={message.dev})
+        text.rd = ClockIcons.DOT
+        DgtObserver.fire(text)
 
-        elif isinstance(message, Message.DGT_CLOCK_ERROR):
-            pass
+        if message.dev == 'ser':  # send the "board connected message" to serial clock
+            DgtObserver.fire(message.text)
+        self._set_clock(devs={message.dev})
+        self._exit_display(devs={message.dev})
+
+    def _on_dgt_clock_time(self, message):
+        time_white = message.time_left
+        time_black = message.time_right
+        if self.dgtmenu.get_flip_board():
+            time_white, time_black = time_black, time_white
+        EvtObserver.fire(Event.CLOCK_TIME(time_white=time_white, time_black=time_black, connect=message.connect,
+                                          dev=message.dev))
+
+    def _on_clock_time(self, message):
+        self.low_time = message.low_time
+        if self.low_time:
+            logging.debug('time too low, disable confirm - w: %i, b: %i', message.time_white, message.time_black)
+
+    def _on_dgt_serial_nr(self, message):
+        self._process_dgt_serial_nr()
+
+    def _on_dgt_jack_error(self, message):  # only working in case of 2 clocks connected!
+        DgtObserver.fire(self.dgttranslate.text('Y00_errorjack'))
+
+    def _on_dgt_eboard_version(self, message):
+        if self.dgtmenu.inside_updt_menu():
+            logging.debug('inside update menu => board channel not displayed')
+        else:
+            DgtObserver.fire(message.text)
+            self._exit_display(devs={'i2c', 'web'})  # ser is done, when clock found
 
-        elif isinstance(message, Message.SWITCH_SIDES):
-            self.play_move = chess.Move.null()
-            self.play_fen = None
-            self.play_turn = None
+    def _on_dgt_eboard_error(self, message):
+        if self.dgtmenu.inside_updt_menu() or self.dgtmenu.inside_main_menu():
+            logging.debug('inside menu => board error not displayed')
+        else:
+            DgtObserver.fire(message.text)
 
-            self.hint_move = chess.Move.null()
-            self.hint_fen = None
-            self.hint_turn = None
-            self.force_leds_off()
-            logging.debug('user ignored move %s', message.move)
+    def _on_switch_sides(self, message):
+        self.play_move = chess.Move.null()
+        self.play_fen = None
+        self.play_turn = None
 
-        elif isinstance(message, Message.EXIT_MENU):
-            self._exit_display(devs={message.dev})
+        self.hint_move = chess.Move.null()
+        self.hint_fen = None
+        self.hint_turn = None
+        self.force_leds_off()
+        logging.debug('user ignored move %s', message.move)
 
-        elif isinstance(message, Message.WRONG_FEN):
-            DgtObserver.fire(self.dgttranslate.text('C10_setpieces'))
+    def _on_exit_menu(self, message):
+        self._exit_display(devs={message.dev})
 
-        elif isinstance(message, Message.BATTERY_BT):
-            if message.percent == 0x7f:
-                percent = ' NA'
-            elif message.percent > 99:
-                percent = ' 99'
-            else:
-                percent = str(message.percent)
-            self.dgtmenu.battery = percent
+    def _on_wrong_fen(self, message):
+        DgtObserver.fire(self.dgttranslate.text('C10_setpieces'))
 
-        elif isinstance(message, Message.REMOTE_ROOM):
-            self.dgtmenu.inside_room = message.inside
+    def _on_battery_bt(self, message):
+        if message.percent == 0x7f:
+            percent = ' NA'
+        elif message.percent > 99:
+            percent = ' 99'
+        else:
+            percent = str(message.percent)
+        self.dgtmenu.battery = percent
 
-        else:  # Default
-            pass
+    def _on_remote_room(self, message):
+        self.dgtmenu.inside_room = message.inside
 
     def run(self):
         """Call by threading.Thread start() function."""
@@ -873,6 +869,8 @@ class DgtDisplay(MsgDisplay, threading.Thread):
                 message = self.msg_queue.get()
                 if not isinstance(message, Message.DGT_SERIAL_NR):
                     logging.debug('received message from msg_queue: %s', message)
-                self._process_message(message)
+                tracer.set_current(message.trace_id)
+                tracer.stamp(message, 'msg_get', self.msg_queue)
+                self.dispatch(message)
             except queue.Empty:
                 pass
@@ -20,7 +20,7 @@ import queue
 from threading import Thread
 
 from chess import Board
-from utilities import DgtDisplay
+from utilities import DgtDisplay, tracer
 from dgt.util import ClockSide
 from dgt.api import Dgt
 from dgt.board import DgtBoard
@@ -162,6 +162,7 @@ class DgtDisplayIface(DgtDisplay, Thread):
 
     def _create_task(self, msg):
         res = self._process_message(msg)
+        tracer.stamp(msg, 'dgt_done ' + self.get_name())
         if not res:
             logging.warning('DgtApi command %s failed result: %s', msg, res)
 
@@ -22,7 +22,7 @@ from collections import OrderedDict
 
 import chess
 from timecontrol import TimeControl
-from utilities import EvtObserver, DgtObserver, get_tags, version, write_picochess_ini
+from utilities import EvtObserver, DgtObserver, get_tags, version, write_picochess_ini, ini_store
 from dgt.util import TimeMode, TimeModeLoop, MainTop, MainTopLoop, Mode, ModeLoop, Language, LanguageLoop
 from dgt.util import BeepLevel, BeepLoop, System, SystemLoop, Display, DisplayLoop, ClockIcons, Voice, VoiceLoop
 from dgt.util import Info, InfoLoop, UpdtTop, UpdtTopLoop
@@ -1152,10 +1152,7 @@ class DgtMenu(object):
             if self.mainmenu_system_voice_user_active:
                 text = self.enter_mainmenu_sys_voice_user_mute_lang()
             else:
-                config = ConfigObj('picochess.ini')
-                if 'user-voice' in config:
-                    del config['user-voice']
-                    config.write()
+                ini_store.delete('user-voice')
                 event = Event.NEW_VOICE(type=self.mainmenu_system_voice, lang='en', speaker='mute', speed=2)
                 EvtObserver.fire(event)
                 text = self._fire_dispatchdgt(self.dgttranslate.text('B10_okvoice'), dev)
@@ -1167,10 +1164,8 @@ class DgtMenu(object):
             # do action!
             vkey = self.voices_conf.keys()[self.mainmenu_system_voice_user_lang]
             speakers = self.voices_conf[vkey].keys()
-            config = ConfigObj('picochess.ini')
             skey = speakers[self.mainmenu_system_voice_user_speak]
-            config['user-voice'] = vkey + ':' + skey
-            config.write()
+            write_picochess_ini('user-voice', vkey + ':' + skey)
             event = Event.NEW_VOICE(type=self.mainmenu_system_voice, lang=vkey, speaker=skey,
                                     speed=self.mainmenu_system_voice_speedfactor)
             EvtObserver.fire(event)
@@ -1181,10 +1176,7 @@ class DgtMenu(object):
             if self.mainmenu_system_voice_comp_active:
                 text = self.enter_mainmenu_sys_voice_comp_mute_lang()
             else:
-                config = ConfigObj('picochess.ini')
-                if 'computer-voice' in config:
-                    del config['computer-voice']
-                    config.write()
+                ini_store.delete('computer-voice')
                 event = Event.NEW_VOICE(type=self.mainmenu_system_voice, lang='en', speaker='mute', speed=2)
                 EvtObserver.fire(event)
                 text = self._fire_dispatchdgt(self.dgttranslate.text('B10_okvoice'), dev)
@@ -1196,10 +1188,8 @@ class DgtMenu(object):
             # do action!
             vkey = self.voices_conf.keys()[self.mainmenu_system_voice_comp_lang]
             speakers = self.voices_conf[vkey].keys()
-            config = ConfigObj('picochess.ini')
             skey = speakers[self.mainmenu_system_voice_comp_speak]
-            config['computer-voice'] = vkey + ':' + skey
-            config.write()
+            write_picochess_ini('computer-voice', vkey + ':' + skey)
             event = Event.NEW_VOICE(type=self.mainmenu_system_voice, lang=vkey, speaker=skey,
                                     speed=self.mainmenu_system_voice_speedfactor)
             EvtObserver.fire(event)
@@ -1233,12 +1223,10 @@ class DgtMenu(object):
 
         elif self.mainmenu_state == MainMenuState.SYS_DISP_CONFIRM_YESNO:
             # do action!
-            config = ConfigObj('picochess.ini')
             if self.mainmenu_system_display_confirm:
-                config['disable-confirm-message'] = self.mainmenu_system_display_confirm
-            elif 'disable-confirm-message' in config:
-                del config['disable-confirm-message']
-            config.write()
+                write_picochess_ini('disable-confirm-message', self.mainmenu_system_display_confirm)
+            else:
+                ini_store.delete('disable-confirm-message')
             text = self._fire_dispatchdgt(self.dgttranslate.text('B10_okconfirm'), dev)
 
         elif self.mainmenu_state == MainMenuState.SYS_DISP_PONDER:
@@ -1254,12 +1242,10 @@ class DgtMenu(object):
 
         elif self.mainmenu_state == MainMenuState.SYS_DISP_CAPTIAL_YESNO:
             # do action!
-            config = ConfigObj('picochess.ini')
             if self.mainmenu_system_display_capital:
-                config['enable-capital-letters'] = self.mainmenu_system_display_capital
-            elif 'enable-capital-letters' in config:
-                del config['enable-capital-letters']
-            config.write()
+                write_picochess_ini('enable-capital-letters', self.mainmenu_system_display_capital)
+            else:
+                ini_store.delete('enable-capital-letters')
             text = self._fire_dispatchdgt(self.dgttranslate.text('B10_okcapital'), dev)
 
         elif self.mainmenu_state == MainMenuState.SYS_DISP_NOTATION:
@@ -1267,12 +1253,10 @@ class DgtMenu(object):
 
         elif self.mainmenu_state == MainMenuState.SYS_DISP_NOTATION_MOVE:
             # do-action!
-            config = ConfigObj('picochess.ini')
             if self.mainmenu_system_display_notation:
-                config['disable-short-notation'] = self.mainmenu_system_display_notation
-            elif 'disable-short-notation' in config:
-                del config['disable-short-notation']
-            config.write()
+                write_picochess_ini('disable-short-notation', self.mainmenu_system_display_notation)
+            else:
+                ini_store.delete('disable-short-notation')
             text = self._fire_dispatchdgt(self.dgttranslate.text('B10_oknotation'), dev)
 
         else:  # Default
@@ -22,6 +22,7 @@ from ctypes import cdll, c_byte, create_string_buffer, pointer
 from platform import machine
 
 from utilities import MsgDisplay, hms_time
+from scheduling import scheduler
 from dgt.api import Message
 from dgt.util import ClockIcons, ClockSide
 from dgt.board import DgtBoard
@@ -63,6 +64,7 @@ class DgtPi(DgtDisplayIface):
         buttime = c_byte(0)
         clktime = create_string_buffer(6)
         counter = 0
+        scheduler.io_thread('i2c clock')
         logging.info('incoming_clock ready')
         while True:
             with self.lib_lock:
@@ -121,7 +123,7 @@ class DgtPi(DgtDisplayIface):
                         self.r_time = r_hms[0] * 3600 + r_hms[1] * 60 + r_hms[2]
                 text = Message.DGT_CLOCK_TIME(time_left=self.l_time, time_right=self.r_time, connect=True, dev='i2c')
                 MsgDisplay.show(text)
-            time.sleep(0.1)
+            scheduler.sleep('i2c clock', 0.1)
 
     def _run_configure(self):
         res = self.lib.dgtpicom_configure()
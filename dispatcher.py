@@ -20,7 +20,7 @@ import queue
 from threading import Timer, Thread, Lock
 from copy import deepcopy
 
-from utilities import DgtDisplay, DgtObserver, dgtobserver_queue
+from utilities import DgtDisplay, DgtObserver, dgtobserver_queue, tracer
 from dgt.api import Dgt, DgtApi
 from dgt.menu import DgtMenu
 
@@ -158,6 +158,8 @@ class Dispatcher(DgtObserver, Thread):
             except queue.Empty:
                 pass
             else:
+                tracer.set_current(msg.trace_id)
+                tracer.stamp(msg, 'dgt_dispatch', dgtobserver_queue)
                 logging.debug('received command from dispatch_queue: %s devs: %s', msg, ','.join(msg.devs))
 
                 for dev in msg.devs & self.devices:
@@ -0,0 +1,218 @@
+# Copyright (C) 2013-2018 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+from array import array
+from collections import Counter, namedtuple
+
+import chess
+from dgt.util import GameResult
+
+# result is a GameResult (or None if the game continues)
+GameState = namedtuple('GameState', ['result', 'is_check', 'has_moves', 'repetitions'])
+
+
+def _repetition_table(board: chess.Board):
+    """Return how often each position (transposition key) of the game occurred - in any order, not only as cycle."""
+    board = chess.Board.copy(board)
+    moves = []
+    while board.move_stack:
+        moves.append(board.pop())
+    reps = Counter([board._transposition_key()])
+    for move in reversed(moves):
+        board.push(move)
+        reps[board._transposition_key()] += 1
+    return reps
+
+
+def _evaluate(board: chess.Board, repetitions: int):
+    """Answer all termination questions with one legal move generation."""
+    has_moves = any(board.generate_legal_moves())
+    is_check = board.is_check()
+    result = None  # same precedence as the single checks had in check_game_state()
+    if not has_moves and not is_check:
+        result = GameResult.STALEMATE
+    if board.is_insufficient_material():
+        result = GameResult.INSUFFICIENT_MATERIAL
+    if has_moves and board.halfmove_clock >= 150:
+        result = GameResult.SEVENTYFIVE_MOVES
+    if repetitions >= 5:
+        result = GameResult.FIVEFOLD_REPETITION
+    if not has_moves and is_check:
+        result = GameResult.MATE
+    return GameState(result=result, is_check=is_check, has_moves=has_moves, repetitions=repetitions)
+
+
+class GameBoard(chess.Board):
+
+    """A chess.Board which keeps its repetition table up to date and evaluates each position only once."""
+
+    def __init__(self, fen=chess.STARTING_FEN, chess960=False):
+        self._reps = None  # transposition key => count (None: build it on demand)
+        self._state = None  # GameState of the current position (None: not evaluated yet)
+        self._root_fen = None  # fen before the first move of the stack
+        super(GameBoard, self).__init__(fen, chess960)
+
+    def _repetitions(self):
+        if self._reps is None:
+            self._reps = _repetition_table(self)
+        return self._reps
+
+    def push(self, move):
+        if not self.move_stack and self._root_fen is None:
+            self._root_fen = self.fen()
+        super(GameBoard, self).push(move)
+        if self._reps is not None:
+            self._reps[self._transposition_key()] += 1
+        self._state = None
+
+    def pop(self):
+        if self._reps is not None:
+            key = self._transposition_key()
+            self._reps[key] -= 1
+            if self._reps[key] <= 0:
+                del self._reps[key]
+        self._state = None
+        return super(GameBoard, self).pop()
+
+    def clear_stack(self):
+        super(GameBoard, self).clear_stack()
+        self._reps = None  # the position itself is set after this call
+        self._state = None
+        self._root_fen = None
+
+    def copy(self, stack=True):
+        board = super(GameBoard, self).copy(stack)
+        if stack:
+            board._reps = Counter(self._reps) if self._reps is not None else None
+            board._state = self._state
+            board._root_fen = self._root_fen
+        return board
+
+    def root_fen(self):
+        """Return the fen of the position before the first move."""
+        return self._root_fen if self.move_stack else self.fen()
+
+    def state(self):
+        """Return the (cached) GameState of the current position."""
+        if self._state is None:
+            self._state = _evaluate(self, self._repetitions()[self._transposition_key()])
+        return self._state
+
+    def is_game_over(self, claim_draw=False):
+        if claim_draw:
+            return super(GameBoard, self).is_game_over(claim_draw)
+        return self.state().result is not None
+
+
+def _pack(move: chess.Move):
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+def _unpack(packed: int):
+    return chess.Move(packed & 63, packed >> 6 & 63, packed >> 12 or None)
+
+
+class GameSnapshot(object):
+
+    """Immutable compact copy of a game (start fen, packed moves, current fen) - boards are only made on request."""
+
+    __slots__ = ('_root_fen', '_chess960', '_moves', '_fen', '_turn', '_state', '_board')
+
+    def __init__(self, board: chess.Board):
+        if isinstance(board, GameBoard):
+            self._root_fen = board.root_fen()
+            self._state = board._state
+        else:
+            root = board.copy()
+            while root.move_stack:
+                root.pop()
+            self._root_fen = root.fen()
+            self._state = None
+        self._chess960 = board.chess960
+        self._moves = array('H', map(_pack, board.move_stack)).tobytes()  # 2 bytes per move
+        self._fen = board.fen()
+        self._turn = board.turn
+        self._board = None  # materialised board (never handed out)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return 'GameSnapshot({!r}, {} moves)'.format(self._fen, len(self._moves) // 2)
+
+    @property
+    def turn(self):
+        """Return the side to move."""
+        return self._turn
+
+    @property
+    def chess960(self):
+        """Return if it is a chess960 game."""
+        return self._chess960
+
+    @property
+    def move_stack(self):
+        """Return (a new list of) the moves played."""
+        packed = array('H')
+        packed.frombytes(self._moves)
+        return [_unpack(move) for move in packed]
+
+    def fen(self):
+        """Return the fen of the current position."""
+        return self._fen
+
+    def root_fen(self):
+        """Return the fen of the position before the first move."""
+        return self._root_fen
+
+    def peek(self):
+        """Return the last move - raise IndexError if there is none."""
+        if not self._moves:
+            raise IndexError('peek from empty move stack')
+        return _unpack(int.from_bytes(self._moves[-2:], sys.byteorder))
+
+    def board(self):
+        """Return a new GameBoard of the game (the caller may change it)."""
+        board = self._board
+        if board is None:
+            board = GameBoard(self._root_fen, self._chess960)
+            for move in self.move_stack:
+                board.push(move)
+            board._state = self._state
+            self._board = board
+        return board.copy()
+
+    def state(self):
+        """Return the GameState of the current position."""
+        if self._state is None:
+            self._state = self.board().state()
+        return self._state
+
+    def chess960_pos(self):
+        """Return the chess960 start position number of the current position (or None)."""
+        return self.board().chess960_pos()
+
+
+def game_state(board):
+    """Return the GameState of any board - cached for a GameBoard/GameSnapshot, evaluated for a plain chess.Board."""
+    if isinstance(board, (GameBoard, GameSnapshot)):
+        return board.state()
+    return _evaluate(board, _repetition_table(board)[board._transposition_key()])  # same rule as a GameBoard
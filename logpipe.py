@@ -0,0 +1,190 @@
+# Copyright (C) 2013-2018 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import gzip
+import time
+import queue
+import shutil
+import logging
+import threading
+from collections import Counter
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s.%(msecs)03d %(levelname)7s %(module)10s - %(funcName)s: %(message)s'
+LOG_DATEFMT = '%Y-%m-%d %H:%M:%S'
+_IMMUTABLE = (str, int, float, bool, bytes, type(None))
+
+
+def parse_rates(text: str):
+    """Return (default rate, {module: rate}) out of a list like '50,board:10' - records per sec, 0=unlimited."""
+    default, rates = 0, {}
+    for part in (text or '').split(','):
+        name, _, value = part.strip().rpartition(':')
+        try:
+            if name:
+                rates[name] = int(value)
+            elif value:
+                default = int(value)
+        except ValueError:
+            logging.warning('invalid log rate [%s]', part)
+    return default, rates
+
+
+class GzipRotatingFileHandler(RotatingFileHandler):
+
+    """A RotatingFileHandler which compresses the rotated files (picochess.log.1.gz, ...)."""
+
+    def __init__(self, file_name: str, max_bytes: int, backup_count: int):
+        super(GzipRotatingFileHandler, self).__init__(file_name, maxBytes=max_bytes, backupCount=backup_count)
+        self.namer = self._gz_name
+        self.rotator = self._gz_rotate
+
+    @staticmethod
+    def _gz_name(name: str):
+        return name + '.gz'
+
+    @staticmethod
+    def _gz_rotate(source: str, dest: str):
+        with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+
+
+class RateLimitFilter(logging.Filter):
+
+    """Let only rate debug/info records per sec and module pass (token bucket) - warnings and errors always pass."""
+
+    def __init__(self, default_rate: int, rates: dict):
+        super(RateLimitFilter, self).__init__()
+        self.default_rate = default_rate
+        self.rates = rates
+        self.buckets = {}  # module => [tokens, last time, suppressed since the last passed record]
+        self.suppressed = Counter()
+        self.lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.module, self.default_rate)
+        if not rate:
+            return True
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(record.module)
+            if bucket is None:
+                bucket = self.buckets[record.module] = [rate, now, 0]
+            bucket[0] = min(rate, bucket[0] + (now - bucket[1]) * rate)  # burst up to one second of records
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                self.suppressed[record.module] += 1
+                return False
+            bucket[0] -= 1
+            skipped, bucket[2] = bucket[2], 0
+        if skipped:
+            record.msg = '{} [{} records suppressed before]'.format(record.getMessage(), skipped)
+            record.args = None
+        return True
+
+
+class LazyQueueHandler(QueueHandler):
+
+    """Queue the records for the writer thread - a record with only immutable args is also formatted there."""
+
+    def __init__(self, log_queue: queue.Queue, fallback: logging.Handler, block_secs=0.5):
+        super(LazyQueueHandler, self).__init__(log_queue)
+        self.fallback = fallback  # writes a warning/error directly if the queue stays full
+        self.block_secs = block_secs
+        self.dropped = 0
+        self.unreported = 0  # dropped since the last "records dropped" line
+
+    def prepare(self, record: logging.LogRecord):
+        args = record.args
+        if record.exc_info or isinstance(args, dict) or not all(isinstance(arg, _IMMUTABLE) for arg in args or ()):
+            return super(LazyQueueHandler, self).prepare(record)  # the objects might change till the writer runs
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if record.levelno >= logging.WARNING:  # never lose them - they are what the log mail is for
+            try:
+                self.queue.put(record, timeout=self.block_secs)
+            except queue.Full:
+                self.fallback.handle(record)
+            return
+        try:
+            if self.unreported and self.queue.qsize() < self.queue.maxsize // 2:  # drained again
+                self.queue.put_nowait(logging.LogRecord(
+                    __name__, logging.WARNING, __file__, 0, '%i log records dropped (queue full)',
+                    (self.unreported,), None, 'enqueue'))
+                self.unreported = 0
+            self.queue.put_nowait(record)
+        except queue.Full:  # the card is too slow - never block the caller for a debug/info record
+            self.dropped += 1
+            self.unreported += 1
+
+
+class LogPipeline(object):
+
+    """Write the log file from a background thread - the logging threads only put the records in a queue."""
+
+    def __init__(self):
+        super(LogPipeline, self).__init__()
+        self.queue = None
+        self.handler = None
+        self.listener = None
+        self.limiter = None
+        self.queue_handler = None
+
+    def start(self, file_name: str, level: int, rates: str, max_bytes: int, backup_count: int, queue_size=10000):
+        """Route the root logger through the queue to a compressing rotating file."""
+        self.queue = queue.Queue(queue_size)
+        self.handler = GzipRotatingFileHandler(file_name, max_bytes, backup_count)
+        self.handler.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATEFMT))
+        self.queue_handler = LazyQueueHandler(self.queue, self.handler)
+        self.limiter = RateLimitFilter(*parse_rates(rates))
+        self.queue_handler.addFilter(self.limiter)  # before the queue: a suppressed record isn't even formatted
+
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(self.queue_handler)
+        self.listener = QueueListener(self.queue, self.handler)
+        self.listener.start()
+
+    def flush(self):
+        """Wait till the queued records are written (for example before the log file gets mailed)."""
+        if self.listener:
+            self.queue.join()
+            self.handler.flush()
+
+    def stop(self):
+        """Write the queued records and stop the writer thread."""
+        if self.listener:
+            self.listener.stop()
+            self.listener = None
+            self.handler.close()
+
+    def stats(self):
+        """Return the queue fill, the dropped and the (per module) suppressed records."""
+        if not self.limiter:
+            return {}
+        with self.limiter.lock:
+            suppressed = dict(self.limiter.suppressed)
+        return {'queued': self.queue.qsize(), 'dropped': self.queue_handler.dropped, 'suppressed': suppressed}
+
+
+log_pipeline = LogPipeline()
@@ -21,27 +21,30 @@ import datetime
 import logging
 import os
 import queue
-from email import encoders
-from email.mime.multipart import MIMEMultipart
-from email.mime.audio import MIMEAudio
-from email.mime.base import MIMEBase
-from email.mime.image import MIMEImage
-from email.mime.text import MIMEText
-import mimetypes
-import requests
+import json
+import gzip
+import shutil
+import time
 
 import chess
 import chess.pgn
+import chess.polyglot
 from utilities import MsgDisplay
 from dgt.api import Message
 from dgt.util import GameResult, PlayMode, Mode
 
 
-class Emailer(object):
+class Emailer(threading.Thread):
 
-    """Handle eMail with subject, body and an attached file."""
+    """Handle eMail with subject, body and an attached file - delivered in the background by a retry queue."""
 
-    def __init__(self, email=None, mailgun_key=None):
+    RETRY_BASE = 30  # secs until the first retry, doubled with each further try
+    RETRY_MAX = 3600  # never wait longer than this for the next try
+    MAX_TRIES = 12  # afterwards the mail is kept as "*.failed" inside the spool path
+    SMTP_IDLE = 60  # keep a smtp connection open for this amount of secs to reuse it
+
+    def __init__(self, email=None, mailgun_key=None, spool_path='mail'):
+        super(Emailer, self).__init__(daemon=True)
         if email:  # check if email address is provided by picochess.ini
             self.email = email
         else:
@@ -57,10 +60,72 @@ class Emailer(object):
         else:
             self.mailgun_key = False
 
-    def _use_smtp(self, subject, body, path):
-        # if self.smtp_server is not provided than don't try to send email via smtp service
-        logging.debug('SMTP Mail delivery: Started')
-        # change to smtp based mail delivery
+        self.spool_path = spool_path
+        self.condition = threading.Condition()
+        self.counter = 0
+        self.pending = False  # a mail was queued since the worker last read the queue (guarded by condition)
+        self.smtp_conn = None
+        self.smtp_used = 0
+        self.mailgun_session = None
+
+    def _build_mime(self, subject, body, path, attach_name=None):
+        # the email libs are only loaded when a mail is really send - this saves startup time
+        from email import encoders
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.audio import MIMEAudio
+        from email.mime.base import MIMEBase
+        from email.mime.image import MIMEImage
+        from email.mime.text import MIMEText
+        import mimetypes
+        outer = MIMEMultipart()
+        outer['Subject'] = subject  # put subject to mail
+        outer['From'] = 'Your PicoChess computer <{}>'.format(self.smtp_from)
+        outer['To'] = self.email
+        outer.attach(MIMEText(body, 'plain'))  # pack the pgn to Email body
+
+        if not os.path.isfile(path):
+            logging.warning('attachment [%s] not found - sending without', path)
+            return outer
+        ctype, encoding = mimetypes.guess_type(path)
+        if ctype is None or encoding is not None:
+            ctype = 'application/octet-stream'
+        maintype, subtype = ctype.split('/', 1)
+        if maintype == 'text':
+            with open(path) as fpath:
+                msg = MIMEText(fpath.read(), _subtype=subtype)
+        elif maintype == 'image':
+            with open(path, 'rb') as fpath:
+                msg = MIMEImage(fpath.read(), _subtype=subtype)
+        elif maintype == 'audio':
+            with open(path, 'rb') as fpath:
+                msg = MIMEAudio(fpath.read(), _subtype=subtype)
+        else:
+            with open(path, 'rb') as fpath:
+                msg = MIMEBase(maintype, subtype)
+                msg.set_payload(fpath.read())
+            encoders.encode_base64(msg)
+        msg.add_header('Content-Disposition', 'attachment', filename=attach_name or os.path.basename(path))
+        outer.attach(msg)
+        return outer
+
+    def _close_smtp(self):
+        if self.smtp_conn:
+            try:
+                self.smtp_conn.quit()
+            except Exception:  # connection already broken - nothing to do
+                pass
+            self.smtp_conn = None
+            logging.debug('SMTP Mail delivery: connection closed')
+
+    def _get_smtp(self):
+        """Return a logged in smtp connection - reuse the open one if its still alive."""
+        if self.smtp_conn:
+            try:
+                if self.smtp_conn.noop()[0] == 250:
+                    return self.smtp_conn
+            except Exception:  # server closed the connection meanwhile
+                pass
+            self.smtp_conn = None
         # depending on encrypted mail delivery, we need to import the right lib
         if self.smtp_encryption:
             # lib with ssl encryption
@@ -70,61 +135,39 @@ class Emailer(object):
             # lib without encryption (SMTP-port 21)
             logging.debug('SMTP Mail delivery: Import standard SMTP Lib (no SSL encryption)')
             from smtplib import SMTP
-        conn = False
+        logging.debug('SMTP Mail delivery: trying to connect to ' + self.smtp_server)
+        conn = SMTP(self.smtp_server, timeout=30)  # contact smtp server
+        conn.set_debuglevel(False)  # no debug info from smtp lib
+        if self.smtp_user is not None and self.smtp_pass is not None:
+            logging.debug('SMTP Mail delivery: trying to log to SMTP Server')
+            conn.login(self.smtp_user, self.smtp_pass)  # login at smtp server
+        self.smtp_conn = conn
+        return conn
+
+    def _use_smtp(self, subject, body, path, attach_name=None):
+        logging.debug('SMTP Mail delivery: trying to send email')
+        outer = self._build_mime(subject, body, path, attach_name)
         try:
-            outer = MIMEMultipart()
-            outer['Subject'] = subject  # put subject to mail
-            outer['From'] = 'Your PicoChess computer <{}>'.format(self.smtp_from)
-            outer['To'] = self.email
-            outer.attach(MIMEText(body, 'plain'))  # pack the pgn to Email body
-
-            ctype, encoding = mimetypes.guess_type(path)
-            if ctype is None or encoding is not None:
-                ctype = 'application/octet-stream'
-            maintype, subtype = ctype.split('/', 1)
-            if maintype == 'text':
-                with open(path) as fpath:
-                    msg = MIMEText(fpath.read(), _subtype=subtype)
-            elif maintype == 'image':
-                with open(path, 'rb') as fpath:
-                    msg = MIMEImage(fpath.read(), _subtype=subtype)
-            elif maintype == 'audio':
-                with open(path, 'rb') as fpath:
-                    msg = MIMEAudio(fpath.read(), _subtype=subtype)
-            else:
-                with open(path, 'rb') as fpath:
-                    msg = MIMEBase(maintype, subtype)
-                    msg.set_payload(fpath.read())
-                encoders.encode_base64(msg)
-            msg.add_header('Content-Disposition', 'attachment', filename=os.path.basename(path))
-            outer.attach(msg)
-
-            logging.debug('SMTP Mail delivery: trying to connect to ' + self.smtp_server)
-            conn = SMTP(self.smtp_server)  # contact smtp server
-            conn.set_debuglevel(False)  # no debug info from smtp lib
-            if self.smtp_user is not None and self.smtp_pass is not None:
-                logging.debug('SMTP Mail delivery: trying to log to SMTP Server')
-                conn.login(self.smtp_user, self.smtp_pass)  # login at smtp server
-
-            logging.debug('SMTP Mail delivery: trying to send email')
-            conn.sendmail(self.smtp_from, self.email, outer.as_string())
-            logging.debug('SMTP Mail delivery: successfuly delivered message to SMTP server')
-        except Exception as smtp_exc:
-            logging.error('SMTP Mail delivery: Failed')
-            logging.error('SMTP Mail delivery: ' + str(smtp_exc))
-        finally:
-            if conn:
-                conn.close()
-            logging.debug('SMTP Mail delivery: Ended')
+            self._get_smtp().sendmail(self.smtp_from, self.email, outer.as_string())
+        except Exception:
+            self._close_smtp()  # dont reuse a connection in unknown state
+            raise
+        self.smtp_used = time.time()
+        logging.debug('SMTP Mail delivery: successfuly delivered message to SMTP server')
 
     def _use_mailgun(self, subject, body):
-        out = requests.post('https://api.mailgun.net/v3/picochess.org/messages',
-                            auth=('api', self.mailgun_key),
-                            data={'from': 'Your PicoChess computer <no-reply@picochess.org>',
-                                  'to': self.email,
-                                  'subject': subject,
-                                  'text': body})
+        if self.mailgun_session is None:
+            import requests  # slow to import - so only load it when mailgun is really used
+            self.mailgun_session = requests.Session()  # keep the https connection alive
+        out = self.mailgun_session.post('https://api.mailgun.net/v3/picochess.org/messages',
+                                        auth=('api', self.mailgun_key),
+                                        data={'from': 'Your PicoChess computer <no-reply@picochess.org>',
+                                              'to': self.email,
+                                              'subject': subject,
+                                              'text': body},
+                                        timeout=30)
         logging.debug(out)
+        out.raise_for_status()
 
     def set_smtp(self, sserver=None, sencryption=None, suser=None, spass=None, sfrom=None):
         """Store information for SMTP based mail delivery."""
@@ -135,22 +178,291 @@ class Emailer(object):
         self.smtp_from = sfrom
 
     def send(self, subject: str, body: str, path: str):
-        """Send the email out."""
-        if self.email:  # check if email adress to send the pgn to is provided
-            if self.mailgun_key:  # check if we have mailgun-key available to send the pgn successful
-                self._use_mailgun(subject=subject, body=body)
-            if self.smtp_server:  # check if smtp server adress provided
-                self._use_smtp(subject=subject, body=body, path=path)
+        """Put the email into the (persistent) mail queue."""
+        if not self.email:  # check if email adress to send the pgn to is provided
+            return
+        transports = []
+        if self.mailgun_key:  # check if we have mailgun-key available to send the pgn successful
+            transports.append('mailgun')
+        if self.smtp_server:  # check if smtp server adress provided
+            transports.append('smtp')
+        if not transports:
+            return
+        mail = {'subject': subject, 'body': body, 'path': path, 'attach_name': os.path.basename(path),
+                'transports': transports, 'tries': 0, 'next_try': time.time()}
+        with self.condition:
+            self.counter += 1
+            name = '{:.6f}-{:04d}.json'.format(time.time(), self.counter)
+            if 'smtp' in transports and os.path.isfile(path):
+                mail['path'] = self._snapshot(name, path)  # a retry must not attach a rotated (or grown) file
+            self._write_mail(name, mail)
+            self.pending = True
+            self.condition.notify()
+        logging.debug('mail [%s] queued as %s', subject, name)
+
+    def _snapshot(self, name: str, path: str):
+        """Copy the attachment into the spool path - return the copy's path (or path itself if it cant be copied)."""
+        os.makedirs(self.spool_path, exist_ok=True)
+        copy_name = os.path.join(self.spool_path, name[:-len('.json')] + '.att')
+        try:
+            shutil.copyfile(path, copy_name)
+        except OSError as copy_exc:
+            logging.warning('attachment [%s] not copied: %s', path, copy_exc)
+            return path
+        return copy_name
+
+    def _remove_snapshot(self, mail: dict):
+        if mail['path'].startswith(self.spool_path + os.sep) and os.path.isfile(mail['path']):
+            os.remove(mail['path'])
+
+    def _write_mail(self, name: str, mail: dict):
+        os.makedirs(self.spool_path, exist_ok=True)
+        file_name = os.path.join(self.spool_path, name)
+        with open(file_name + '.tmp', 'w') as file:
+            json.dump(mail, file)
+        os.replace(file_name + '.tmp', file_name)
+
+    def _read_queue(self):
+        """Return all queued mails as (name, mail) sorted by their age."""
+        mails = []
+        try:
+            names = sorted(name for name in os.listdir(self.spool_path) if name.endswith('.json'))
+        except OSError:
+            return mails
+        for name in names:
+            try:
+                with open(os.path.join(self.spool_path, name)) as file:
+                    mails.append((name, json.load(file)))
+            except (OSError, ValueError):
+                logging.warning('removing unreadable mail %s', name)
+                os.remove(os.path.join(self.spool_path, name))
+        return mails
+
+    def _deliver(self, mail: dict):
+        """Try all pending transports of the mail. Returns the transports still failing."""
+        failed = []
+        for transport in mail['transports']:
+            try:
+                if transport == 'mailgun':
+                    self._use_mailgun(subject=mail['subject'], body=mail['body'])
+                else:
+                    self._use_smtp(subject=mail['subject'], body=mail['body'], path=mail['path'],
+                                   attach_name=mail.get('attach_name'))
+            except Exception as mail_exc:
+                logging.error('%s Mail delivery: Failed - %s', transport, mail_exc)
+                failed.append(transport)
+        return failed
+
+    def _process_queue(self):
+        """Deliver all due mails in one batch and return the secs until the next mail is due."""
+        now = time.time()
+        wait = None
+        for name, mail in self._read_queue():
+            if mail['next_try'] > now:
+                delay = mail['next_try'] - now
+                wait = delay if wait is None else min(wait, delay)
+                continue
+            mail['transports'] = self._deliver(mail)
+            if not mail['transports']:
+                logging.debug('mail [%s] delivered', mail['subject'])
+                os.remove(os.path.join(self.spool_path, name))
+                self._remove_snapshot(mail)
+                continue
+            mail['tries'] += 1
+            if mail['tries'] >= self.MAX_TRIES:
+                logging.error('mail [%s] finally failed after %i tries', mail['subject'], mail['tries'])
+                os.replace(os.path.join(self.spool_path, name), os.path.join(self.spool_path, name + '.failed'))
+                continue
+            delay = min(self.RETRY_BASE * 2 ** (mail['tries'] - 1), self.RETRY_MAX)
+            mail['next_try'] = time.time() + delay
+            logging.info('mail [%s] try %i failed - next try in %isecs', mail['subject'], mail['tries'], delay)
+            self._write_mail(name, mail)
+            wait = delay if wait is None else min(wait, delay)
+        return wait
+
+    def run(self):
+        """Call by threading.Thread start() function."""
+        logging.info('mail_queue ready')
+        while True:
+            wait = self._process_queue()
+            if self.smtp_conn and time.time() - self.smtp_used > self.SMTP_IDLE:
+                self._close_smtp()
+            if self.smtp_conn:
+                wait = self.SMTP_IDLE if wait is None else min(wait, self.SMTP_IDLE)
+            with self.condition:
+                if not self.pending:  # else a mail came in while the queue was processed
+                    self.condition.wait(timeout=wait)
+                self.pending = False
+
+
+class PgnArchive(threading.Thread):
+
+    """Write the games in the background and keep a side index for fast retrieval."""
+
+    def __init__(self, file_name: str, emailer: Emailer, max_size=10 * 1024 * 1024):
+        super(PgnArchive, self).__init__(daemon=True)
+        self.file_name = file_name
+        self.index_name = file_name + '.idx'
+        self.emailer = emailer
+        self.max_size = max_size  # rotate the archive if its bigger than this (0 = never)
+
+        self.write_queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.index = []  # one dict for each game: offset, length, headers, result, date, hash
+        self.index_loaded = threading.Event()
+
+    @staticmethod
+    def _index_entry(offset: int, length: int, headers, board: chess.Board):
+        return {
+            'offset': offset,
+            'length': length,
+            'headers': dict(headers),
+            'result': headers.get('Result', '*'),
+            'date': headers.get('Date', '????.??.??'),
+            'hash': '{:016x}'.format(chess.polyglot.zobrist_hash(board))
+        }
+
+    def _file_size(self):
+        try:
+            return os.path.getsize(self.file_name)
+        except OSError:
+            return 0
+
+    def _load_index(self):
+        """Read the side index and rebuild it, if its not in sync with the pgn file."""
+        index = []
+        try:
+            with open(self.index_name, 'r') as file:
+                for line in file:
+                    index.append(json.loads(line))
+        except (OSError, ValueError):
+            logging.debug('no valid index found for [%s]', self.file_name)
+            index = None
+
+        file_size = self._file_size()
+        archive_size = index[-1]['offset'] + index[-1]['length'] if index else 0
+        if index is None or archive_size != file_size:
+            self.reindex()
+        else:
+            with self.lock:
+                self.index = index
+            logging.debug('index loaded for [%s] with %i games', self.file_name, len(index))
+
+    def reindex(self):
+        """Rebuild the side index by scanning the complete pgn file."""
+        logging.debug('rebuilding index for [%s]', self.file_name)
+        index = []
+        if self._file_size():
+            with open(self.file_name, 'r', encoding='utf-8', errors='replace') as file:
+                offsets = [offset for offset, _ in chess.pgn.scan_headers(file)]
+                for number, offset in enumerate(offsets):
+                    file.seek(offset)
+                    game = chess.pgn.read_game(file)
+                    if game is None:
+                        break
+                    end = offsets[number + 1] if number + 1 < len(offsets) else self._file_size()
+                    index.append(self._index_entry(offset, end - offset, game.headers, game.end().board()))
+        with self.lock:
+            self.index = index
+            self._write_index()
+        logging.debug('index rebuild for [%s] with %i games', self.file_name, len(index))
+
+    def _write_index(self):
+        with open(self.index_name, 'w') as file:
+            for entry in self.index:
+                file.write(json.dumps(entry) + '\n')
+
+    def _rotate(self):
+        """Move a too big archive away (compressed) and start an empty one."""
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        root, ext = os.path.splitext(self.file_name)
+        rotated = '{}-{}{}'.format(root, stamp, ext)
+        logging.debug('rotating [%s] to [%s.gz]', self.file_name, rotated)
+        with self.lock:
+            with open(self.file_name, 'rb') as f_in, gzip.open(rotated + '.gz', 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            os.replace(self.index_name, rotated + '.gz.idx')
+            os.remove(self.file_name)
+            self.index = []
+
+    def _save_game(self, pgn_game: chess.pgn.Game, board: chess.Board):
+        if self.max_size and self._file_size() > self.max_size:
+            self._rotate()
+        data = (str(pgn_game) + '\n\n').encode('utf-8')
+        with self.lock:
+            with open(self.file_name, 'ab') as file:
+                file.seek(0, os.SEEK_END)
+                offset = file.tell()
+                file.write(data)
+            entry = self._index_entry(offset, len(data), pgn_game.headers, board)
+            self.index.append(entry)
+            with open(self.index_name, 'a') as file:
+                file.write(json.dumps(entry) + '\n')
+        logging.debug('game %i saved to [%s]', len(self.index), self.file_name)
+        self.emailer.send('Game PGN', str(pgn_game), self.file_name)
+
+    def put(self, pgn_game: chess.pgn.Game, board: chess.Board):
+        """Queue a game (plus its final board) for saving."""
+        self.write_queue.put((pgn_game, board))
+
+    def __len__(self):
+        with self.lock:
+            return len(self.index)
+
+    def entry(self, number: int):
+        """Return the index entry of game number (0 = first game)."""
+        with self.lock:
+            return self.index[number]
+
+    def read_text(self, number: int):
+        """Return the pgn text of game number without parsing the archive."""
+        entry = self.entry(number)
+        with self.lock:
+            with open(self.file_name, 'rb') as file:
+                file.seek(entry['offset'])
+                return file.read(entry['length']).decode('utf-8', errors='replace')
+
+    def read_game(self, number: int):
+        """Return game number as chess.pgn.Game."""
+        entry = self.entry(number)
+        with self.lock:
+            with open(self.file_name, 'r', encoding='utf-8', errors='replace') as file:
+                file.seek(entry['offset'])
+                return chess.pgn.read_game(file)
+
+    def find(self, **filters):
+        """Yield (number, entry) of all games matching the filters (result, date, hash or any header)."""
+        with self.lock:
+            index = list(self.index)
+        for number, entry in enumerate(index):
+            for key, value in filters.items():
+                found = entry[key] if key in ('result', 'date', 'hash') else entry['headers'].get(key)
+                if found != value:
+                    break
+            else:
+                yield number, entry
+
+    def run(self):
+        """Call by threading.Thread start() function."""
+        logging.info('pgn_archive ready')
+        self._load_index()
+        self.index_loaded.set()
+        while True:
+            pgn_game, board = self.write_queue.get()
+            try:
+                self._save_game(pgn_game, board)
+            except OSError as os_exc:
+                logging.error('game not saved to [%s]: %s', self.file_name, os_exc)
+            self.write_queue.task_done()
 
 
 class PgnDisplay(MsgDisplay, threading.Thread):
 
     """Deal with DisplayMessages related to pgn."""
 
-    def __init__(self, file_name: str, emailer: Emailer):
+    def __init__(self, archive: PgnArchive):
         super(PgnDisplay, self).__init__()
-        self.file_name = file_name
-        self.emailer = emailer
+        self.archive = archive
 
         self.engine_name = '?'
         self.old_engine = '?'
@@ -161,10 +473,22 @@ class PgnDisplay(MsgDisplay, threading.Thread):
         self.user_elo = '-'
         self.engine_elo = '-'
         self.startime = datetime.datetime.now().strftime('%H:%M:%S')
+        self.subscribe({
+            Message.SYSTEM_INFO: self._on_system_info,
+            Message.IP_INFO: self._on_ip_info,
+            Message.STARTUP_INFO: self._on_startup_info,
+            Message.NEW_LEVEL: self._on_new_level,
+            Message.INTERACTION_MODE: self._on_interaction_mode,
+            Message.ENGINE_STARTUP: self._on_engine_startup,
+            Message.ENGINE_READY: self._on_engine_ready,
+            Message.GAME_ENDS: self._on_game_ends,
+            Message.NEW_GAME: self._on_new_game,
+        })
 
     def _save_and_email_pgn(self, message):
-        logging.debug('Saving game to [%s]', self.file_name)
-        pgn_game = chess.pgn.Game().from_board(message.game)
+        logging.debug('Saving game to [%s]', self.archive.file_name)
+        board = message.game.board()
+        pgn_game = chess.pgn.Game().from_board(board)
 
         # Headers
         pgn_game.headers['Event'] = 'PicoChess game'
@@ -202,65 +526,53 @@ class PgnDisplay(MsgDisplay, threading.Thread):
 
         pgn_game.headers['Time'] = self.startime
 
-        # Save to file
-        file = open(self.file_name, 'a')
-        exporter = chess.pgn.FileExporter(file)
-        pgn_game.accept(exporter)
-        file.flush()
-        file.close()
-        self.emailer.send('Game PGN', str(pgn_game), self.file_name)
+        # Save to file (and send the email) in the background
+        self.archive.put(pgn_game, board)
 
-    def _process_message(self, message):
-        if False:  # switch-case
-            pass
+    def _on_system_info(self, message):
+        self.engine_name = message.info['engine_name']
+        self.old_engine = self.engine_name
+        self.user_name = message.info['user_name']
+        self.user_elo = message.info['user_elo']
 
-        elif isinstance(message, Message.SYSTEM_INFO):
-            self.engine_name = message.info['engine_name']
-            self.old_engine = self.engine_name
-            self.user_name = message.info['user_name']
-            self.user_elo = message.info['user_elo']
-
-        elif isinstance(message, Message.IP_INFO):
-            self.location = message.info['location']
-
-        elif isinstance(message, Message.STARTUP_INFO):
-            self.level_text = message.info['level_text']
-            self.level_name = message.info['level_name']
-
-        elif isinstance(message, Message.NEW_LEVEL):
-            self.level_text = message.level_text
-            self.level_name = message.level_name
-
-        elif isinstance(message, Message.INTERACTION_MODE):
-            if message.mode == Mode.REMOTE:
-                self.old_engine = self.engine_name
-                self.engine_name = 'Remote Player'
-            else:
-                self.engine_name = self.old_engine
+    def _on_ip_info(self, message):
+        self.location = message.info['location']
 
-        elif isinstance(message, Message.ENGINE_STARTUP):
-            for index in range(0, len(message.installed_engines)):
-                eng = message.installed_engines[index]
-                if eng['file'] == message.file:
-                    self.engine_elo = eng['elo']
-                    break
-
-        elif isinstance(message, Message.ENGINE_READY):
-            self.old_engine = self.engine_name = message.engine_name
-            self.engine_elo = message.eng['elo']
-            if not message.has_levels:
-                self.level_text = None
-                self.level_name = ''
-
-        elif isinstance(message, Message.GAME_ENDS):
-            if message.game.move_stack:
-                self._save_and_email_pgn(message)
+    def _on_startup_info(self, message):
+        self.level_text = message.info['level_text']
+        self.level_name = message.info['level_name']
 
-        elif isinstance(message, Message.NEW_GAME):
-            self.startime = datetime.datetime.now().strftime('%H:%M:%S')
+    def _on_new_level(self, message):
+        self.level_text = message.level_text
+        self.level_name = message.level_name
 
-        else:  # Default
-            pass
+    def _on_interaction_mode(self, message):
+        if message.mode == Mode.REMOTE:
+            self.old_engine = self.engine_name
+            self.engine_name = 'Remote Player'
+        else:
+            self.engine_name = self.old_engine
+
+    def _on_engine_startup(self, message):
+        for index in range(0, len(message.installed_engines)):
+            eng = message.installed_engines[index]
+            if eng['file'] == message.file:
+                self.engine_elo = eng['elo']
+                break
+
+    def _on_engine_ready(self, message):
+        self.old_engine = self.engine_name = message.engine_name
+        self.engine_elo = message.eng['elo']
+        if not message.has_levels:
+            self.level_text = None
+            self.level_name = ''
+
+    def _on_game_ends(self, message):
+        if message.game.move_stack:
+            self._save_and_email_pgn(message)
+
+    def _on_new_game(self, message):
+        self.startime = datetime.datetime.now().strftime('%H:%M:%S')
 
     def run(self):
         """Call by threading.Thread start() function."""
@@ -269,6 +581,6 @@ class PgnDisplay(MsgDisplay, threading.Thread):
             # Check if we have something to display
             try:
                 message = self.msg_queue.get()
-                self._process_message(message)
+                self.dispatch(message)
             except queue.Empty:
                 pass
@@ -19,11 +19,11 @@
 
 import sys
 import os
+import atexit
 import threading
 import copy
 import gc
 import logging
-from logging.handlers import RotatingFileHandler
 import time
 import queue
 import configargparse
@@ -36,17 +36,18 @@ import chess.polyglot
 import chess.uci
 
 from timecontrol import TimeControl
-from utilities import get_location, update_picochess, get_opening_books, shutdown, reboot, checkout_tag
+from utilities import LocationService, update_picochess, get_opening_books, shutdown, reboot, checkout_tag
 from utilities import EvtObserver, MsgDisplay, version, evtobserver_queue, write_picochess_ini, hms_time, RepeatedTimer
-from pgn import Emailer, PgnDisplay
-from server import WebServer
-from talker.picotalker import PicoTalkerDisplay
+from utilities import tracer, evt_dispatcher, ini_store
+from tablebase import tablebase
+from scheduling import scheduler
+from logpipe import log_pipeline
+from gamestate import GameBoard, GameSnapshot, game_state
+from pgn import Emailer, PgnArchive, PgnDisplay
 from dispatcher import Dispatcher
 
 from dgt.api import Message, Event
 from dgt.util import GameResult, TimeMode, Mode, PlayMode
-from dgt.hw import DgtHw
-from dgt.pi import DgtPi
 from dgt.display import DgtDisplay
 from dgt.board import DgtBoard
 from dgt.translate import DgtTranslate
@@ -55,6 +56,39 @@ from dgt.menu import DgtMenu
 from dgt.cn import DgtCn
 
 
+BOOT_TIME = time.time()  # taken after the imports - the profiler starts here
+IMPORT_CPU = time.process_time()  # nearly all cpu time till here is spent by the imports
+
+
+class StartupProfiler(object):
+
+    """Measure how long each phase of the startup takes."""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.last = BOOT_TIME
+        self.phases = [('imports (cpu)', IMPORT_CPU)]
+
+    def mark(self, phase: str):
+        """Finish the running phase and start the next one."""
+        now = time.time()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def add(self, phase: str, secs: float):
+        """Add a phase which was running in parallel to the others."""
+        self.phases.append((phase, secs))
+
+    def report(self):
+        """Log (and print if enabled) the phase timings."""
+        total = self.last - BOOT_TIME + IMPORT_CPU
+        lines = ['{:<28}{:8.3f}s'.format(phase, secs) for phase, secs in self.phases]
+        lines.append('{:<28}{:8.3f}s'.format('total', total))
+        logging.debug('startup timings:\n%s', '\n'.join(lines))
+        if self.enabled:
+            print('\n'.join(lines), flush=True)
+
+
 class AlternativeMover:
 
     """Keep track of alternative moves."""
@@ -98,10 +132,9 @@ class AlternativeMover:
 
 def main():
     """Main function."""
-    def display_ip_info():
+    def display_ip_info(info: dict):
         """Fire an IP_INFO message with the IP adr."""
-        location, ext_ip, int_ip = get_location()
-        info = {'location': location, 'ext_ip': ext_ip, 'int_ip': int_ip, 'version': version}
+        info['version'] = version
         MsgDisplay.show(Message.IP_INFO(info=info))
 
     def expired_fen_timer():
@@ -148,12 +181,24 @@ def main():
         """
         Start a new search on the current game.
 
-        If a move is found in the opening book, fire an event in a few seconds.
+        If a move is found in the opening book (or the tablebases), fire an event in a few seconds.
         """
         start_clock(wait=True)
         book_res = searchmoves.book(bookreader, game.copy())
+        # searchmoves: an alternative move must not be the same tablebase move again
+        tb_move = tablebase.best_move(game, searchmoves.all(game)) if args.tablebase_moves and not book_res else None
+        spec_res = engine.speculated(game) if not (book_res or tb_move or searchmoves.excludemoves) else None
         if book_res:
             EvtObserver.fire(Event.BEST_MOVE(move=book_res.bestmove, ponder=book_res.ponder, inbook=True))
+        elif tb_move:
+            game_copy = game.copy()
+            game_copy.push(tb_move)
+            tb_ponder = tablebase.best_move(game_copy) or chess.Move.null()
+            logging.debug('tablebase move [%s] ponder [%s]', tb_move, tb_ponder)
+            EvtObserver.fire(Event.BEST_MOVE(move=tb_move, ponder=tb_ponder, inbook=False))
+        elif spec_res:
+            logging.debug('speculative move [%s] ponder [%s]', spec_res.bestmove, spec_res.ponder)
+            EvtObserver.fire(Event.BEST_MOVE(move=spec_res.bestmove, ponder=spec_res.ponder, inbook=False))
         else:
             while not engine.is_waiting():
                 time.sleep(0.05)
@@ -163,6 +208,30 @@ def main():
             engine.position(copy.deepcopy(game))
             engine.go(uci_dict)
 
+    def speculate(game: chess.Board, timec: TimeControl):
+        """Search the likely user replies (ponder move first, then the book moves) while the user thinks."""
+        if not args.speculative_moves or not engine.is_waiting():
+            return
+        candidates = [pb_move] if pb_move else []
+        entries = sorted(bookreader.find_all(game), key=lambda entry: entry.weight, reverse=True)
+        candidates.extend(entry.move() for entry in entries if entry.move() != pb_move)
+        games = []
+        for move in candidates:
+            if len(games) >= args.speculative_moves:
+                break
+            if not game.is_legal(move):
+                continue
+            game_copy = game.copy()
+            game_copy.push(move)
+            if game_state(game_copy).result is not None or next(bookreader.find_all(game_copy), None):
+                continue  # nothing to search (think() answers from the book)
+            if args.tablebase_moves and tablebase.covers(game_copy):
+                continue
+            games.append(game_copy)
+        if games:
+            logging.debug('speculating on user moves %s', [game_copy.peek().uci() for game_copy in games])
+            engine.speculate(games, timec.uci())
+
     def analyse(game: chess.Board, start=False):
         """Start a new ponder search on the current game."""
         game_end = check_game_state(game, play_mode)  # type: Message
@@ -173,6 +242,10 @@ def main():
                 start_clock(wait=True)  # just in case: start the clock first - but need to wait for "before send msg"
             engine.position(copy.deepcopy(game))
             engine.ponder()
+            tb_res = tablebase.probe(game)
+            if tb_res:  # the engine searches anyway, but the exact result is known already
+                MsgDisplay.show(Message.TABLEBASE_RESULT(result=tablebase.result(game), dtz=tb_res[1],
+                                                         game=GameSnapshot(game)))
 
     def observe(game: chess.Board):
         """Start a new ponder search on the current game."""
@@ -241,22 +314,14 @@ def main():
         :param play_mode:
         :return: False is the game continues, Game_Ends() Message if it has ended
         """
-        result = None
-        if game.is_stalemate():
-            result = GameResult.STALEMATE
-        if game.is_insufficient_material():
-            result = GameResult.INSUFFICIENT_MATERIAL
-        if game.is_seventyfive_moves():
-            result = GameResult.SEVENTYFIVE_MOVES
-        if game.is_fivefold_repetition():
-            result = GameResult.FIVEFOLD_REPETITION
-        if game.is_checkmate():
-            result = GameResult.MATE
+        result = game_state(game).result
+        if result is None and args.tablebase_adjudicate and interaction_mode in (Mode.NORMAL, Mode.BRAIN):
+            result = tablebase.result(game)
 
         if result is None:
             return False
         else:
-            return Message.GAME_ENDS(result=result, play_mode=play_mode, game=game.copy())
+            return Message.GAME_ENDS(result=result, play_mode=play_mode, game=GameSnapshot(game))
 
     def user_move(move: chess.Move, sliding: bool):
         """Handle an user move."""
@@ -288,7 +353,7 @@ def main():
             game.push(move)
             searchmoves.reset()
             if interaction_mode in (Mode.NORMAL, Mode.BRAIN):
-                MsgDisplay.show(Message.USER_MOVE_DONE(move=move, fen=fen, turn=turn, game=game.copy()))
+                MsgDisplay.show(Message.USER_MOVE_DONE(move=move, fen=fen, turn=turn, game=GameSnapshot(game)))
                 game_end = check_game_state(game, play_mode)
                 if game_end:
                     MsgDisplay.show(game_end)
@@ -301,7 +366,7 @@ def main():
                         start_clock(wait=True)
                         engine.hit()  # finally tell the engine
             elif interaction_mode == Mode.REMOTE:
-                msg = Message.USER_MOVE_DONE(move=move, fen=fen, turn=turn, game=game.copy())
+                msg = Message.USER_MOVE_DONE(move=move, fen=fen, turn=turn, game=GameSnapshot(game))
                 game_end = check_game_state(game, play_mode)  # type: Message
                 if game_end:
                     MsgDisplay.show(msg)
@@ -309,14 +374,14 @@ def main():
                 else:
                     observe(game)
             elif interaction_mode == Mode.OBSERVE:
-                MsgDisplay.show(Message.REVIEW_MOVE_DONE(move=move, fen=fen, turn=turn, game=game.copy()))
+                MsgDisplay.show(Message.REVIEW_MOVE_DONE(move=move, fen=fen, turn=turn, game=GameSnapshot(game)))
                 game_end = check_game_state(game, play_mode)  # type: Message
                 if game_end:
                     MsgDisplay.show(game_end)
                 else:
                     observe(game)
             else:  # interaction_mode in (Mode.ANALYSIS, Mode.KIBITZ, Mode.PONDER):
-                MsgDisplay.show(Message.REVIEW_MOVE_DONE(move=move, fen=fen, turn=turn, game=game.copy()))
+                MsgDisplay.show(Message.REVIEW_MOVE_DONE(move=move, fen=fen, turn=turn, game=GameSnapshot(game)))
                 game_end = check_game_state(game, play_mode)  # type: Message
                 if game_end:
                     MsgDisplay.show(game_end)
@@ -416,6 +481,8 @@ def main():
                 start_clock(wait=True)
                 if interaction_mode == Mode.BRAIN:
                     brain(game, time_control)
+                if interaction_mode == Mode.NORMAL:
+                    speculate(game, time_control)
 
                 legal_fens = compute_legal_fens(game.copy())
             last_legal_fens = []
@@ -439,7 +506,8 @@ def main():
                     done_move = pb_move = chess.Move.null()
                     searchmoves.reset()
 
-                    set_wait_state(Message.TAKE_BACK(game=game.copy()))  # new: force stop no matter if picochess turn
+                    # new: force stop no matter if picochess turn
+                    set_wait_state(Message.TAKE_BACK(game=GameSnapshot(game)))
                     break
         # doing issue #152
         logging.debug('fen: %s result: %s', fen, handled_fen)
@@ -554,6 +622,30 @@ def main():
     parser.add_argument('-erk', '--engine-remote-key', type=str, help='key file for the remote engine server')
     parser.add_argument('-erh', '--engine-remote-home', type=str, help='engine home path for the remote engine server',
                         default='')
+    parser.add_argument('-noar', '--disable-auto-resources', action='store_true',
+                        help='dont size the engine threads & hash from the cores and free memory of its host')
+    parser.add_argument('-erc', '--engine-reserve-cores', type=int, default=1,
+                        help='cores the engine leaves free for picochess (board & clock I/O)')
+    parser.add_argument('-erm', '--engine-reserve-mem', type=int, default=64,
+                        help='MB of free memory the engine hash leaves for picochess')
+    parser.add_argument('-noer', '--disable-engine-recovery', action='store_true',
+                        help='dont respawn a crashed engine (and resume its search)')
+    parser.add_argument('-ews', '--engine-warm-spare', action='store_true',
+                        help='keep a started spare engine process for a faster crash recovery')
+    parser.add_argument('-ec', '--engine-cores', type=str, default=None,
+                        help="cores the (local) engine runs on such as '1-3' - picochess keeps the others")
+    parser.add_argument('-en', '--engine-nice', type=int, default=0, choices=range(0, 20),
+                        help='nice value of the engine process')
+    parser.add_argument('-ion', '--io-nice', type=int, default=0, choices=range(-20, 20),
+                        help='nice value of the board, clock and web threads (a negative value needs root)')
+    parser.add_argument('-spm', '--speculative-moves', type=int, default=0, choices=range(0, 9),
+                        help='number of predicted user replies the engine searches in advance in normal mode')
+    parser.add_argument('-tb', '--tablebase-path', type=str, default=None,
+                        help="folder of the syzygy tablebases such as 'tablebases/syzygy'")
+    parser.add_argument('-tbm', '--tablebase-moves', action='store_true',
+                        help='play tablebase positions instantly (and perfect) without the engine')
+    parser.add_argument('-tba', '--tablebase-adjudicate', action='store_true',
+                        help='end the game as soon as its tablebase result is known')
     parser.add_argument('-d', '--dgt-port', type=str,
                         help="enable dgt board on the given serial port such as '/dev/ttyUSB0'")
     parser.add_argument('-b', '--book', type=str, help="path of book such as 'books/b-flank.bin'",
@@ -565,9 +657,13 @@ def main():
     parser.add_argument('-l', '--log-level', choices=['notset', 'debug', 'info', 'warning', 'error', 'critical'],
                         default='warning', help='logging level')
     parser.add_argument('-lf', '--log-file', type=str, help='log to the given file')
+    parser.add_argument('-lr', '--log-rate', type=str, default='50',
+                        help="max debug/info records per sec and module such as '50,board:10' (0=unlimited)")
     parser.add_argument('-pf', '--pgn-file', type=str, help='pgn file used to store the games', default='games.pgn')
     parser.add_argument('-pu', '--pgn-user', type=str, help='user name for the pgn file', default=None)
     parser.add_argument('-pe', '--pgn-elo', type=str, help='user elo for the pgn file', default='-')
+    parser.add_argument('-pm', '--pgn-max-size', type=int, default=0,
+                        help='size in MB after the pgn file gets rotated and compressed (0=never)')
     parser.add_argument('-w', '--web-server', dest='web_server_port', nargs='?', const=80, type=int, metavar='PORT',
                         help='launch web server')
     parser.add_argument('-m', '--email', type=str, help='email used to send pgn/log files', default=None)
@@ -589,6 +685,8 @@ def main():
                         default=2, choices=range(0, 10))
     parser.add_argument('-sp', '--enable-setpieces-voice', action='store_true',
                         help="speak last computer move again when 'set pieces' displayed")
+    parser.add_argument('-prv', '--enable-prerender-voice', action='store_true',
+                        help="prepare the announcement of the engine's ponder move in advance")
     parser.add_argument('-u', '--enable-update', action='store_true', help='enable picochess updates')
     parser.add_argument('-ur', '--enable-update-reboot', action='store_true', help='reboot system after update')
     parser.add_argument('-nocm', '--disable-confirm-message', action='store_true', help='disable confirmation messages')
@@ -597,6 +695,8 @@ def main():
     parser.add_argument('-pi', '--dgtpi', action='store_true', help='use the DGTPi hardware')
     parser.add_argument('-pt', '--ponder-interval', type=int, default=3, choices=range(1, 9),
                         help='how long each part of ponder display should be visible (default=3secs)')
+    parser.add_argument('-al', '--analysis-lines', type=int, default=1, choices=range(1, 9),
+                        help='number of lines (MultiPV) the engine sends to the web clients in the analysis modes')
     parser.add_argument('-lang', '--language', choices=['en', 'de', 'nl', 'fr', 'es', 'it'], default='en',
                         help='picochess language')
     parser.add_argument('-c', '--enable-console', action='store_true', help='use console interface')
@@ -605,15 +705,18 @@ def main():
     parser.add_argument('-ss', '--slow-slide', type=int, default=0, choices=range(0, 10),
                         help='extra wait time factor for a stable board position (sliding detect)')
     parser.add_argument('-nosn', '--disable-short-notation', action='store_true', help='disable short notation')
+    parser.add_argument('-loc', '--location', type=str, default='auto',
+                        help="where you are playing (for the pgn header) - 'auto' looks it up online")
+    parser.add_argument('-ps', '--profile-startup', action='store_true',
+                        help='print how long each startup phase takes')
 
     args, unknown = parser.parse_known_args()
 
     # Enable logging
-    if args.log_file:
-        handler = RotatingFileHandler('logs' + os.sep + args.log_file, maxBytes=1.4 * 1024 * 1024, backupCount=5)
-        logging.basicConfig(level=getattr(logging, args.log_level.upper()),
-                            format='%(asctime)s.%(msecs)03d %(levelname)7s %(module)10s - %(funcName)s: %(message)s',
-                            datefmt="%Y-%m-%d %H:%M:%S", handlers=[handler])
+    if args.log_file:  # the file is written by a background thread
+        log_pipeline.start('logs' + os.sep + args.log_file, getattr(logging, args.log_level.upper()), args.log_rate,
+                           max_bytes=int(1.4 * 1024 * 1024), backup_count=5)
+        atexit.register(log_pipeline.stop)  # write the queued records also on a ctrl-c or a service stop
     logging.getLogger('chess.engine').setLevel(logging.INFO)  # don't want to get so many python-chess uci messages
 
     logging.debug('#' * 20 + ' PicoChess v%s ' + '#' * 20, version)
@@ -623,6 +726,48 @@ def main():
     logging.debug('startup parameters: %s', a_copy)
     if unknown:
         logging.warning('invalid parameter given %s', unknown)
+    atexit.register(ini_store.flush)  # write the last menu changes also on a ctrl-c or a service stop
+    profiler = StartupProfiler(args.profile_startup)
+    scheduler.configure(args.engine_cores, args.engine_nice, args.io_nice)  # before any thread starts
+    profiler.mark('arguments & logging')
+
+    # try the given engine first and if that fails the first/second from "engines.ini" then crush
+    # the engine handshake runs in parallel to the board discovery and the start of all other subsystems
+    engine_file = args.engine if args.engine_remote_server is None else args.engine_remote
+    engine_home = 'engines' + os.sep + machine() if args.engine_remote_server is None else args.engine_remote_home.rstrip(os.sep)
+    engine_start = {'engine': None, 'name': None, 'tries': 0, 'shell': None}
+
+    def _start_engine():
+        start = time.time()
+        engine_tries = 0
+        eng_file = engine_file
+        uci_shell = UciShell(hostname=args.engine_remote_server, username=args.engine_remote_user,
+                             key_file=args.engine_remote_key, password=args.engine_remote_pass)
+        engine_start['shell'] = uci_shell
+        if args.engine_remote_server and not uci_shell.connected:  # dont try the engines on a dead connection
+            engine_start['tries'] = 2
+            profiler.add('engine handshake (parallel)', time.time() - start)
+            return
+        while engine_tries < 2:
+            if eng_file is None:
+                eng_ini = read_engine_ini(uci_shell if uci_shell.get_spur() else None, engine_home)
+                eng_file = eng_ini[engine_tries]['file']
+                engine_tries += 1
+            eng_file = os.path.basename(eng_file)
+            # Gentlemen, start your engines...
+            engine_start['engine'] = UciEngine(file=eng_file, uci_shell=uci_shell, home=engine_home)
+            try:
+                engine_start['name'] = engine_start['engine'].get_name()
+                break
+            except AttributeError:
+                logging.error('engine %s not started', eng_file)
+                eng_file = None
+        engine_start['tries'] = engine_tries
+        profiler.add('engine handshake (parallel)', time.time() - start)
+
+    engine_thread = threading.Thread(target=_start_engine, name='engine_startup')
+    engine_thread.start()
+
     # wire some dgt classes
     dgtboard = DgtBoard(args.dgt_port, args.disable_revelation_leds, args.dgtpi, args.disable_et, args.slow_slide)
     dgttranslate = DgtTranslate(args.beep_config, args.beep_some_level, args.language, version)
@@ -635,14 +780,28 @@ def main():
     time_text.beep = False
     # The class dgtDisplay fires Event (EvtObserver) & DispatchDgt (DgtObserver)
     DgtDisplay(dgttranslate, dgtmenu, time_control).start()
+    profiler.mark('dgt display')
 
-    # Create PicoTalker for speech output
-    PicoTalkerDisplay(args.user_voice, args.computer_voice, args.speed_voice, args.enable_setpieces_voice).start()
+    talker = {'display': None}
+
+    def start_talker():
+        """Create PicoTalker for speech output - only once a voice is used (it loads the sound libs)."""
+        if talker['display'] is None:
+            from talker.picotalker import PicoTalkerDisplay
+            talker['display'] = PicoTalkerDisplay(args.user_voice, args.computer_voice, args.speed_voice,
+                                                  args.enable_setpieces_voice, args.enable_prerender_voice)
+            talker['display'].start()
+
+    if args.user_voice or args.computer_voice:
+        start_talker()
+        profiler.mark('talker')
 
     # Launch web server
     if args.web_server_port:
+        from server import WebServer  # tornado is slow to import - only load it if needed
         WebServer(args.web_server_port, dgtboard).start()
         dgtdispatcher.register('web')
+        profiler.mark('web server')
 
     if args.enable_console:
         logging.debug('starting PicoChess in console mode')
@@ -651,11 +810,13 @@ def main():
         # Connect to DGT board
         logging.debug('starting PicoChess in board mode')
         if args.dgtpi:
+            from dgt.pi import DgtPi
             DgtPi(dgtboard).start()
             dgtdispatcher.register('i2c')
         else:
             logging.debug('(ser) starting the board connection')
             dgtboard.run()  # a clock can only be online together with the board, so we must start it infront
+        from dgt.hw import DgtHw
         DgtHw(dgtboard).start()
         dgtdispatcher.register('ser')
 
@@ -665,12 +826,17 @@ def main():
 
     # The class Dispatcher sends DgtApi messages at the correct (delayed) time out
     dgtdispatcher.start()
+    profiler.mark('board & clocks')
     # Save to PGN
     emailer = Emailer(email=args.email, mailgun_key=args.mailgun_key)
     emailer.set_smtp(sserver=args.smtp_server, suser=args.smtp_user, spass=args.smtp_pass,
                      sencryption=args.smtp_encryption, sfrom=args.smtp_from)
+    if args.email:
+        emailer.start()
 
-    PgnDisplay('games' + os.sep + args.pgn_file, emailer).start()
+    pgn_archive = PgnArchive('games' + os.sep + args.pgn_file, emailer, args.pgn_max_size * 1024 * 1024)
+    pgn_archive.start()
+    PgnDisplay(pgn_archive).start()
     if args.pgn_user:
         user_name = args.pgn_user
     else:
@@ -678,43 +844,26 @@ def main():
             user_name = args.email.split('@')[0]
         else:
             user_name = 'Player'
+    profiler.mark('pgn & email')
 
     # Update
     if args.enable_update:
         if update_picochess(dgttranslate):
             if args.enable_update_reboot:
                 reboot(args.dgtpi, dev='web')
+        profiler.mark('update')
 
-    # try the given engine first and if that fails the first/second from "engines.ini" then crush
-    engine_file = args.engine if args.engine_remote_server is None else args.engine_remote
-    engine_home = 'engines' + os.sep + machine() if args.engine_remote_server is None else args.engine_remote_home.rstrip(os.sep)
-    engine_tries = 0
-    engine = engine_name = None
-    uci_shell = UciShell(hostname=args.engine_remote_server, username=args.engine_remote_user,
-                         key_file=args.engine_remote_key, password=args.engine_remote_pass)
-    while engine_tries < 2:
-        if engine_file is None:
-            eng_ini = read_engine_ini(uci_shell.get_spur(), engine_home)
-            engine_file = eng_ini[engine_tries]['file']
-            engine_tries += 1
-        engine_file = os.path.basename(engine_file)
-        # Gentlemen, start your engines...
-        engine = UciEngine(file=engine_file, uci_shell=uci_shell, home=engine_home)
-        try:
-            engine_name = engine.get_name()
-            break
-        except AttributeError:
-            logging.error('engine %s not started', engine_file)
-            engine_file = None
-
-    if engine_tries == 2:
+    engine_thread.join()
+    profiler.mark('waiting for engine')
+    engine, engine_name, uci_shell = engine_start['engine'], engine_start['name'], engine_start['shell']
+    if engine_start['tries'] == 2:
         time.sleep(3)
         MsgDisplay.show(Message.ENGINE_FAIL())
         time.sleep(2)
         sys.exit(-1)
 
     # Startup - internal
-    game = chess.Board()  # Create the current game
+    game = GameBoard()  # Create the current game
     legal_fens = compute_legal_fens(game.copy())  # Compute the legal FENs
     all_books = get_opening_books()
     try:
@@ -723,6 +872,8 @@ def main():
         logging.warning('selected book not present, defaulting to %s', all_books[7]['file'])
         book_index = 7
     bookreader = chess.polyglot.open_reader(all_books[book_index]['file'])
+    if args.tablebase_path:
+        tablebase.open(args.tablebase_path)
     searchmoves = AlternativeMover()
     interaction_mode = Mode.NORMAL
     play_mode = PlayMode.USER_WHITE  # @todo handle Mode.REMOTE too
@@ -734,7 +885,12 @@ def main():
 
     args.engine_level = None if args.engine_level == 'None' else args.engine_level
     engine_opt, level_index = get_engine_level_dict(args.engine_level)
+    engine.set_analysis_lines(args.analysis_lines)
+    engine.set_auto_resources(not args.disable_auto_resources, args.engine_reserve_cores, args.engine_reserve_mem)
+    if not args.disable_engine_recovery:
+        engine.set_supervision(args.engine_warm_spare)
     engine.startup(engine_opt, game.copy())
+    profiler.mark('engine & book setup')
 
     # Startup - external
     level_name = args.engine_level
@@ -754,8 +910,10 @@ def main():
                                            level_index=level_index,
                                            has_960=engine.has_chess960(), has_ponder=engine.has_ponder()))
 
-    ip_info_thread = threading.Timer(10, display_ip_info)  # give RaspberyPi 10sec time to startup its network devices
-    ip_info_thread.start()
+    # show the last known location at once and update it (if changed) in the background
+    location_service = LocationService(args.location)
+    display_ip_info(location_service.cached())
+    location_service.refresh(display_ip_info)
 
     fen_timer = threading.Timer(3, expired_fen_timer)
     fen_timer_running = False
@@ -763,382 +921,462 @@ def main():
 
     pb_move = chess.Move.null()  # safes the best ponder move so far (for permanent brain use)
 
-    # Event loop
-    logging.info('evt_observer ready')
-    while True:
-        try:
-            event = evtobserver_queue.get()
-        except queue.Empty:
-            pass
+    profiler.mark('ready')
+    profiler.report()
+
+    # Event handlers - one per event class, see evt_dispatcher (its timings are part of the /trace page)
+    def on_new_fen(event):
+        process_fen(event.fen)
+
+    def on_keyboard_move(event):
+        move = event.move
+        logging.debug('keyboard move [%s]', move)
+        if move not in game.legal_moves:
+            logging.warning('illegal move. fen: [%s]', game.fen())
         else:
-            logging.debug('received event from evt_queue: %s', event)
-            if False:  # switch-case
-                pass
-            elif isinstance(event, Event.NEW_FEN):
-                process_fen(event.fen)
-
-            elif isinstance(event, Event.KEYBOARD_MOVE):
-                move = event.move
-                logging.debug('keyboard move [%s]', move)
-                if move not in game.legal_moves:
-                    logging.warning('illegal move. fen: [%s]', game.fen())
-                else:
-                    game_copy = game.copy()
-                    game_copy.push(move)
-                    fen = game_copy.board_fen()
-                    MsgDisplay.show(Message.DGT_FEN(fen=fen, raw=False))
-
-            elif isinstance(event, Event.NEW_LEVEL):
-                if event.options:
-                    engine.startup(event.options, game.copy(), False)
-                MsgDisplay.show(Message.NEW_LEVEL(level_text=event.level_text, level_name=event.level_name,
-                                                  do_speak=bool(event.options)))
-                stop_fen_timer()
-
-            elif isinstance(event, Event.NEW_ENGINE):
-                old_file = engine.get_file()
-                old_options = {}
-                raw_options = engine.get_options()
-                for name, value in raw_options.items():  # transfer Option to string by using the "default" value
-                    old_options[name] = str(value.default)
-                engine_fallback = False
-                # Stop the old engine cleanly
-                stop_search()
-                # Closeout the engine process and threads
+            game_copy = game.copy()
+            game_copy.push(move)
+            fen = game_copy.board_fen()
+            MsgDisplay.show(Message.DGT_FEN(fen=fen, raw=False))
+
+    def on_new_level(event):
+        if event.options:
+            engine.startup(event.options, game.copy(), False)
+        MsgDisplay.show(Message.NEW_LEVEL(level_text=event.level_text, level_name=event.level_name,
+                                          do_speak=bool(event.options)))
+        stop_fen_timer()
+
+    def on_new_engine(event):
+        nonlocal engine
+        nonlocal engine_name
+        old_file = engine.get_file()
+        old_options = {}
+        raw_options = engine.get_options()
+        for name, value in raw_options.items():  # transfer Option to string by using the "default" value
+            old_options[name] = str(value.default)
+        engine_fallback = False
+        # Stop the old engine cleanly
+        stop_search()
+        # Closeout the engine process and threads
+        if engine.quit():
+            # Load the new one and send args.
+            engine = UciEngine(file=event.eng['file'], uci_shell=uci_shell)
+            try:
+                engine_name = engine.get_name()
+            except AttributeError:
+                # New engine failed to start, restart old engine
+                logging.error('new engine failed to start, reverting to %s', old_file)
+                engine_fallback = True
+                event.options = old_options
+                engine = UciEngine(file=old_file, uci_shell=uci_shell)
+                try:
+                    engine_name = engine.get_name()
+                except AttributeError:
+                    # Help - old engine failed to restart. There is no engine
+                    logging.error('no engines started')
+                    MsgDisplay.show(Message.ENGINE_FAIL())
+                    time.sleep(3)
+                    sys.exit(-1)
+            # All done - rock'n'roll
+            if interaction_mode == Mode.BRAIN and not engine.has_ponder():
+                logging.debug('new engine doesnt support brain mode, reverting to %s', old_file)
+                engine_fallback = True
                 if engine.quit():
-                    # Load the new one and send args.
-                    engine = UciEngine(file=event.eng['file'], uci_shell=uci_shell)
-                    try:
-                        engine_name = engine.get_name()
-                    except AttributeError:
-                        # New engine failed to start, restart old engine
-                        logging.error('new engine failed to start, reverting to %s', old_file)
-                        engine_fallback = True
-                        event.options = old_options
-                        engine = UciEngine(file=old_file, uci_shell=uci_shell)
-                        try:
-                            engine_name = engine.get_name()
-                        except AttributeError:
-                            # Help - old engine failed to restart. There is no engine
-                            logging.error('no engines started')
-                            MsgDisplay.show(Message.ENGINE_FAIL())
-                            time.sleep(3)
-                            sys.exit(-1)
-                    # All done - rock'n'roll
-                    if interaction_mode == Mode.BRAIN and not engine.has_ponder():
-                        logging.debug('new engine doesnt support brain mode, reverting to %s', old_file)
-                        engine_fallback = True
-                        if engine.quit():
-                            engine = UciEngine(file=old_file, uci_shell=uci_shell)
-                            event.options = old_options
-                        else:
-                            logging.error('engine shutdown failure')
-                    engine.startup(event.options, game.copy())
-                    set_engine_mode()
-                    if engine_fallback:
-                        msg = Message.ENGINE_FAIL()
-                    else:
-                        searchmoves.reset()
-                        msg = Message.ENGINE_READY(eng=event.eng, engine_name=engine_name,
-                                                   eng_text=event.eng_text, has_levels=engine.has_levels(),
-                                                   has_960=engine.has_chess960(), has_ponder=engine.has_ponder(),
-                                                   show_ok=event.show_ok)
-                    # Schedule cleanup of old objects
-                    gc.collect()
-                    set_wait_state(msg, not engine_fallback)
-                    if interaction_mode in (Mode.NORMAL, Mode.BRAIN):  # engine isnt started/searching => stop the clock
-                        stop_clock(wait=True)
+                    engine = UciEngine(file=old_file, uci_shell=uci_shell)
+                    event.options = old_options
                 else:
                     logging.error('engine shutdown failure')
-                    MsgDisplay.show(Message.ENGINE_FAIL())
-                # here dont care if engine supports pondering, cause Mode.NORMAL from startup
-                if not engine_fallback and not args.engine_remote_server:  # dont write engine(_level) if remote engine
-                    write_picochess_ini('engine', event.eng['file'])
-
-            elif isinstance(event, Event.SETUP_POSITION):
-                logging.debug('setting up custom fen: %s', event.fen)
-                uci960 = event.uci960
-
-                if game.move_stack:
-                    if not (game.is_game_over() or game_declared):
-                        result = GameResult.ABORT
-                        MsgDisplay.show(Message.GAME_ENDS(result=result, play_mode=play_mode, game=game.copy()))
-                game = chess.Board(event.fen, uci960)
-                # see new_game
-                stop_search_and_clock()
-                engine.chess960_send(uci960)
-                engine.newgame(game.copy())
-                done_computer_fen = None
-                done_move = pb_move = chess.Move.null()
-                time_control.reset()
+            engine.set_analysis_lines(args.analysis_lines)
+            engine.set_auto_resources(not args.disable_auto_resources, args.engine_reserve_cores,
+                                      args.engine_reserve_mem)
+            if not args.disable_engine_recovery:
+                engine.set_supervision(args.engine_warm_spare)
+            engine.startup(event.options, game.copy())
+            set_engine_mode()
+            if engine_fallback:
+                msg = Message.ENGINE_FAIL()
+            else:
                 searchmoves.reset()
-                game_declared = False
-                set_wait_state(Message.NEW_GAME(game=game.copy(), newgame=True))
-
-            elif isinstance(event, Event.NEW_GAME):
-                newgame = game.move_stack or (game.chess960_pos() != event.pos960)
-                if newgame:
-                    logging.debug('starting a new game with code: %s', event.pos960)
-                    uci960 = event.pos960 != 518
-
-                    if not (game.is_game_over() or game_declared):
-                        result = GameResult.ABORT
-                        MsgDisplay.show(Message.GAME_ENDS(result=result, play_mode=play_mode, game=game.copy()))
-
-                    game = chess.Board()
-                    if uci960:
-                        game.set_chess960_pos(event.pos960)
-                    # see setup_position
-                    stop_search_and_clock()
-                    engine.chess960_send(uci960)
-                    engine.newgame(game.copy())
-                    done_computer_fen = None
-                    done_move = pb_move = chess.Move.null()
-                    time_control.reset()
-                    searchmoves.reset()
-                    set_wait_state(Message.NEW_GAME(game=game.copy(), newgame=newgame))
-                else:
-                    logging.debug('no need to start a new game')
-                    MsgDisplay.show(Message.NEW_GAME(game=game.copy(), newgame=newgame))
-                game_declared = False
-
-            elif isinstance(event, Event.PAUSE_RESUME):
-                if engine.is_thinking():
-                    stop_clock(wait=False)
-                    engine.stop(show_best=True)
-                elif not done_computer_fen:
-                    if time_control.internal_running():
-                        stop_clock(wait=False)
-                    else:
-                        start_clock(wait=False)
-                else:
-                    logging.debug('best move displayed, dont start/stop clock')
-
-            elif isinstance(event, Event.ALTERNATIVE_MOVE):
-                if done_computer_fen:
-                    done_computer_fen = None
-                    done_move = chess.Move.null()
-                    if interaction_mode in (Mode.NORMAL, Mode.BRAIN):  # @todo handle Mode.REMOTE too
-                        if time_control.mode == TimeMode.FIXED:
-                            time_control.reset()
-                        # set computer to move - in case the user just changed the engine
-                        play_mode = PlayMode.USER_WHITE if game.turn == chess.BLACK else PlayMode.USER_BLACK
-                        if not check_game_state(game, play_mode):
-                            MsgDisplay.show(Message.ALTERNATIVE_MOVE(game=game.copy(), play_mode=play_mode))
-                            think(game, time_control)
-                    else:
-                        logging.warning('wrong function call [alternative]! mode: %s', interaction_mode)
-
-            elif isinstance(event, Event.SWITCH_SIDES):
-                if interaction_mode in (Mode.NORMAL, Mode.BRAIN):
-                    if not engine.is_waiting():
-                        stop_search_and_clock()
-
-                    last_legal_fens = []
-                    best_move_displayed = done_computer_fen
-                    if best_move_displayed:
-                        move = done_move
-                        done_computer_fen = None
-                        done_move = pb_move = chess.Move.null()
-                    else:
-                        move = chess.Move.null()  # not really needed
+                msg = Message.ENGINE_READY(eng=event.eng, engine_name=engine_name,
+                                           eng_text=event.eng_text, has_levels=engine.has_levels(),
+                                           has_960=engine.has_chess960(), has_ponder=engine.has_ponder(),
+                                           show_ok=event.show_ok)
+            # Schedule cleanup of old objects
+            gc.collect()
+            set_wait_state(msg, not engine_fallback)
+            if interaction_mode in (Mode.NORMAL, Mode.BRAIN):  # engine isnt started/searching => stop the clock
+                stop_clock(wait=True)
+        else:
+            logging.error('engine shutdown failure')
+            MsgDisplay.show(Message.ENGINE_FAIL())
+        # here dont care if engine supports pondering, cause Mode.NORMAL from startup
+        if not engine_fallback and not args.engine_remote_server:  # dont write engine(_level) if remote engine
+            write_picochess_ini('engine', event.eng['file'])
 
-                    play_mode = PlayMode.USER_WHITE if play_mode == PlayMode.USER_BLACK else PlayMode.USER_BLACK
-                    text = play_mode.value  # type: str
-                    MsgDisplay.show(Message.PLAY_MODE(play_mode=play_mode, play_mode_text=dgttranslate.text(text)))
+    def on_setup_position(event):
+        nonlocal game
+        nonlocal done_computer_fen
+        nonlocal done_move
+        nonlocal pb_move
+        nonlocal game_declared
+        logging.debug('setting up custom fen: %s', event.fen)
+        uci960 = event.uci960
 
-                    if time_control.mode == TimeMode.FIXED:
-                        time_control.reset()
-
-                    legal_fens = []
-                    if not check_game_state(game, play_mode):
-                        cond1 = game.turn == chess.WHITE and play_mode == PlayMode.USER_BLACK
-                        cond2 = game.turn == chess.BLACK and play_mode == PlayMode.USER_WHITE
-                        if cond1 or cond2:
-                            time_control.reset_start_time()
-                            think(game, time_control)
-                        else:
-                            start_clock(wait=True)
-                            legal_fens = compute_legal_fens(game.copy())
-
-                    if best_move_displayed:
-                        MsgDisplay.show(Message.SWITCH_SIDES(game=game.copy(), move=move))
-
-            elif isinstance(event, Event.DRAW_RESIGN):
-                if not game_declared:  # in case user leaves kings in place while moving other pieces
-                    stop_search_and_clock()
-                    MsgDisplay.show(Message.GAME_ENDS(result=event.result, play_mode=play_mode, game=game.copy()))
-                    game_declared = True
-                    stop_fen_timer()
+        if game.move_stack:
+            if not (game.is_game_over() or game_declared):
+                result = GameResult.ABORT
+                MsgDisplay.show(Message.GAME_ENDS(result=result, play_mode=play_mode, game=GameSnapshot(game)))
+        game = GameBoard(event.fen, uci960)
+        # see new_game
+        stop_search_and_clock()
+        engine.chess960_send(uci960)
+        engine.newgame(game.copy())
+        done_computer_fen = None
+        done_move = pb_move = chess.Move.null()
+        time_control.reset()
+        searchmoves.reset()
+        game_declared = False
+        set_wait_state(Message.NEW_GAME(game=GameSnapshot(game), newgame=True))
+
+    def on_new_game(event):
+        nonlocal game
+        nonlocal done_computer_fen
+        nonlocal done_move
+        nonlocal pb_move
+        nonlocal game_declared
+        newgame = game.move_stack or (game.chess960_pos() != event.pos960)
+        if newgame:
+            logging.debug('starting a new game with code: %s', event.pos960)
+            uci960 = event.pos960 != 518
 
-            elif isinstance(event, Event.REMOTE_MOVE):
-                if interaction_mode == Mode.REMOTE and is_not_user_turn(game.turn):
-                    stop_search_and_clock()
-                    MsgDisplay.show(Message.COMPUTER_MOVE(move=event.move, ponder=chess.Move.null(), game=game.copy(),
-                                                          wait=False))
-                    game_copy = game.copy()
-                    game_copy.push(event.move)
-                    done_computer_fen = game_copy.board_fen()
-                    done_move = event.move
-                    pb_move = chess.Move.null()
-                else:
-                    logging.warning('wrong function call [remote]! mode: %s turn: %s', interaction_mode, game.turn)
-
-            elif isinstance(event, Event.BEST_MOVE):
-                if interaction_mode in (Mode.NORMAL, Mode.BRAIN) and is_not_user_turn(game.turn):
-                    # clock must be stopped BEFORE the "book_move" event cause SetNRun resets the clock display
-                    stop_clock(wait=True)
-                    # @todo 8/8/R6P/1R6/7k/2B2K1p/8/8 and sliding Ra6 over a5 to a4 - handle this in correct way!!
-                    if game.is_game_over():
-                        logging.warning('illegal move on game_end - sliding? move: %s fen: %s', event.move, game.fen())
-                    else:
-                        if event.inbook:
-                            MsgDisplay.show(Message.BOOK_MOVE())
-                        searchmoves.add(event.move)
-                        MsgDisplay.show(Message.COMPUTER_MOVE(move=event.move, ponder=event.ponder, game=game.copy(),
-                                                              wait=event.inbook))
-                        game_copy = game.copy()
-                        game_copy.push(event.move)
-                        done_computer_fen = game_copy.board_fen()
-                        done_move = event.move
-                        brain_book = interaction_mode == Mode.BRAIN and event.inbook
-                        pb_move = event.ponder if event.ponder and not brain_book else chess.Move.null()
-                else:
-                    logging.warning('wrong function call [best]! mode: %s turn: %s', interaction_mode, game.turn)
+            if not (game.is_game_over() or game_declared):
+                result = GameResult.ABORT
+                MsgDisplay.show(Message.GAME_ENDS(result=result, play_mode=play_mode, game=GameSnapshot(game)))
+
+            game = GameBoard()
+            if uci960:
+                game.set_chess960_pos(event.pos960)
+            # see setup_position
+            stop_search_and_clock()
+            engine.chess960_send(uci960)
+            engine.newgame(game.copy())
+            done_computer_fen = None
+            done_move = pb_move = chess.Move.null()
+            time_control.reset()
+            searchmoves.reset()
+            set_wait_state(Message.NEW_GAME(game=GameSnapshot(game), newgame=newgame))
+        else:
+            logging.debug('no need to start a new game')
+            MsgDisplay.show(Message.NEW_GAME(game=GameSnapshot(game), newgame=newgame))
+        game_declared = False
+
+    def on_pause_resume(event):
+        if engine.is_thinking():
+            stop_clock(wait=False)
+            engine.stop(show_best=True)
+        elif not done_computer_fen:
+            if time_control.internal_running():
+                stop_clock(wait=False)
+            else:
+                start_clock(wait=False)
+        else:
+            logging.debug('best move displayed, dont start/stop clock')
 
-            elif isinstance(event, Event.NEW_PV):
-                if interaction_mode == Mode.BRAIN and engine.is_pondering():
-                    logging.debug('in brain mode and pondering ignore pv %s', event.pv[:3])
-                else:
-                    # illegal moves can occur if a pv from the engine arrives at the same time as an user move
-                    if game.is_legal(event.pv[0]):
-                        MsgDisplay.show(Message.NEW_PV(pv=event.pv, mode=interaction_mode, game=game.copy()))
-                    else:
-                        logging.info('illegal move can not be displayed. move: %s fen: %s', event.pv[0], game.fen())
-                        logging.info('engine status: t:%s p:%s', engine.is_thinking(), engine.is_pondering())
+    def on_alternative_move(event):
+        nonlocal done_computer_fen
+        nonlocal done_move
+        nonlocal play_mode
+        if done_computer_fen:
+            done_computer_fen = None
+            done_move = chess.Move.null()
+            if interaction_mode in (Mode.NORMAL, Mode.BRAIN):  # @todo handle Mode.REMOTE too
+                if time_control.mode == TimeMode.FIXED:
+                    time_control.reset()
+                # set computer to move - in case the user just changed the engine
+                play_mode = PlayMode.USER_WHITE if game.turn == chess.BLACK else PlayMode.USER_BLACK
+                if not check_game_state(game, play_mode):
+                    MsgDisplay.show(Message.ALTERNATIVE_MOVE(game=GameSnapshot(game), play_mode=play_mode))
+                    think(game, time_control)
+            else:
+                logging.warning('wrong function call [alternative]! mode: %s', interaction_mode)
 
-            elif isinstance(event, Event.NEW_SCORE):
-                if interaction_mode == Mode.BRAIN and engine.is_pondering():
-                    logging.debug('in brain mode and pondering, ignore score %s', event.score)
-                else:
-                    MsgDisplay.show(Message.NEW_SCORE(score=event.score, mate=event.mate, mode=interaction_mode,
-                                                      turn=game.turn))
+    def on_switch_sides(event):
+        nonlocal last_legal_fens
+        nonlocal legal_fens
+        nonlocal done_computer_fen
+        nonlocal done_move
+        nonlocal pb_move
+        nonlocal play_mode
+        if interaction_mode in (Mode.NORMAL, Mode.BRAIN):
+            if not engine.is_waiting():
+                stop_search_and_clock()
 
-            elif isinstance(event, Event.NEW_DEPTH):
-                if interaction_mode == Mode.BRAIN and engine.is_pondering():
-                    logging.debug('in brain mode and pondering, ignore depth %s', event.depth)
-                else:
-                    MsgDisplay.show(Message.NEW_DEPTH(depth=event.depth))
+            last_legal_fens = []
+            best_move_displayed = done_computer_fen
+            if best_move_displayed:
+                move = done_move
+                done_computer_fen = None
+                done_move = pb_move = chess.Move.null()
+            else:
+                move = chess.Move.null()  # not really needed
 
-            elif isinstance(event, Event.START_SEARCH):
-                MsgDisplay.show(Message.SEARCH_STARTED())
+            play_mode = PlayMode.USER_WHITE if play_mode == PlayMode.USER_BLACK else PlayMode.USER_BLACK
+            text = play_mode.value  # type: str
+            MsgDisplay.show(Message.PLAY_MODE(play_mode=play_mode, play_mode_text=dgttranslate.text(text)))
 
-            elif isinstance(event, Event.STOP_SEARCH):
-                MsgDisplay.show(Message.SEARCH_STOPPED())
+            if time_control.mode == TimeMode.FIXED:
+                time_control.reset()
 
-            elif isinstance(event, Event.INTERACTION_MODE):
-                if event.mode not in (Mode.NORMAL, Mode.REMOTE) and done_computer_fen:  # @todo check why still needed
-                    dgtmenu.set_mode(interaction_mode)  # undo the button4 stuff
-                    logging.warning('mode cant be changed to a pondering mode as long as a move is displayed')
-                    mode_text = dgttranslate.text('Y10_errormode')
-                    msg = Message.INTERACTION_MODE(mode=interaction_mode, mode_text=mode_text, show_ok=False)
-                    MsgDisplay.show(msg)
-                else:
-                    stop_search_and_clock()
-                    interaction_mode = event.mode
-                    set_engine_mode()
-                    msg = Message.INTERACTION_MODE(mode=event.mode, mode_text=event.mode_text, show_ok=event.show_ok)
-                    set_wait_state(msg)  # dont clear searchmoves here
-
-            elif isinstance(event, Event.NEW_BOOK):
-                write_picochess_ini('book', event.book['file'])
-                logging.debug('changing opening book [%s]', event.book['file'])
-                bookreader = chess.polyglot.open_reader(event.book['file'])
-                MsgDisplay.show(Message.NEW_BOOK(book_text=event.book_text, show_ok=event.show_ok))
-                stop_fen_timer()
-
-            elif isinstance(event, Event.TIME_CONTROL):
-                time_control.stop_internal(log=False)
-                tc_init = event.tc_init
-                time_control = TimeControl(**tc_init)
-                if time_control.mode == TimeMode.BLITZ:
-                    write_picochess_ini('time', '{:d} 0'.format(tc_init['blitz']))
-                elif time_control.mode == TimeMode.FISCHER:
-                    write_picochess_ini('time', '{:d} {:d}'.format(tc_init['blitz'], tc_init['fischer']))
-                elif time_control.mode == TimeMode.FIXED:
-                    write_picochess_ini('time', '{:d}'.format(tc_init['fixed']))
-                MsgDisplay.show(Message.TIME_CONTROL(time_text=event.time_text, show_ok=event.show_ok, tc_init=tc_init))
-                stop_fen_timer()
-
-            elif isinstance(event, Event.CLOCK_TIME):
-                if dgtdispatcher.is_prio_device(event.dev, event.connect):  # transfer only the most prio clock's time
-                    logging.debug('setting tc clock time - prio: %s w:%s b:%s', event.dev,
-                                  hms_time(event.time_white), hms_time(event.time_black))
-                    time_control.set_clock_times(white_time=event.time_white, black_time=event.time_black)
-                    # find out, if we are in bullet time (<=60secs on users clock or lowest time if user side unknown)
-                    time_u = event.time_white
-                    time_c = event.time_black
-                    if interaction_mode in (Mode.NORMAL, Mode.BRAIN):  # @todo handle Mode.REMOTE too
-                        if play_mode == PlayMode.USER_BLACK:
-                            time_u, time_c = time_c, time_u
-                    else:  # here, we use the lowest time
-                        if time_c < time_u:
-                            time_u, time_c = time_c, time_u
-                    low_time = time_u <= 60 and not (time_control.mode == TimeMode.FIXED and time_control.move_time > 2)
-                    dgtboard.low_time = low_time
-                    MsgDisplay.show(Message.CLOCK_TIME(time_white=event.time_white, time_black=event.time_black,
-                                                       low_time=low_time))
+            legal_fens = []
+            if not check_game_state(game, play_mode):
+                cond1 = game.turn == chess.WHITE and play_mode == PlayMode.USER_BLACK
+                cond2 = game.turn == chess.BLACK and play_mode == PlayMode.USER_WHITE
+                if cond1 or cond2:
+                    time_control.reset_start_time()
+                    think(game, time_control)
                 else:
-                    logging.debug('ignore clock time - too low prio: %s', event.dev)
+                    start_clock(wait=True)
+                    legal_fens = compute_legal_fens(game.copy())
 
-            elif isinstance(event, Event.CLOCK_FLAG):
-                stop_search_and_clock()
-                result = GameResult.FLAG_TIME
-                MsgDisplay.show(Message.GAME_ENDS(result=result, play_mode=play_mode, game=game.copy()))
+            if best_move_displayed:
+                MsgDisplay.show(Message.SWITCH_SIDES(game=GameSnapshot(game), move=move))
 
-            elif isinstance(event, Event.SYSTEM_SHUTDOWN):
-                if uci_shell.get_spur():
-                    uci_shell.get_spur().__exit__(None, None, None)  # force to call __exit__ (close shell connection)
-                result = GameResult.ABORT
-                MsgDisplay.show(Message.GAME_ENDS(result=result, play_mode=play_mode, game=game.copy()))
-                MsgDisplay.show(Message.SYSTEM_SHUTDOWN())
-                shutdown(args.dgtpi and uci_shell.get_spur() is None, dev=event.dev)  # @todo make independant of remote
+    def on_draw_resign(event):
+        nonlocal game_declared
+        if not game_declared:  # in case user leaves kings in place while moving other pieces
+            stop_search_and_clock()
+            MsgDisplay.show(Message.GAME_ENDS(result=event.result, play_mode=play_mode, game=GameSnapshot(game)))
+            game_declared = True
+            stop_fen_timer()
 
-            elif isinstance(event, Event.SYSTEM_REBOOT):
-                result = GameResult.ABORT
-                MsgDisplay.show(Message.GAME_ENDS(result=result, play_mode=play_mode, game=game.copy()))
-                MsgDisplay.show(Message.SYSTEM_REBOOT())
-                reboot(args.dgtpi and uci_shell.get_spur() is None, dev=event.dev)  # @todo make independant of remote
+    def on_remote_move(event):
+        nonlocal done_computer_fen
+        nonlocal done_move
+        nonlocal pb_move
+        if interaction_mode == Mode.REMOTE and is_not_user_turn(game.turn):
+            stop_search_and_clock()
+            MsgDisplay.show(Message.COMPUTER_MOVE(move=event.move, ponder=chess.Move.null(), game=GameSnapshot(game),
+                                                  wait=False))
+            game_copy = game.copy()
+            game_copy.push(event.move)
+            done_computer_fen = game_copy.board_fen()
+            done_move = event.move
+            pb_move = chess.Move.null()
+        else:
+            logging.warning('wrong function call [remote]! mode: %s turn: %s', interaction_mode, game.turn)
 
-            elif isinstance(event, Event.EMAIL_LOG):
-                email_logger = Emailer(email=args.email, mailgun_key=args.mailgun_key)
-                email_logger.set_smtp(sserver=args.smtp_server, suser=args.smtp_user, spass=args.smtp_pass,
-                                      sencryption=args.smtp_encryption, sfrom=args.smtp_from)
-                body = 'You probably want to forward this file to a picochess developer ;-)'
-                email_logger.send('Picochess LOG', body, '/opt/picochess/logs/{}'.format(args.log_file))
+    def on_best_move(event):
+        nonlocal done_computer_fen
+        nonlocal done_move
+        nonlocal pb_move
+        if interaction_mode in (Mode.NORMAL, Mode.BRAIN) and is_not_user_turn(game.turn):
+            # clock must be stopped BEFORE the "book_move" event cause SetNRun resets the clock display
+            stop_clock(wait=True)
+            # @todo 8/8/R6P/1R6/7k/2B2K1p/8/8 and sliding Ra6 over a5 to a4 - handle this in correct way!!
+            if game.is_game_over():
+                logging.warning('illegal move on game_end - sliding? move: %s fen: %s', event.move, game.fen())
+            else:
+                if event.inbook:
+                    MsgDisplay.show(Message.BOOK_MOVE())
+                searchmoves.add(event.move)
+                MsgDisplay.show(Message.COMPUTER_MOVE(move=event.move, ponder=event.ponder, game=GameSnapshot(game),
+                                                      wait=event.inbook))
+                game_copy = game.copy()
+                game_copy.push(event.move)
+                done_computer_fen = game_copy.board_fen()
+                done_move = event.move
+                brain_book = interaction_mode == Mode.BRAIN and event.inbook
+                pb_move = event.ponder if event.ponder and not brain_book else chess.Move.null()
+        else:
+            logging.warning('wrong function call [best]! mode: %s turn: %s', interaction_mode, game.turn)
 
-            elif isinstance(event, Event.NEW_VOICE):
-                MsgDisplay.show(Message.NEW_VOICE(type=event.type, lang=event.lang, speaker=event.speaker,
-                                                  speed=event.speed))
+    def on_new_pv(event):
+        if interaction_mode == Mode.BRAIN and engine.is_pondering():
+            logging.debug('in brain mode and pondering ignore pv %s', event.pv[:3])
+        else:
+            # illegal moves can occur if a pv from the engine arrives at the same time as an user move
+            if game.is_legal(event.pv[0]):
+                MsgDisplay.show(Message.NEW_PV(pv=event.pv, mode=interaction_mode, game=GameSnapshot(game)))
+            else:
+                logging.info('illegal move can not be displayed. move: %s fen: %s', event.pv[0], game.fen())
+                logging.info('engine status: t:%s p:%s', engine.is_thinking(), engine.is_pondering())
 
-            elif isinstance(event, Event.KEYBOARD_BUTTON):
-                MsgDisplay.show(Message.DGT_BUTTON(button=event.button, dev=event.dev))
+    def on_new_analysis(event):
+        # lines of the old position can arrive after a move was done - show them only if they fit the game
+        if all(game.is_legal(line['pv'][0]) for line in event.lines.values() if line['pv']):
+            MsgDisplay.show(Message.NEW_ANALYSIS(lines=event.lines, game=GameSnapshot(game)))
+        else:
+            logging.debug('analysis lines dont fit the current position - ignored')
 
-            elif isinstance(event, Event.KEYBOARD_FEN):
-                MsgDisplay.show(Message.DGT_FEN(fen=event.fen, raw=False))
+    def on_new_score(event):
+        if interaction_mode == Mode.BRAIN and engine.is_pondering():
+            logging.debug('in brain mode and pondering, ignore score %s', event.score)
+        else:
+            MsgDisplay.show(Message.NEW_SCORE(score=event.score, mate=event.mate, mode=interaction_mode,
+                                              turn=game.turn))
 
-            elif isinstance(event, Event.EXIT_MENU):
-                MsgDisplay.show(Message.EXIT_MENU(dev=event.dev))
+    def on_new_depth(event):
+        if interaction_mode == Mode.BRAIN and engine.is_pondering():
+            logging.debug('in brain mode and pondering, ignore depth %s', event.depth)
+        else:
+            MsgDisplay.show(Message.NEW_DEPTH(depth=event.depth))
+
+    def on_start_search(event):
+        MsgDisplay.show(Message.SEARCH_STARTED())
+
+    def on_stop_search(event):
+        MsgDisplay.show(Message.SEARCH_STOPPED())
+
+    def on_interaction_mode(event):
+        nonlocal interaction_mode
+        if event.mode not in (Mode.NORMAL, Mode.REMOTE) and done_computer_fen:  # @todo check why still needed
+            dgtmenu.set_mode(interaction_mode)  # undo the button4 stuff
+            logging.warning('mode cant be changed to a pondering mode as long as a move is displayed')
+            mode_text = dgttranslate.text('Y10_errormode')
+            msg = Message.INTERACTION_MODE(mode=interaction_mode, mode_text=mode_text, show_ok=False)
+            MsgDisplay.show(msg)
+        else:
+            stop_search_and_clock()
+            interaction_mode = event.mode
+            set_engine_mode()
+            msg = Message.INTERACTION_MODE(mode=event.mode, mode_text=event.mode_text, show_ok=event.show_ok)
+            set_wait_state(msg)  # dont clear searchmoves here
+
+    def on_new_book(event):
+        nonlocal bookreader
+        write_picochess_ini('book', event.book['file'])
+        logging.debug('changing opening book [%s]', event.book['file'])
+        bookreader = chess.polyglot.open_reader(event.book['file'])
+        MsgDisplay.show(Message.NEW_BOOK(book_text=event.book_text, show_ok=event.show_ok))
+        stop_fen_timer()
 
-            elif isinstance(event, Event.UPDATE_PICO):
-                checkout_tag(event.tag)
+    def on_time_control(event):
+        nonlocal time_control
+        time_control.stop_internal(log=False)
+        tc_init = event.tc_init
+        time_control = TimeControl(**tc_init)
+        if time_control.mode == TimeMode.BLITZ:
+            write_picochess_ini('time', '{:d} 0'.format(tc_init['blitz']))
+        elif time_control.mode == TimeMode.FISCHER:
+            write_picochess_ini('time', '{:d} {:d}'.format(tc_init['blitz'], tc_init['fischer']))
+        elif time_control.mode == TimeMode.FIXED:
+            write_picochess_ini('time', '{:d}'.format(tc_init['fixed']))
+        MsgDisplay.show(Message.TIME_CONTROL(time_text=event.time_text, show_ok=event.show_ok, tc_init=tc_init))
+        stop_fen_timer()
 
-            elif isinstance(event, Event.REMOTE_ROOM):
-                MsgDisplay.show(Message.REMOTE_ROOM(inside=event.inside))
+    def on_clock_time(event):
+        if dgtdispatcher.is_prio_device(event.dev, event.connect):  # transfer only the most prio clock's time
+            logging.debug('setting tc clock time - prio: %s w:%s b:%s', event.dev,
+                          hms_time(event.time_white), hms_time(event.time_black))
+            time_control.set_clock_times(white_time=event.time_white, black_time=event.time_black)
+            # find out, if we are in bullet time (<=60secs on users clock or lowest time if user side unknown)
+            time_u = event.time_white
+            time_c = event.time_black
+            if interaction_mode in (Mode.NORMAL, Mode.BRAIN):  # @todo handle Mode.REMOTE too
+                if play_mode == PlayMode.USER_BLACK:
+                    time_u, time_c = time_c, time_u
+            else:  # here, we use the lowest time
+                if time_c < time_u:
+                    time_u, time_c = time_c, time_u
+            low_time = time_u <= 60 and not (time_control.mode == TimeMode.FIXED and time_control.move_time > 2)
+            dgtboard.low_time = low_time
+            MsgDisplay.show(Message.CLOCK_TIME(time_white=event.time_white, time_black=event.time_black,
+                                               low_time=low_time))
+        else:
+            logging.debug('ignore clock time - too low prio: %s', event.dev)
+
+    def on_clock_flag(event):
+        stop_search_and_clock()
+        result = GameResult.FLAG_TIME
+        MsgDisplay.show(Message.GAME_ENDS(result=result, play_mode=play_mode, game=GameSnapshot(game)))
+
+    def on_system_shutdown(event):
+        uci_shell.close()
+        result = GameResult.ABORT
+        MsgDisplay.show(Message.GAME_ENDS(result=result, play_mode=play_mode, game=GameSnapshot(game)))
+        MsgDisplay.show(Message.SYSTEM_SHUTDOWN())
+        shutdown(args.dgtpi and args.engine_remote_server is None, dev=event.dev)  # @todo make independant of remote
+
+    def on_system_reboot(event):
+        result = GameResult.ABORT
+        MsgDisplay.show(Message.GAME_ENDS(result=result, play_mode=play_mode, game=GameSnapshot(game)))
+        MsgDisplay.show(Message.SYSTEM_REBOOT())
+        reboot(args.dgtpi and args.engine_remote_server is None, dev=event.dev)  # @todo make independant of remote
+
+    def on_email_log(event):
+        body = 'You probably want to forward this file to a picochess developer ;-)'
+        log_pipeline.flush()
+        emailer.send('Picochess LOG', body, '/opt/picochess/logs/{}'.format(args.log_file))
+
+    def on_new_voice(event):
+        if event.speaker != 'mute':  # a voice chosen in the menu
+            start_talker()
+        MsgDisplay.show(Message.NEW_VOICE(type=event.type, lang=event.lang, speaker=event.speaker,
+                                          speed=event.speed))
+
+    def on_keyboard_button(event):
+        MsgDisplay.show(Message.DGT_BUTTON(button=event.button, dev=event.dev))
+
+    def on_keyboard_fen(event):
+        MsgDisplay.show(Message.DGT_FEN(fen=event.fen, raw=False))
+
+    def on_exit_menu(event):
+        MsgDisplay.show(Message.EXIT_MENU(dev=event.dev))
+
+    def on_update_pico(event):
+        checkout_tag(event.tag)
+
+    def on_remote_room(event):
+        MsgDisplay.show(Message.REMOTE_ROOM(inside=event.inside))
+
+    evt_dispatcher.register({
+        Event.NEW_FEN: on_new_fen,
+        Event.KEYBOARD_MOVE: on_keyboard_move,
+        Event.NEW_LEVEL: on_new_level,
+        Event.NEW_ENGINE: on_new_engine,
+        Event.SETUP_POSITION: on_setup_position,
+        Event.NEW_GAME: on_new_game,
+        Event.PAUSE_RESUME: on_pause_resume,
+        Event.ALTERNATIVE_MOVE: on_alternative_move,
+        Event.SWITCH_SIDES: on_switch_sides,
+        Event.DRAW_RESIGN: on_draw_resign,
+        Event.REMOTE_MOVE: on_remote_move,
+        Event.BEST_MOVE: on_best_move,
+        Event.NEW_PV: on_new_pv,
+        Event.NEW_SCORE: on_new_score,
+        Event.NEW_DEPTH: on_new_depth,
+        Event.NEW_ANALYSIS: on_new_analysis,
+        Event.START_SEARCH: on_start_search,
+        Event.STOP_SEARCH: on_stop_search,
+        Event.INTERACTION_MODE: on_interaction_mode,
+        Event.NEW_BOOK: on_new_book,
+        Event.TIME_CONTROL: on_time_control,
+        Event.CLOCK_TIME: on_clock_time,
+        Event.CLOCK_FLAG: on_clock_flag,
+        Event.SYSTEM_SHUTDOWN: on_system_shutdown,
+        Event.SYSTEM_REBOOT: on_system_reboot,
+        Event.EMAIL_LOG: on_email_log,
+        Event.NEW_VOICE: on_new_voice,
+        Event.KEYBOARD_BUTTON: on_keyboard_button,
+        Event.KEYBOARD_FEN: on_keyboard_fen,
+        Event.EXIT_MENU: on_exit_menu,
+        Event.UPDATE_PICO: on_update_pico,
+        Event.REMOTE_ROOM: on_remote_room,
+    })
 
-            else:  # Default
+    # Event loop
+    logging.info('evt_observer ready')
+    while True:
+        try:
+            event = evtobserver_queue.get()
+        except queue.Empty:
+            pass
+        else:
+            logging.debug('received event from evt_queue: %s', event)
+            tracer.set_current(event.trace_id)  # all messages caused by this event get its trace id
+            tracer.stamp(event, 'evt_get', evtobserver_queue)
+            if not evt_dispatcher.dispatch(event):
                 logging.warning('event not handled : [%s]', event)
-
             evtobserver_queue.task_done()
 
 
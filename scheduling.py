@@ -0,0 +1,171 @@
+# Copyright (C) 2013-2018 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import ctypes
+import logging
+import platform
+import threading
+from collections import deque
+
+SYS_GETTID = {'x86_64': 186, 'i686': 224, 'armv6l': 224, 'armv7l': 224, 'aarch64': 178}  # per architecture
+
+
+def native_tid():
+    """Return the kernel thread id of the calling thread - or None if it can't be found out."""
+    if hasattr(threading, 'get_native_id'):  # python 3.8+
+        return threading.get_native_id()
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        if hasattr(libc, 'gettid'):  # glibc 2.30+
+            return libc.gettid()
+        if platform.machine() in SYS_GETTID:
+            return libc.syscall(SYS_GETTID[platform.machine()])
+    except (OSError, AttributeError):
+        pass
+    return None
+
+
+def parse_cores(text: str):
+    """Return the set of cpu ids out of a list like '2,3' or '1-3' - None for an empty/invalid list."""
+    if not text:
+        return None
+    cores = set()
+    try:
+        for part in text.split(','):
+            first, _, last = part.strip().partition('-')
+            cores.update(range(int(first), int(last or first) + 1))
+    except ValueError:
+        logging.warning('invalid core list [%s]', text)
+        return None
+    available = os.sched_getaffinity(0) if hasattr(os, 'sched_getaffinity') else set(range(os.cpu_count() or 1))
+    if not cores <= available:
+        logging.warning('cores %s not available - only %s', sorted(cores - available), sorted(available))
+        cores &= available
+    return cores or None
+
+
+class LoopJitter(object):
+
+    """Keep the lateness (in secs) of a polling loop's wakeups - the scheduling delay its thread suffers."""
+
+    def __init__(self, size=1000):
+        super(LoopJitter, self).__init__()
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, late: float):
+        """Add a new measured lateness."""
+        self.samples.append(late)
+        self.count += 1
+        self.max = max(self.max, late)
+
+    def get(self):
+        """Return the stats (in ms) - percentiles over the last samples."""
+        values = sorted(self.samples)
+        if not values:
+            return {'count': 0}
+
+        def _perc(perc):
+            return round(values[min(len(values) - 1, int(len(values) * perc / 100))] * 1000, 3)
+        return {'count': self.count, 'p50': _perc(50), 'p99': _perc(99), 'max': round(self.max * 1000, 3)}
+
+
+class Scheduler(object):
+
+    """Pin the engine processes to their cores and raise the priority of the board & clock I/O threads."""
+
+    def __init__(self):
+        super(Scheduler, self).__init__()
+        self.engine_cores = None  # cpu ids of the engine processes (None: all)
+        self.other_cores = None  # cpu ids left for picochess itself
+        self.engine_nice = 0
+        self.io_nice = 0
+        self.jitter = {}  # loop name => LoopJitter
+        self.lock = threading.Lock()
+
+    def configure(self, engine_cores: str, engine_nice: int, io_nice: int):
+        """Set the config - call it before any thread starts, cause they inherit the picochess cores."""
+        self.engine_cores = parse_cores(engine_cores)
+        self.engine_nice = engine_nice
+        self.io_nice = io_nice
+        if self.engine_cores:
+            self.other_cores = os.sched_getaffinity(0) - self.engine_cores or None
+            if self.other_cores:
+                self._set_affinity(0, self.other_cores, 'picochess')
+            logging.debug('engine cores: %s picochess cores: %s', sorted(self.engine_cores),
+                          sorted(self.other_cores) if self.other_cores else 'all')
+
+    @staticmethod
+    def _set_affinity(tid: int, cores: set, name: str):
+        try:
+            os.sched_setaffinity(tid, cores)
+        except (OSError, AttributeError) as exc:
+            logging.warning('cant pin %s [%i] to cores %s: %s', name, tid, sorted(cores), exc)
+
+    @staticmethod
+    def _set_nice(tid: int, nice: int, name: str):
+        try:
+            os.setpriority(os.PRIO_PROCESS, tid, nice)
+        except (OSError, AttributeError) as exc:  # a negative value needs root
+            logging.warning('cant set nice %i for %s [%i]: %s', nice, name, tid, exc)
+
+    def pin_engine(self, pid: int):
+        """Move all threads of a (local) engine process to the engine cores and give them the engine nice value."""
+        try:
+            tids = [int(tid) for tid in os.listdir('/proc/{}/task'.format(pid))]
+        except OSError:
+            tids = [pid]
+        for tid in tids:  # the threads started later inherit it
+            if self.engine_cores:
+                self._set_affinity(tid, self.engine_cores, 'engine')
+            if self.engine_nice:
+                self._set_nice(tid, self.engine_nice, 'engine')
+        logging.debug('engine [%i] with %i threads on cores %s nice %i', pid, len(tids),
+                      sorted(self.engine_cores) if self.engine_cores else 'all', self.engine_nice)
+
+    def io_thread(self, name: str):
+        """Call it at the start of a board/clock I/O thread - it gets the I/O nice value."""
+        if not self.io_nice:
+            return
+        tid = native_tid()
+        if tid is None:
+            logging.warning('cant set nice %i for %s: thread id unknown on this system', self.io_nice, name)
+            return
+        self._set_nice(tid, self.io_nice, name)
+
+    def sleep(self, name: str, secs: float):
+        """Sleep inside a polling loop - and measure how late the thread wakes up."""
+        start = time.monotonic()
+        time.sleep(secs)
+        late = time.monotonic() - start - secs
+        with self.lock:
+            if name not in self.jitter:
+                self.jitter[name] = LoopJitter()
+            self.jitter[name].add(max(0.0, late))
+
+    def stats(self):
+        """Return the config and the wakeup lateness of the polling loops."""
+        with self.lock:
+            jitter = {name: loop.get() for name, loop in self.jitter.items()}
+        return {'engine_cores': sorted(self.engine_cores) if self.engine_cores else None,
+                'engine_nice': self.engine_nice, 'io_nice': self.io_nice, 'wakeup_late': jitter}
+
+
+scheduler = Scheduler()
@@ -28,11 +28,16 @@ import tornado.wsgi
 from tornado.ioloop import IOLoop
 from tornado.websocket import WebSocketHandler
 
-from utilities import EvtObserver, MsgDisplay, hms_time, RepeatedTimer
+from utilities import EvtObserver, MsgDisplay, hms_time, RepeatedTimer, tracer, evtobserver_queue, evt_dispatcher
+from utilities import ini_store
+from tablebase import tablebase
+from scheduling import scheduler
+from logpipe import log_pipeline
+from uci.engine import engine_latency
 from web.picoweb import picoweb as pw
 
 from dgt.api import Event, Message
-from dgt.util import PlayMode, Mode, ClockSide
+from dgt.util import PlayMode, Mode, ClockSide, GameResult
 from dgt.iface import DgtDisplayIface
 from dgt.board import DgtBoard
 
@@ -156,6 +161,16 @@ class InfoHandler(ServerRequestHandler):
                 self.write(self.shared['clock_text'])
 
 
+class TraceHandler(ServerRequestHandler):
+    def get(self, *args, **kwargs):
+        limit = int(self.get_argument('limit', '50'))
+        self.write({'gauges': tracer.gauges(), 'event_queue': evtobserver_queue.stats(),
+                    'event_handlers': evt_dispatcher.stats(), 'tablebase': tablebase.stats(),
+                    'scheduling': scheduler.stats(), 'logging': log_pipeline.stats(),
+                    'settings': ini_store.stats(), 'engine_latency': engine_latency(),
+                    'traces': tracer.traces(limit)})
+
+
 class ChessBoardHandler(ServerRequestHandler):
     def get(self):
         self.render('web/picoweb/templates/clock.html')
@@ -175,6 +190,7 @@ class WebServer(threading.Thread):
             (r'/event', EventHandler, dict(shared=shared)),
             (r'/dgt', DGTHandler, dict(shared=shared)),
             (r'/info', InfoHandler, dict(shared=shared)),
+            (r'/trace', TraceHandler, dict(shared=shared)),
 
             (r'/channel', ChannelHandler, dict(shared=shared)),
             (r'.*', tornado.web.FallbackHandler, {'fallback': wsgi_app})
@@ -184,6 +200,7 @@ class WebServer(threading.Thread):
     def run(self):
         """Call by threading.Thread start() function."""
         logging.info('evt_observer ready')
+        scheduler.io_thread('web')
         IOLoop.instance().start()
 
 
@@ -363,6 +380,30 @@ class WebDisplay(MsgDisplay, threading.Thread):
         super(WebDisplay, self).__init__()
         self.shared = shared
         self.starttime = datetime.datetime.now().strftime('%H:%M:%S')
+        self.analysis = {'fen': None, 'lines': {}}  # the analysis lines the web clients already got
+        self.subscribe({
+            Message.NEW_GAME: self._on_new_game,
+            Message.IP_INFO: self._on_ip_info,
+            Message.SYSTEM_INFO: self._on_system_info,
+            Message.ENGINE_STARTUP: self._on_engine_startup,
+            Message.ENGINE_READY: self._on_engine_ready,
+            Message.STARTUP_INFO: self._on_startup_info,
+            Message.NEW_BOOK: self._on_new_book,
+            Message.INTERACTION_MODE: self._on_interaction_mode,
+            Message.PLAY_MODE: self._on_play_mode,
+            Message.TIME_CONTROL: self._on_time_control,
+            Message.NEW_LEVEL: self._on_new_level,
+            Message.DGT_CLOCK_VERSION: self._on_dgt_clock_version,
+            Message.COMPUTER_MOVE: self._on_computer_move,
+            Message.COMPUTER_MOVE_DONE: self._on_computer_move_done,
+            Message.USER_MOVE_DONE: self._on_user_move_done,
+            Message.REVIEW_MOVE_DONE: self._on_review_move_done,
+            Message.ALTERNATIVE_MOVE: self._on_alternative_move,
+            Message.SWITCH_SIDES: self._on_switch_sides,
+            Message.TAKE_BACK: self._on_take_back,
+            Message.NEW_ANALYSIS: self._on_new_analysis,
+            Message.TABLEBASE_RESULT: self._on_tablebase_result,
+        })
 
     def _create_game_info(self):
         if 'game_info' not in self.shared:
@@ -426,207 +467,222 @@ class WebDisplay(MsgDisplay, threading.Thread):
                 pgn_game.headers['Site'] = self.shared['ip_info']['location']
         pgn_game.headers['Time'] = self.starttime
 
-    def task(self, message):
-        def _oldstyle_fen(game: chess.Board):
-            builder = []
-            builder.append(game.board_fen())
-            builder.append('w' if game.turn == chess.WHITE else 'b')
-            builder.append(game.castling_xfen())
-            builder.append(chess.SQUARE_NAMES[game.ep_square] if game.ep_square else '-')
-            builder.append(str(game.halfmove_clock))
-            builder.append(str(game.fullmove_number))
-            return ' '.join(builder)
-
-        def _build_headers():
-            self._create_headers()
-            pgn_game = pgn.Game()
-            self._build_game_header(pgn_game)
-            self.shared['headers'].update(pgn_game.headers)
-
-        def _send_headers():
-            EventHandler.write_to_clients({'event': 'Header', 'headers': self.shared['headers']})
-
-        def _send_title():
-            EventHandler.write_to_clients({'event': 'Title', 'ip_info': self.shared['ip_info']})
-
-        def _transfer(game: chess.Board):
-            pgn_game = pgn.Game().from_board(game)
-            self._build_game_header(pgn_game)
-            self.shared['headers'] = pgn_game.headers
-            return pgn_game.accept(pgn.StringExporter(headers=True, comments=False, variations=False))
-
-        def peek_uci(game: chess.Board):
-            """Return last move in uci format."""
-            try:
-                return game.peek().uci()
-            except IndexError:
-                return chess.Move.null().uci()
-
-        if False:  # switch-case
-            pass
-        elif isinstance(message, Message.NEW_GAME):
-            self.starttime = datetime.datetime.now().strftime('%H:%M:%S')
-            pgn_str = _transfer(message.game)
-            fen = message.game.fen()
-            result = {'pgn': pgn_str, 'fen': fen, 'event': 'Game', 'move': '0000', 'play': 'newgame'}
-            self.shared['last_dgt_move_msg'] = result
-            EventHandler.write_to_clients(result)
-            _send_headers()  # don't need _build_headers()
-
-        elif isinstance(message, Message.IP_INFO):
-            self.shared['ip_info'] = message.info
-            _build_headers()
-            _send_headers()
-            _send_title()
-
-        elif isinstance(message, Message.SYSTEM_INFO):
-            self.shared['system_info'] = message.info
-            self.shared['system_info']['old_engine'] = self.shared['system_info']['engine_name']
-            _build_headers()
-            _send_headers()
-
-        elif isinstance(message, Message.ENGINE_STARTUP):
-            for index in range(0, len(message.installed_engines)):
-                eng = message.installed_engines[index]
-                if eng['file'] == message.file:
-                    self.shared['system_info']['engine_elo'] = eng['elo']
-                    break
-            _build_headers()
-            _send_headers()
-
-        elif isinstance(message, Message.ENGINE_READY):
-            self._create_system_info()
-            self.shared['system_info']['old_engine'] = self.shared['system_info']['engine_name'] = message.engine_name
-            self.shared['system_info']['engine_elo'] = message.eng['elo']
-            if not message.has_levels:
-                if 'level_text' in self.shared['game_info']:
-                    del self.shared['game_info']['level_text']
-                if 'level_name' in self.shared['game_info']:
-                    del self.shared['game_info']['level_name']
-            _build_headers()
-            _send_headers()
-
-        elif isinstance(message, Message.STARTUP_INFO):
-            self.shared['game_info'] = message.info.copy()
-            # change book_index to book_text
-            books = message.info['books']
-            book_index = message.info['book_index']
-            self.shared['game_info']['book_text'] = books[book_index]['text']
-            del self.shared['game_info']['book_index']
-
-            if message.info['level_text'] is None:
+    @staticmethod
+    def _oldstyle_fen(game: chess.Board):
+        builder = []
+        builder.append(game.board_fen())
+        builder.append('w' if game.turn == chess.WHITE else 'b')
+        builder.append(game.castling_xfen())
+        builder.append(chess.SQUARE_NAMES[game.ep_square] if game.ep_square else '-')
+        builder.append(str(game.halfmove_clock))
+        builder.append(str(game.fullmove_number))
+        return ' '.join(builder)
+
+    def _build_headers(self):
+        self._create_headers()
+        pgn_game = pgn.Game()
+        self._build_game_header(pgn_game)
+        self.shared['headers'].update(pgn_game.headers)
+
+    def _send_headers(self):
+        EventHandler.write_to_clients({'event': 'Header', 'headers': self.shared['headers']})
+
+    def _send_title(self):
+        EventHandler.write_to_clients({'event': 'Title', 'ip_info': self.shared['ip_info']})
+
+    def _transfer(self, game: chess.Board):
+        pgn_game = pgn.Game().from_board(game)
+        self._build_game_header(pgn_game)
+        self.shared['headers'] = pgn_game.headers
+        return pgn_game.accept(pgn.StringExporter(headers=True, comments=False, variations=False))
+
+    @staticmethod
+    def _peek_uci(game: chess.Board):
+        """Return last move in uci format."""
+        try:
+            return game.peek().uci()
+        except IndexError:
+            return chess.Move.null().uci()
+
+    def _on_new_game(self, message):
+        self.starttime = datetime.datetime.now().strftime('%H:%M:%S')
+        pgn_str = self._transfer(message.game.board())
+        fen = message.game.fen()
+        result = {'pgn': pgn_str, 'fen': fen, 'event': 'Game', 'move': '0000', 'play': 'newgame'}
+        self.shared['last_dgt_move_msg'] = result
+        EventHandler.write_to_clients(result)
+        self._send_headers()  # don't need _build_headers()
+
+    def _on_ip_info(self, message):
+        self.shared['ip_info'] = message.info
+        self._build_headers()
+        self._send_headers()
+        self._send_title()
+
+    def _on_system_info(self, message):
+        self.shared['system_info'] = message.info
+        self.shared['system_info']['old_engine'] = self.shared['system_info']['engine_name']
+        self._build_headers()
+        self._send_headers()
+
+    def _on_engine_startup(self, message):
+        for index in range(0, len(message.installed_engines)):
+            eng = message.installed_engines[index]
+            if eng['file'] == message.file:
+                self.shared['system_info']['engine_elo'] = eng['elo']
+                break
+        self._build_headers()
+        self._send_headers()
+
+    def _on_engine_ready(self, message):
+        self._create_system_info()
+        self.shared['system_info']['old_engine'] = self.shared['system_info']['engine_name'] = message.engine_name
+        self.shared['system_info']['engine_elo'] = message.eng['elo']
+        if not message.has_levels:
+            if 'level_text' in self.shared['game_info']:
                 del self.shared['game_info']['level_text']
-            if message.info['level_name'] is None:
+            if 'level_name' in self.shared['game_info']:
                 del self.shared['game_info']['level_name']
+        self._build_headers()
+        self._send_headers()
+
+    def _on_startup_info(self, message):
+        self.shared['game_info'] = message.info.copy()
+        # change book_index to book_text
+        books = message.info['books']
+        book_index = message.info['book_index']
+        self.shared['game_info']['book_text'] = books[book_index]['text']
+        del self.shared['game_info']['book_index']
+
+        if message.info['level_text'] is None:
+            del self.shared['game_info']['level_text']
+        if message.info['level_name'] is None:
+            del self.shared['game_info']['level_name']
+
+    def _on_new_book(self, message):
+        self._create_game_info()
+        self.shared['game_info']['book_text'] = message.book_text
+
+    def _on_interaction_mode(self, message):
+        self._create_game_info()
+        self.shared['game_info']['interaction_mode'] = message.mode
+        if self.shared['game_info']['interaction_mode'] == Mode.REMOTE:
+            self.shared['system_info']['engine_name'] = 'Remote Player'
+        else:
+            self.shared['system_info']['engine_name'] = self.shared['system_info']['old_engine']
+        self._build_headers()
+        self._send_headers()
+
+    def _on_play_mode(self, message):
+        self._create_game_info()
+        self.shared['game_info']['play_mode'] = message.play_mode
+        self._build_headers()
+        self._send_headers()
+
+    def _on_time_control(self, message):
+        self._create_game_info()
+        self.shared['game_info']['time_text'] = message.time_text
+        self.shared['game_info']['tc_init'] = message.tc_init
+
+    def _on_new_level(self, message):
+        self._create_game_info()
+        self.shared['game_info']['level_text'] = message.level_text
+        self.shared['game_info']['level_name'] = message.level_name
+        self._build_headers()
+        self._send_headers()
+
+    def _on_dgt_clock_version(self, message):
+        if message.dev == 'ser':
+            attached = 'serial'
+        elif message.dev == 'i2c':
+            attached = 'i2c-pi'
+        else:
+            attached = 'server'
+        result = {'event': 'Status', 'msg': 'Ok clock ' + attached}
+        EventHandler.write_to_clients(result)
 
-        elif isinstance(message, Message.NEW_BOOK):
-            self._create_game_info()
-            self.shared['game_info']['book_text'] = message.book_text
-
-        elif isinstance(message, Message.INTERACTION_MODE):
-            self._create_game_info()
-            self.shared['game_info']['interaction_mode'] = message.mode
-            if self.shared['game_info']['interaction_mode'] == Mode.REMOTE:
-                self.shared['system_info']['engine_name'] = 'Remote Player'
-            else:
-                self.shared['system_info']['engine_name'] = self.shared['system_info']['old_engine']
-            _build_headers()
-            _send_headers()
-
-        elif isinstance(message, Message.PLAY_MODE):
-            self._create_game_info()
-            self.shared['game_info']['play_mode'] = message.play_mode
-            _build_headers()
-            _send_headers()
-
-        elif isinstance(message, Message.TIME_CONTROL):
-            self._create_game_info()
-            self.shared['game_info']['time_text'] = message.time_text
-            self.shared['game_info']['tc_init'] = message.tc_init
-
-        elif isinstance(message, Message.NEW_LEVEL):
-            self._create_game_info()
-            self.shared['game_info']['level_text'] = message.level_text
-            self.shared['game_info']['level_name'] = message.level_name
-            _build_headers()
-            _send_headers()
-
-        elif isinstance(message, Message.DGT_CLOCK_ERROR):
-            # result = {'event': 'Status', 'msg': 'Error clock'}
-            # EventHandler.write_to_clients(result)
-            pass
-
-        elif isinstance(message, Message.DGT_CLOCK_VERSION):
-            if message.dev == 'ser':
-                attached = 'serial'
-            elif message.dev == 'i2c':
-                attached = 'i2c-pi'
-            else:
-                attached = 'server'
-            result = {'event': 'Status', 'msg': 'Ok clock ' + attached}
-            EventHandler.write_to_clients(result)
-
-        elif isinstance(message, Message.COMPUTER_MOVE):
-            game_copy = message.game.copy()
-            game_copy.push(message.move)
-            pgn_str = _transfer(game_copy)
-            fen = _oldstyle_fen(game_copy)
-            mov = message.move.uci()
-            result = {'pgn': pgn_str, 'fen': fen, 'event': 'Fen', 'move': mov, 'play': 'computer'}
-            self.shared['last_dgt_move_msg'] = result  # not send => keep it for COMPUTER_MOVE_DONE
-
-        elif isinstance(message, Message.COMPUTER_MOVE_DONE):
-            result = self.shared['last_dgt_move_msg']
-            EventHandler.write_to_clients(result)
-
-        elif isinstance(message, Message.USER_MOVE_DONE):
-            pgn_str = _transfer(message.game)
-            fen = _oldstyle_fen(message.game)
-            mov = message.move.uci()
-            result = {'pgn': pgn_str, 'fen': fen, 'event': 'Fen', 'move': mov, 'play': 'user'}
-            self.shared['last_dgt_move_msg'] = result
-            EventHandler.write_to_clients(result)
+    def _on_computer_move(self, message):
+        game_copy = message.game.board()
+        game_copy.push(message.move)
+        pgn_str = self._transfer(game_copy)
+        fen = self._oldstyle_fen(game_copy)
+        mov = message.move.uci()
+        result = {'pgn': pgn_str, 'fen': fen, 'event': 'Fen', 'move': mov, 'play': 'computer'}
+        self.shared['last_dgt_move_msg'] = result  # not send => keep it for COMPUTER_MOVE_DONE
+
+    def _on_computer_move_done(self, message):
+        result = self.shared['last_dgt_move_msg']
+        EventHandler.write_to_clients(result)
 
-        elif isinstance(message, Message.REVIEW_MOVE_DONE):
-            pgn_str = _transfer(message.game)
-            fen = _oldstyle_fen(message.game)
-            mov = message.move.uci()
-            result = {'pgn': pgn_str, 'fen': fen, 'event': 'Fen', 'move': mov, 'play': 'review'}
-            self.shared['last_dgt_move_msg'] = result
-            EventHandler.write_to_clients(result)
+    def _on_user_move_done(self, message):
+        game = message.game.board()
+        pgn_str = self._transfer(game)
+        fen = self._oldstyle_fen(game)
+        mov = message.move.uci()
+        result = {'pgn': pgn_str, 'fen': fen, 'event': 'Fen', 'move': mov, 'play': 'user'}
+        self.shared['last_dgt_move_msg'] = result
+        EventHandler.write_to_clients(result)
 
-        elif isinstance(message, Message.ALTERNATIVE_MOVE):
-            pgn_str = _transfer(message.game)
-            fen = _oldstyle_fen(message.game)
-            mov = peek_uci(message.game)
-            result = {'pgn': pgn_str, 'fen': fen, 'event': 'Fen', 'move': mov, 'play': 'reload'}
-            self.shared['last_dgt_move_msg'] = result
-            EventHandler.write_to_clients(result)
+    def _on_review_move_done(self, message):
+        game = message.game.board()
+        pgn_str = self._transfer(game)
+        fen = self._oldstyle_fen(game)
+        mov = message.move.uci()
+        result = {'pgn': pgn_str, 'fen': fen, 'event': 'Fen', 'move': mov, 'play': 'review'}
+        self.shared['last_dgt_move_msg'] = result
+        EventHandler.write_to_clients(result)
 
-        elif isinstance(message, Message.SWITCH_SIDES):
-            pgn_str = _transfer(message.game)
-            fen = _oldstyle_fen(message.game)
-            mov = message.move.uci()
-            result = {'pgn': pgn_str, 'fen': fen, 'event': 'Fen', 'move': mov, 'play': 'reload'}
-            self.shared['last_dgt_move_msg'] = result
-            EventHandler.write_to_clients(result)
+    def _on_alternative_move(self, message):
+        game = message.game.board()
+        pgn_str = self._transfer(game)
+        fen = self._oldstyle_fen(game)
+        mov = self._peek_uci(message.game)
+        result = {'pgn': pgn_str, 'fen': fen, 'event': 'Fen', 'move': mov, 'play': 'reload'}
+        self.shared['last_dgt_move_msg'] = result
+        EventHandler.write_to_clients(result)
 
-        elif isinstance(message, Message.TAKE_BACK):
-            pgn_str = _transfer(message.game)
-            fen = _oldstyle_fen(message.game)
-            mov = peek_uci(message.game)
-            result = {'pgn': pgn_str, 'fen': fen, 'event': 'Fen', 'move': mov, 'play': 'reload'}
-            self.shared['last_dgt_move_msg'] = result
-            EventHandler.write_to_clients(result)
+    def _on_switch_sides(self, message):
+        game = message.game.board()
+        pgn_str = self._transfer(game)
+        fen = self._oldstyle_fen(game)
+        mov = message.move.uci()
+        result = {'pgn': pgn_str, 'fen': fen, 'event': 'Fen', 'move': mov, 'play': 'reload'}
+        self.shared['last_dgt_move_msg'] = result
+        EventHandler.write_to_clients(result)
 
-        elif isinstance(message, Message.GAME_ENDS):
-            pass
+    def _on_take_back(self, message):
+        game = message.game.board()
+        pgn_str = self._transfer(game)
+        fen = self._oldstyle_fen(game)
+        mov = self._peek_uci(message.game)
+        result = {'pgn': pgn_str, 'fen': fen, 'event': 'Fen', 'move': mov, 'play': 'reload'}
+        self.shared['last_dgt_move_msg'] = result
+        EventHandler.write_to_clients(result)
 
-        else:  # Default
-            pass
+    def _on_new_analysis(self, message):
+        fen = message.game.fen()
+        lines = {}
+        for num, line in message.lines.items():  # compact: [depth, cp, mate, uci moves]
+            lines[str(num)] = [line['depth'], line['score'], line['mate'], ' '.join(mov.uci() for mov in line['pv'])]
+        reset = fen != self.analysis['fen']
+        if reset:
+            changed, removed = lines, []
+        else:  # same position => send the changed lines only
+            old_lines = self.analysis['lines']
+            changed = {num: line for num, line in lines.items() if old_lines.get(num) != line}
+            removed = [num for num in old_lines if num not in lines]
+        self.analysis = {'fen': fen, 'lines': lines}
+        if changed or removed or reset:
+            EventHandler.write_to_clients({'event': 'Analysis', 'fen': fen, 'reset': reset, 'lines': changed,
+                                           'removed': removed})
+
+    def _on_tablebase_result(self, message):
+        texts = {GameResult.WIN_WHITE: 'white wins', GameResult.WIN_BLACK: 'black wins', GameResult.DRAW: 'draw'}
+        text = 'Tablebase: {} (DTZ {})'.format(texts[message.result], abs(message.dtz))
+        EventHandler.write_to_clients({'event': 'Message', 'msg': text})
 
     def _create_task(self, msg):
-        IOLoop.instance().add_callback(callback=lambda: self.task(msg))
+        IOLoop.instance().add_callback(callback=lambda: self.dispatch(msg))
 
     def run(self):
         """Call by threading.Thread start() function."""
@@ -0,0 +1,158 @@
+# Copyright (C) 2013-2018 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+import chess
+import chess.syzygy
+from dgt.util import GameResult
+
+
+class Tablebase(object):
+
+    """Probe the syzygy tablebases (memory mapped by python-chess) - the probed positions are kept in a LRU cache."""
+
+    def __init__(self, cache_size=4096):
+        super(Tablebase, self).__init__()
+        self.tablebases = None
+        self.pieces = 0  # max number of pieces the tables cover
+        self.cache = OrderedDict()  # epd => (wdl, dtz)
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self.probes = 0
+        self.hits = 0
+        self.fails = 0
+        self.probe_total = 0.0
+        self.probe_max = 0.0
+
+    def open(self, path: str):
+        """Open the tables found in path - return True if there are any."""
+        if not path or not os.path.isdir(path):
+            logging.warning('tablebase path [%s] not found', path)
+            return False
+        names = [name.split('.')[0] for name in os.listdir(path) if name.endswith('.rtbw')]
+        if not names:
+            logging.warning('no syzygy tables found in [%s]', path)
+            return False
+        with self.lock:
+            self.tablebases = chess.syzygy.open_tablebases(path)
+            self.pieces = max(len(name) - 1 for name in names)  # KQvK => 3 pieces
+            self.cache.clear()
+        logging.debug('opened %i syzygy tables with up to %i pieces', len(names), self.pieces)
+        return True
+
+    def close(self):
+        """Close the tables."""
+        with self.lock:
+            if self.tablebases:
+                self.tablebases.close()
+            self.tablebases = None
+            self.pieces = 0
+            self.cache.clear()
+
+    def covers(self, board: chess.Board):
+        """Return if the position can be probed."""
+        return self.tablebases is not None and not board.castling_rights and \
+            chess.popcount(board.occupied) <= self.pieces
+
+    def probe(self, board: chess.Board):
+        """Return (wdl, dtz) from the side to move's view - or None if the position is not covered."""
+        if not self.covers(board):
+            return None
+        key = board.epd()
+        with self.lock:
+            if key in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            start = time.perf_counter()
+            try:
+                res = (self.tablebases.probe_wdl(board), self.tablebases.probe_dtz(board))
+            except (KeyError, ValueError, OSError) as exc:  # missing table or a broken file
+                self.fails += 1
+                logging.warning('tablebase probe failed for [%s] %s', key, exc)
+                return None
+            secs = time.perf_counter() - start
+            self.probes += 1
+            self.probe_total += secs
+            self.probe_max = max(self.probe_max, secs)
+            self.cache[key] = res
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            return res
+
+    def _rank(self, board: chess.Board, move: chess.Move):
+        """Return a sort key for the move (higher is better) - or None if it can't be probed."""
+        zeroing = board.is_zeroing(move)
+        board.push(move)
+        try:
+            if board.is_checkmate():
+                return 3, 0, 0
+            res = self.probe(board)
+        finally:
+            board.pop()
+        if res is None:
+            return None
+        wdl, dtz = res  # from the opponent's view
+        if wdl < 0:  # we win: reset the 50 moves counter if possible, else come closer to it
+            return -wdl, int(zeroing), -abs(dtz)
+        if wdl > 0:  # we lose: resist as long as possible
+            return -wdl, 0, abs(dtz)
+        return 0, 0, 0
+
+    def best_move(self, board: chess.Board, moves=None):
+        """Return the best tablebase move out of moves (default: all legal) - or None if not covered (or ended)."""
+        if not self.covers(board):
+            return None
+        board = board.copy(stack=False)
+        best_move, best_rank = None, None
+        for move in (board.legal_moves if moves is None else moves):
+            rank = self._rank(board, move)
+            if rank is None:
+                return None
+            if best_rank is None or rank > best_rank:
+                best_move, best_rank = move, rank
+        return best_move
+
+    def result(self, board: chess.Board):
+        """Return the GameResult the position ends with (perfect play, 50 moves rule) - or None if not covered."""
+        res = self.probe(board)
+        if res is None:
+            return None
+        wdl, dtz = res
+        if wdl in (-1, 0, 1):  # cursed wins and blessed losses are draws by the 50 moves rule
+            return GameResult.DRAW
+        if abs(dtz) + board.halfmove_clock > 100:  # the next zeroing move comes too late => 50 moves rule
+            return GameResult.DRAW
+        if (wdl > 0) == (board.turn == chess.WHITE):
+            return GameResult.WIN_WHITE
+        return GameResult.WIN_BLACK
+
+    def stats(self):
+        """Return the probe counters and latencies (in ms)."""
+        with self.lock:
+            avg = self.probe_total / self.probes if self.probes else 0.0
+            return {'pieces': self.pieces, 'probes': self.probes, 'cache_hits': self.hits, 'fails': self.fails,
+                    'cached': len(self.cache), 'avg_ms': round(avg * 1000, 3),
+                    'max_ms': round(self.probe_max * 1000, 3)}
+
+
+tablebase = Tablebase()
@@ -23,11 +23,14 @@ import threading
 import logging
 import subprocess
 import queue
+import heapq
+import itertools
 from pathlib import Path
 from shutil import which
 
 import chess
 from utilities import MsgDisplay
+from gamestate import game_state
 from timecontrol import TimeControl
 from dgt.api import Message
 from dgt.util import GameResult, PlayMode, Voice
@@ -82,6 +85,87 @@ class PicoTalker(object):
                 logging.warning('voice file not found %s', voice_file)
         return result
 
+    def prefetch(self, sounds):
+        """Read the sound files once, so a later talk() doesnt wait for the sd card."""
+        if not self.voice_path:
+            return False
+        for part in sounds:
+            voice_file = Path(self.voice_path + '/' + part)
+            try:
+                with voice_file.open('rb') as file:
+                    while file.read(64 * 1024):
+                        pass
+            except OSError:
+                logging.debug('voice file not prefetched %s', voice_file)
+        return True
+
+
+class PicoTalkerQueue(threading.Thread):
+
+    """Schedule the speech output by priority and play it without blocking the message handling."""
+
+    PRIO_SYSTEM = 0  # errors, shutdown, reboot
+    PRIO_MOVE = 1  # moves and game results - spoken in order of arrival
+    PRIO_CONFIRM = 2  # confirmation of menu settings
+    PRIO_PREFETCH = 3  # prepare the next likely announcement
+
+    def __init__(self):
+        super(PicoTalkerQueue, self).__init__(daemon=True)
+        self.condition = threading.Condition()
+        self.heap = []
+        self.pending = {}  # kind => unspoken entry, used to supersede an older announcement of the same kind
+        self.counter = itertools.count()
+
+    def put(self, function, sounds, priority: int, kind=None):
+        """Schedule function(sounds). A newer entry of the same kind replaces an unspoken older one."""
+        with self.condition:
+            if kind:
+                self._cancel(kind)
+            entry = [priority, next(self.counter), function, sounds, kind, True]
+            heapq.heappush(self.heap, entry)
+            if kind:
+                self.pending[kind] = entry
+            self.condition.notify()
+
+    def _cancel(self, kind):
+        entry = self.pending.pop(kind, None)
+        if entry:
+            logging.debug('superseding unspoken %s %s', kind, entry[3])
+            entry[-1] = False
+
+    def cancel(self, *kinds):
+        """Drop the unspoken announcements of the given kinds."""
+        with self.condition:
+            for kind in kinds:
+                self._cancel(kind)
+
+    def clear(self):
+        """Drop all unspoken announcements."""
+        with self.condition:
+            self.heap = []
+            self.pending = {}
+
+    def _get(self):
+        with self.condition:
+            while True:
+                while self.heap:
+                    entry = heapq.heappop(self.heap)
+                    if entry[-1]:
+                        if entry[4] and self.pending.get(entry[4]) is entry:
+                            del self.pending[entry[4]]
+                        return entry
+                self.condition.wait()
+
+    def run(self):
+        """Call by threading.Thread start() function."""
+        logging.info('speech_queue ready')
+        while True:
+            _, _, function, sounds, _, _ = self._get()
+            try:
+                function(sounds)
+            except Exception:  # never let a broken sound file kill the playback worker
+                logging.exception('speech output failed for %s', sounds)
+
 
 class PicoTalkerDisplay(MsgDisplay, threading.Thread):
 
@@ -91,12 +175,14 @@ class PicoTalkerDisplay(MsgDisplay, threading.Thread):
     COMPUTER = 'computer'
     SYSTEM = 'system'
 
-    def __init__(self, user_voice: str, computer_voice: str, speed_factor: int, setpieces_voice: bool):
+    def __init__(self, user_voice: str, computer_voice: str, speed_factor: int, setpieces_voice: bool,
+                 prerender_voice=False):
         """
         Initialize a PicoTalkerDisplay with voices for the user and/or computer players.
 
         :param user_voice: The voice to use for the user (eg. en:al).
         :param computer_voice: The voice to use for the computer (eg. en:christina).
+        :param prerender_voice: Prepare the announcement of the engine's ponder move in advance.
         """
         super(PicoTalkerDisplay, self).__init__()
         self.user_picotalker = None  # type: PicoTalker
@@ -106,6 +192,11 @@ class PicoTalkerDisplay(MsgDisplay, threading.Thread):
         self.low_time = False
         self.play_game = None  # saves the game after a computer move - used for "setpieces" to speak the move again
         self.setpieces_voice = setpieces_voice
+        self.prerender_voice = prerender_voice
+        self.prerendered = (None, None, [])  # (fen, move, voice_parts) of the expected user move
+        self.previous_move = chess.Move.null()  # Ignore repeated broadcasts of a move
+        self.speech_queue = PicoTalkerQueue()
+        self.speech_queue.start()
 
         if user_voice:
             logging.debug('creating user voice: [%s]', str(user_voice))
@@ -114,6 +205,30 @@ class PicoTalkerDisplay(MsgDisplay, threading.Thread):
             logging.debug('creating computer voice: [%s]', str(computer_voice))
             self.set_computer(PicoTalker(computer_voice, self.speed_factor))
 
+        self.subscribe({
+            Message.ENGINE_FAIL: self._on_engine_fail,
+            Message.NEW_GAME: self._on_new_game,
+            Message.COMPUTER_MOVE: self._on_computer_move,
+            Message.COMPUTER_MOVE_DONE: self._on_computer_move_done,
+            Message.USER_MOVE_DONE: self._on_user_move_done,
+            Message.REVIEW_MOVE_DONE: self._on_review_move_done,
+            Message.GAME_ENDS: self._on_game_ends,
+            Message.TAKE_BACK: self._on_take_back,
+            Message.TIME_CONTROL: self._on_time_control,
+            Message.INTERACTION_MODE: self._on_interaction_mode,
+            Message.NEW_LEVEL: self._on_new_level,
+            Message.NEW_BOOK: self._on_new_book,
+            Message.ENGINE_READY: self._on_engine_ready,
+            Message.PLAY_MODE: self._on_play_mode,
+            Message.STARTUP_INFO: self._on_startup_info,
+            Message.CLOCK_TIME: self._on_clock_time,
+            Message.ALTERNATIVE_MOVE: self._on_alternative_move,
+            Message.SYSTEM_SHUTDOWN: self._on_system_shutdown,
+            Message.SYSTEM_REBOOT: self._on_system_reboot,
+            Message.NEW_VOICE: self._on_new_voice,
+            Message.WRONG_FEN: self._on_wrong_fen,
+        })
+
     def set_computer(self, picotalker):
         """Set the computer talker."""
         self.computer_picotalker = picotalker
@@ -129,175 +244,206 @@ class PicoTalkerDisplay(MsgDisplay, threading.Thread):
         if self.user_picotalker:
             self.user_picotalker.set_speed_factor(speed_factor)
 
-    def talk(self, sounds, dev=SYSTEM):
+    def talk(self, sounds, dev=SYSTEM, priority=PicoTalkerQueue.PRIO_MOVE, kind=None):
+        """Schedule the sounds on the speech queue (non blocking)."""
         if self.low_time:
             return
+        picotalker = self._get_talker(dev)
+        if picotalker:
+            self.speech_queue.put(picotalker.talk, sounds, priority, kind)
+
+    def _get_talker(self, dev):
         if False:  # switch-case
             pass
         elif dev == self.USER:
-            if self.user_picotalker:
-                self.user_picotalker.talk(sounds)
+            return self.user_picotalker
         elif dev == self.COMPUTER:
-            if self.computer_picotalker:
-                self.computer_picotalker.talk(sounds)
+            return self.computer_picotalker
         elif dev == self.SYSTEM:
-            if self.computer_picotalker:
-                if self.computer_picotalker.talk(sounds):
-                    return
-            if self.user_picotalker:
-                self.user_picotalker.talk(sounds)
+            if self.computer_picotalker and self.computer_picotalker.voice_path:
+                return self.computer_picotalker
+            return self.user_picotalker
+        return None
+
+    def confirm(self, sounds):
+        """Schedule a confirmation, only the latest unspoken confirmation survives."""
+        self.talk(sounds, priority=PicoTalkerQueue.PRIO_CONFIRM, kind='confirm')
+
+    def _prerender_ponder(self, game: chess.Board, ponder: chess.Move):
+        """Prepare the voice parts for the ponder move, so the expected user move is announced without delay."""
+        self.prerendered = (None, None, [])
+        if not self.prerender_voice or not self.user_picotalker or not ponder or not game.is_legal(ponder):
+            return
+        game_copy = game.copy()
+        game_copy.push(ponder)
+        voice_parts = self.say_last_move(game_copy)
+        self.prerendered = (game.fen(), ponder, voice_parts)
+        logging.debug('prerendered ponder move [%s] %s', ponder, voice_parts)
+        self.speech_queue.put(self.user_picotalker.prefetch, voice_parts, PicoTalkerQueue.PRIO_PREFETCH, 'prefetch')
+
+    def _get_user_move_parts(self, message):
+        fen, move, voice_parts = self.prerendered
+        self.prerendered = (None, None, [])
+        if fen == message.fen and move == message.move:
+            logging.debug('using prerendered voice parts for [%s]', move)
+            return voice_parts
+        return self.say_last_move(message.game.board())
+
+    def _on_engine_fail(self, message):
+        logging.debug('announcing ENGINE_FAIL')
+        self.talk(['error.ogg'], priority=PicoTalkerQueue.PRIO_SYSTEM)
+
+    def _on_new_game(self, message):
+        if message.newgame:
+            logging.debug('announcing NEW_GAME')
+            self.speech_queue.cancel('computer_move', 'user_move', 'confirm')
+            self.talk(['newgame.ogg'])
+            self.play_game = None
+            self.prerendered = (None, None, [])
+
+    def _on_computer_move(self, message):
+        if message.move and message.game and message.move != self.previous_move:
+            logging.debug('announcing COMPUTER_MOVE [%s]', message.move)
+            game_copy = message.game.board()
+            game_copy.push(message.move)
+            self.talk(self.say_last_move(game_copy), self.COMPUTER, kind='computer_move')
+            self.previous_move = message.move
+            self.play_game = game_copy
+            self._prerender_ponder(game_copy, message.ponder)
+
+    def _on_computer_move_done(self, message):
+        self.play_game = None
+
+    def _on_user_move_done(self, message):
+        if message.move and message.game and message.move != self.previous_move:
+            logging.debug('announcing USER_MOVE_DONE [%s]', message.move)
+            self.speech_queue.cancel('computer_move')  # computer move was never played on the board
+            self.talk(self._get_user_move_parts(message), self.USER, kind='user_move')
+            self.previous_move = message.move
+            self.play_game = None
+
+    def _on_review_move_done(self, message):
+        if message.move and message.game and message.move != self.previous_move:
+            logging.debug('announcing REVIEW_MOVE_DONE [%s]', message.move)
+            self.talk(self.say_last_move(message.game.board()), self.USER, kind='user_move')
+            self.previous_move = message.move
+            self.play_game = None  # @todo why thats not set in dgtdisplay?
+
+    def _on_game_ends(self, message):
+        if message.result == GameResult.FLAG_TIME:
+            logging.debug('announcing GAME_ENDS/CLOCK FLAG')
+            wins = 'whitewins.ogg' if message.game.turn == chess.BLACK else 'blackwins.ogg'
+            self.talk(['timelost.ogg', wins])
+        elif message.result == GameResult.INSUFFICIENT_MATERIAL:
+            logging.debug('announcing GAME_ENDS/INSUFFICIENT_MATERIAL')
+            self.talk(['material.ogg', 'draw.ogg'])
+        elif message.result == GameResult.MATE:
+            logging.debug('announcing GAME_ENDS/MATE')
+            self.talk(['checkmate.ogg'])
+        elif message.result == GameResult.STALEMATE:
+            logging.debug('announcing GAME_ENDS/STALEMATE')
+            self.talk(['stalemate.ogg'])
+        elif message.result == GameResult.ABORT:
+            logging.debug('announcing GAME_ENDS/ABORT')
+            self.talk(['abort.ogg'])
+        elif message.result == GameResult.DRAW:
+            logging.debug('announcing GAME_ENDS/DRAW')
+            self.talk(['draw.ogg'])
+        elif message.result == GameResult.WIN_WHITE:
+            logging.debug('announcing GAME_ENDS/WHITE_WIN')
+            self.talk(['whitewins.ogg'])
+        elif message.result == GameResult.WIN_BLACK:
+            logging.debug('announcing GAME_ENDS/BLACK_WIN')
+            self.talk(['blackwins.ogg'])
+        elif message.result == GameResult.FIVEFOLD_REPETITION:
+            logging.debug('announcing GAME_ENDS/FIVEFOLD_REPETITION')
+            self.talk(['repetition.ogg', 'draw.ogg'])
+
+    def _on_take_back(self, message):
+        logging.debug('announcing TAKE_BACK')
+        self.speech_queue.cancel('computer_move', 'user_move')
+        self.talk(['takeback.ogg'])
+        self.prerendered = (None, None, [])
+        self.play_game = None
+        self.previous_move = chess.Move.null()
+
+    def _on_time_control(self, message):
+        logging.debug('announcing TIME_CONTROL')
+        self.confirm(['oktime.ogg'])
+
+    def _on_interaction_mode(self, message):
+        logging.debug('announcing INTERACTION_MODE')
+        self.confirm(['okmode.ogg'])
+
+    def _on_new_level(self, message):
+        if message.do_speak:
+            logging.debug('announcing LEVEL')
+            self.confirm(['oklevel.ogg'])
+        else:
+            logging.debug('dont announce LEVEL cause its also an engine message')
+
+    def _on_new_book(self, message):
+        logging.debug('announcing OPENING_BOOK')
+        self.confirm(['okbook.ogg'])
+
+    def _on_engine_ready(self, message):
+        logging.debug('announcing ENGINE_READY')
+        self.confirm(['okengine.ogg'])
+
+    def _on_play_mode(self, message):
+        logging.debug('announcing PLAY_MODE')
+        self.play_mode = message.play_mode
+        userplay = 'userblack.ogg' if message.play_mode == PlayMode.USER_BLACK else 'userwhite.ogg'
+        self.confirm([userplay])
+
+    def _on_startup_info(self, message):
+        self.play_mode = message.info['play_mode']
+        logging.debug('announcing PICOCHESS')
+        self.talk(['picoChess.ogg'])
+
+    def _on_clock_time(self, message):
+        self.low_time = message.low_time
+        if self.low_time:
+            logging.debug('time too low, disable voice - w: %i, b: %i', message.time_white,
+                          message.time_black)
+            self.speech_queue.cancel('confirm', 'prefetch')
+
+    def _on_alternative_move(self, message):
+        self.play_mode = message.play_mode
+        self.play_game = None
+
+    def _on_system_shutdown(self, message):
+        logging.debug('announcing SHUTDOWN')
+        self.speech_queue.clear()
+        self.talk(['goodbye.ogg'], priority=PicoTalkerQueue.PRIO_SYSTEM)
+
+    def _on_system_reboot(self, message):
+        logging.debug('announcing REBOOT')
+        self.speech_queue.clear()
+        self.talk(['pleasewait.ogg'], priority=PicoTalkerQueue.PRIO_SYSTEM)
+
+    def _on_new_voice(self, message):
+        self.speed_factor = (90 + (message.speed % 10) * 5) / 100
+        localisation_id_voice = message.lang + ':' + message.speaker
+        if message.type == Voice.USER:
+            self.set_user(PicoTalker(localisation_id_voice, self.speed_factor))
+        if message.type == Voice.COMP:
+            self.set_computer(PicoTalker(localisation_id_voice, self.speed_factor))
+        if message.type == Voice.SPEED:
+            self.set_factor(self.speed_factor)
+
+    def _on_wrong_fen(self, message):
+        if self.play_game and self.setpieces_voice:
+            self.talk(self.say_last_move(self.play_game), self.COMPUTER, kind='computer_move')
 
     def run(self):
         """Start listening for Messages on our queue and generate speech as appropriate."""
-        previous_move = chess.Move.null()  # Ignore repeated broadcasts of a move
         logging.info('msg_display ready')
         while True:
             try:
                 # Check if we have something to say
                 message = self.msg_queue.get()
-
-                if False:  # switch-case
-                    pass
-                elif isinstance(message, Message.ENGINE_FAIL):
-                    logging.debug('announcing ENGINE_FAIL')
-                    self.talk(['error.ogg'])
-
-                elif isinstance(message, Message.NEW_GAME):
-                    if message.newgame:
-                        logging.debug('announcing NEW_GAME')
-                        self.talk(['newgame.ogg'])
-                        self.play_game = None
-
-                elif isinstance(message, Message.COMPUTER_MOVE):
-                    if message.move and message.game and message.move != previous_move:
-                        logging.debug('announcing COMPUTER_MOVE [%s]', message.move)
-                        game_copy = message.game.copy()
-                        game_copy.push(message.move)
-                        self.talk(self.say_last_move(game_copy), self.COMPUTER)
-                        previous_move = message.move
-                        self.play_game = game_copy
-
-                elif isinstance(message, Message.COMPUTER_MOVE_DONE):
-                    self.play_game = None
-
-                elif isinstance(message, Message.USER_MOVE_DONE):
-                    if message.move and message.game and message.move != previous_move:
-                        logging.debug('announcing USER_MOVE_DONE [%s]', message.move)
-                        self.talk(self.say_last_move(message.game), self.USER)
-                        previous_move = message.move
-                        self.play_game = None
-
-                elif isinstance(message, Message.REVIEW_MOVE_DONE):
-                    if message.move and message.game and message.move != previous_move:
-                        logging.debug('announcing REVIEW_MOVE_DONE [%s]', message.move)
-                        self.talk(self.say_last_move(message.game), self.USER)
-                        previous_move = message.move
-                        self.play_game = None  # @todo why thats not set in dgtdisplay?
-
-                elif isinstance(message, Message.GAME_ENDS):
-                    if message.result == GameResult.FLAG_TIME:
-                        logging.debug('announcing GAME_ENDS/CLOCK FLAG')
-                        wins = 'whitewins.ogg' if message.game.turn == chess.BLACK else 'blackwins.ogg'
-                        self.talk(['timelost.ogg', wins])
-                    elif message.result == GameResult.INSUFFICIENT_MATERIAL:
-                        logging.debug('announcing GAME_ENDS/INSUFFICIENT_MATERIAL')
-                        self.talk(['material.ogg', 'draw.ogg'])
-                    elif message.result == GameResult.MATE:
-                        logging.debug('announcing GAME_ENDS/MATE')
-                        self.talk(['checkmate.ogg'])
-                    elif message.result == GameResult.STALEMATE:
-                        logging.debug('announcing GAME_ENDS/STALEMATE')
-                        self.talk(['stalemate.ogg'])
-                    elif message.result == GameResult.ABORT:
-                        logging.debug('announcing GAME_ENDS/ABORT')
-                        self.talk(['abort.ogg'])
-                    elif message.result == GameResult.DRAW:
-                        logging.debug('announcing GAME_ENDS/DRAW')
-                        self.talk(['draw.ogg'])
-                    elif message.result == GameResult.WIN_WHITE:
-                        logging.debug('announcing GAME_ENDS/WHITE_WIN')
-                        self.talk(['whitewins.ogg'])
-                    elif message.result == GameResult.WIN_BLACK:
-                        logging.debug('announcing GAME_ENDS/BLACK_WIN')
-                        self.talk(['blackwins.ogg'])
-                    elif message.result == GameResult.FIVEFOLD_REPETITION:
-                        logging.debug('announcing GAME_ENDS/FIVEFOLD_REPETITION')
-                        self.talk(['repetition.ogg', 'draw.ogg'])
-
-                elif isinstance(message, Message.TAKE_BACK):
-                    logging.debug('announcing TAKE_BACK')
-                    self.talk(['takeback.ogg'])
-                    self.play_game = None
-                    previous_move = chess.Move.null()
-
-                elif isinstance(message, Message.TIME_CONTROL):
-                    logging.debug('announcing TIME_CONTROL')
-                    self.talk(['oktime.ogg'])
-
-                elif isinstance(message, Message.INTERACTION_MODE):
-                    logging.debug('announcing INTERACTION_MODE')
-                    self.talk(['okmode.ogg'])
-
-                elif isinstance(message, Message.NEW_LEVEL):
-                    if message.do_speak:
-                        logging.debug('announcing LEVEL')
-                        self.talk(['oklevel.ogg'])
-                    else:
-                        logging.debug('dont announce LEVEL cause its also an engine message')
-
-                elif isinstance(message, Message.NEW_BOOK):
-                    logging.debug('announcing OPENING_BOOK')
-                    self.talk(['okbook.ogg'])
-
-                elif isinstance(message, Message.ENGINE_READY):
-                    logging.debug('announcing ENGINE_READY')
-                    self.talk(['okengine.ogg'])
-
-                elif isinstance(message, Message.PLAY_MODE):
-                    logging.debug('announcing PLAY_MODE')
-                    self.play_mode = message.play_mode
-                    userplay = 'userblack.ogg' if message.play_mode == PlayMode.USER_BLACK else 'userwhite.ogg'
-                    self.talk([userplay])
-
-                elif isinstance(message, Message.STARTUP_INFO):
-                    self.play_mode = message.info['play_mode']
-                    logging.debug('announcing PICOCHESS')
-                    self.talk(['picoChess.ogg'])
-
-                elif isinstance(message, Message.CLOCK_TIME):
-                    self.low_time = message.low_time
-                    if self.low_time:
-                        logging.debug('time too low, disable voice - w: %i, b: %i', message.time_white,
-                                      message.time_black)
-
-                elif isinstance(message, Message.ALTERNATIVE_MOVE):
-                    self.play_mode = message.play_mode
-                    self.play_game = None
-
-                elif isinstance(message, Message.SYSTEM_SHUTDOWN):
-                    logging.debug('announcing SHUTDOWN')
-                    self.talk(['goodbye.ogg'])
-
-                elif isinstance(message, Message.SYSTEM_REBOOT):
-                    logging.debug('announcing REBOOT')
-                    self.talk(['pleasewait.ogg'])
-
-                elif isinstance(message, Message.NEW_VOICE):
-                    self.speed_factor = (90 + (message.speed % 10) * 5) / 100
-                    localisation_id_voice = message.lang + ':' + message.speaker
-                    if message.type == Voice.USER:
-                        self.set_user(PicoTalker(localisation_id_voice, self.speed_factor))
-                    if message.type == Voice.COMP:
-                        self.set_computer(PicoTalker(localisation_id_voice, self.speed_factor))
-                    if message.type == Voice.SPEED:
-                        self.set_factor(self.speed_factor)
-
-                elif isinstance(message, Message.WRONG_FEN):
-                    if self.play_game and self.setpieces_voice:
-                        self.talk(self.say_last_move(self.play_game), self.COMPUTER)
-
-                else:  # Default
-                    pass
+                self.dispatch(message)
             except queue.Empty:
                 pass
 
@@ -352,22 +498,19 @@ class PicoTalkerDisplay(MsgDisplay, threading.Thread):
                 if sound_file:
                     voice_parts += [sound_file]
 
-        if game.is_game_over():
-            if game.is_checkmate():
-                wins = 'whitewins.ogg' if game.turn == chess.BLACK else 'blackwins.ogg'
-                voice_parts += ['checkmate.ogg', wins]
-            elif game.is_stalemate():
-                voice_parts += ['stalemate.ogg']
-            else:
-                if game.is_seventyfive_moves():
-                    voice_parts += ['75moves.ogg', 'draw.ogg']
-                elif game.is_insufficient_material():
-                    voice_parts += ['material.ogg', 'draw.ogg']
-                elif game.is_fivefold_repetition():
-                    voice_parts += ['repetition.ogg', 'draw.ogg']
-                else:
-                    voice_parts += ['draw.ogg']
-        elif game.is_check():
+        state = game_state(game)
+        if state.result == GameResult.MATE:
+            wins = 'whitewins.ogg' if game.turn == chess.BLACK else 'blackwins.ogg'
+            voice_parts += ['checkmate.ogg', wins]
+        elif state.result == GameResult.STALEMATE:
+            voice_parts += ['stalemate.ogg']
+        elif state.result == GameResult.SEVENTYFIVE_MOVES:
+            voice_parts += ['75moves.ogg', 'draw.ogg']
+        elif state.result == GameResult.INSUFFICIENT_MATERIAL:
+            voice_parts += ['material.ogg', 'draw.ogg']
+        elif state.result == GameResult.FIVEFOLD_REPETITION:
+            voice_parts += ['repetition.ogg', 'draw.ogg']
+        elif state.is_check:
             voice_parts += ['check.ogg']
 
         if bit_board.is_en_passant(move):
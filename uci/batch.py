@@ -0,0 +1,293 @@
+# Copyright (C) 2013-2018 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import time
+import queue
+import logging
+import threading
+from subprocess import DEVNULL
+
+import chess
+import chess.pgn
+import chess.uci
+from gamestate import GameBoard, game_state
+from dgt.util import GameResult
+from pgn import Emailer, PgnArchive
+from uci.read import read_engine_ini
+
+MATE_SCORE = 100000  # centipawns of a mate (minus the moves till it)
+EVAL_CAP = 1000  # evals get capped for the loss of a move: missing a mate while keeping +10 is no blunder
+# (min centipawn loss, nag) - the first match wins
+LOSS_NAGS = ((300, chess.pgn.NAG_BLUNDER), (150, chess.pgn.NAG_MISTAKE), (70, chess.pgn.NAG_DUBIOUS_MOVE))
+
+
+def host_cores():
+    """Return the number of cores picochess may use."""
+    return len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+
+
+def find_engine(name: str, engine_path=None):
+    """Return the engines.ini entry with the file (section) or name given - the first one if name is empty."""
+    library = read_engine_ini(engine_path=engine_path)
+    if not library:
+        raise ValueError('no engines found in engines.ini')
+    if not name:
+        return library[0]
+    for entry in library:
+        if name in (os.path.basename(entry['file']), entry['name']):
+            return entry
+    raise ValueError('engine [{}] not found in engines.ini'.format(name))
+
+
+def start_engine(file: str, options: dict):
+    """Start a local engine with one search thread (the pools run one engine per core) - return it and its info."""
+    engine = chess.uci.popen_engine(file, stderr=DEVNULL)
+    handler = chess.uci.InfoHandler()
+    engine.info_handlers.append(handler)
+    engine.uci()
+    options = {name: value for name, value in options.items() if name in engine.options}
+    if 'Threads' in engine.options:
+        options['Threads'] = 1
+    if options:
+        engine.setoption(options)
+    engine.isready()
+    return engine, handler
+
+
+def score_cp(score, turn: bool):
+    """Return the uci score (from the side to move) as centipawns from white's view - or None."""
+    if score is None:
+        return None
+    if score.mate is not None:
+        value = MATE_SCORE - abs(score.mate) if score.mate > 0 else -MATE_SCORE + abs(score.mate)
+    else:
+        value = score.cp
+    return value if turn == chess.WHITE else -value
+
+
+def format_cp(value: int):
+    """Return the eval in pawns (or as mate in n moves) like the pgn %eval comments."""
+    if abs(value) > MATE_SCORE - 1000:
+        return '#{}'.format(MATE_SCORE - value if value > 0 else -MATE_SCORE - value)
+    return '{:.2f}'.format(value / 100)
+
+
+class AnalysisWorker(threading.Thread):
+
+    """Search the positions of the job queue with an own engine process - a crashed engine gets restarted."""
+
+    def __init__(self, file: str, options: dict, limits: dict, jobs: queue.Queue, results: queue.Queue):
+        super(AnalysisWorker, self).__init__(daemon=True)
+        self.file = file
+        self.options = options
+        self.limits = limits
+        self.jobs = jobs
+        self.results = results
+        self.error = None  # why the engine couldn't be started - the worker stops then
+
+    @staticmethod
+    def _quit(engine):
+        try:
+            engine.quit()
+        except Exception:  # already dead
+            pass
+
+    def run(self):
+        """Call by threading.Thread start() function."""
+        engine = handler = None
+        while self.error is None:
+            job = self.jobs.get()
+            if job is None:
+                break
+            key, board = job
+            best, score = None, None
+            for _ in range(2):  # a second try with a new engine
+                if engine is None:
+                    try:
+                        engine, handler = start_engine(self.file, self.options)
+                    except (OSError, chess.uci.EngineTerminatedException) as exc:
+                        logging.error('engine [%s] cant be started: %s', self.file, exc)
+                        self.error = exc
+                        break
+                try:
+                    engine.position(board)
+                    best = engine.go(**self.limits).bestmove
+                    with handler:
+                        score = handler.info.get('score', {}).get(1)
+                    break
+                except chess.uci.EngineTerminatedException:
+                    logging.warning('engine [%s] terminated on fen: %s', self.file, board.fen())
+                    engine = None
+                except Exception:
+                    logging.exception('engine [%s] failed on fen: %s', self.file, board.fen())
+                    self._quit(engine)
+                    engine = None
+            self.results.put((key, best, score_cp(score, board.turn)))  # always - the collector waits for it
+        if engine:
+            self._quit(engine)
+
+
+class _PendingGame(object):
+
+    """A game whose positions are (partly) still searched."""
+
+    def __init__(self, number: int, game: chess.pgn.Game):
+        self.number = number
+        self.game = game
+        self.boards = []
+        self.evals = []
+        self.best = []
+        self.missing = 0
+
+
+class BatchAnalysis(object):
+
+    """Annotate the games of a pgn archive with evals and bad moves - the positions are searched by an engine pool."""
+
+    def __init__(self, pgn_file: str, out_file: str, entry: dict, level=None, workers=None, limits=None):
+        super(BatchAnalysis, self).__init__()
+        self.pgn_file = pgn_file
+        self.out_file = out_file
+        self.done_file = out_file + '.done'  # numbers of the games already written - for a resume
+        self.entry = entry
+        self.level = level
+        self.options = dict(entry['level_dict'][level]) if level else {}
+        self.workers = workers or host_cores()
+        self.limits = limits or {'movetime': 500}
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.pool = []  # the AnalysisWorkers
+        self.pending = {}  # game number => _PendingGame
+        self.positions = 0
+        self.games = 0
+
+    def _read_done(self):
+        try:
+            with open(self.done_file, 'r') as file:
+                return {int(line) for line in file if line.strip().isdigit()}
+        except OSError:
+            return set()
+
+    def _queue_game(self, number: int, game: chess.pgn.Game):
+        pending = _PendingGame(number, game)
+        board = GameBoard(game.board().fen(), game.board().chess960)
+        for move in game.main_line():
+            pending.boards.append(board.copy(stack=False))
+            board.push(move)
+        pending.boards.append(board)
+        pending.evals = [None] * len(pending.boards)
+        pending.best = [None] * len(pending.boards)
+        for index, position in enumerate(pending.boards):
+            result = game_state(board).result if position is board else None
+            if result is None:
+                pending.missing += 1
+                self.jobs.put(((number, index), position))
+            elif result == GameResult.MATE:
+                pending.evals[index] = -MATE_SCORE if position.turn == chess.WHITE else MATE_SCORE
+            else:
+                pending.evals[index] = 0
+        self.pending[number] = pending
+        if not pending.missing:
+            self._finish(pending)
+
+    def _collect(self):
+        while True:
+            try:
+                (number, index), best, value = self.results.get(timeout=1)
+                break
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in self.pool):
+                    errors = [str(worker.error) for worker in self.pool if worker.error]
+                    raise RuntimeError('no engine [{}] could be started: {}'.format(
+                        self.entry['file'], errors[0] if errors else 'all workers stopped'))
+        pending = self.pending[number]
+        pending.best[index] = best
+        pending.evals[index] = value
+        pending.missing -= 1
+        self.positions += 1
+        if not pending.missing:
+            self._finish(pending)
+
+    def annotate(self, pending: _PendingGame):
+        """Add the evals, the nags of the bad moves and the better move as variation to the game."""
+        node = pending.game
+        for index in range(len(pending.boards) - 1):
+            board, node = pending.boards[index], node.variation(0)
+            before, after = pending.evals[index], pending.evals[index + 1]
+            if after is not None:
+                node.comment = ' '.join(filter(None, [node.comment, '[%eval {}]'.format(format_cp(after))]))
+            if before is None or after is None:
+                continue
+            loss = max(-EVAL_CAP, min(EVAL_CAP, before)) - max(-EVAL_CAP, min(EVAL_CAP, after))
+            loss = loss if board.turn == chess.WHITE else -loss
+            for min_loss, nag in LOSS_NAGS:
+                if loss >= min_loss:
+                    node.nags.add(nag)
+                    best = pending.best[index]
+                    if best and best != node.move:
+                        node.parent.add_variation(best)
+                    break
+        name = self.entry['name'] + (' ' + self.level if self.level else '')
+        limit = ', '.join('{} {}'.format(key, value) for key, value in sorted(self.limits.items()))
+        pending.game.headers['Annotator'] = '{} ({})'.format(name, limit)
+
+    def _finish(self, pending: _PendingGame):
+        del self.pending[pending.number]
+        self.annotate(pending)
+        with open(self.out_file, 'a', encoding='utf-8') as file:
+            file.write(str(pending.game) + '\n\n')
+        with open(self.done_file, 'a') as file:  # after the game, so a break never loses it
+            file.write('{}\n'.format(pending.number))
+        self.games += 1
+
+    def run(self, progress=None):
+        """Analyse all games not done yet - progress(games, positions, secs) is called after each game read."""
+        archive = PgnArchive(self.pgn_file, Emailer())
+        archive.start()
+        archive.index_loaded.wait()
+        done = self._read_done()
+        todo = [number for number in range(len(archive)) if number not in done]
+        logging.info('%i games to analyse (%i done already)', len(todo), len(done))
+
+        self.pool = [AnalysisWorker(self.entry['file'], self.options, self.limits, self.jobs, self.results)
+                     for _ in range(self.workers)]
+        for worker in self.pool:
+            worker.start()
+        start = time.time()
+        try:
+            for number in todo:  # the games are streamed - only a few are kept in memory
+                while len(self.pending) >= 2 * self.workers:
+                    self._collect()
+                game = archive.read_game(number)
+                if game is not None:
+                    self._queue_game(number, game)
+                if progress:
+                    progress(self.games, self.positions, time.time() - start)
+            while self.pending:
+                self._collect()
+        finally:
+            for _ in self.pool:
+                self.jobs.put(None)
+            for worker in self.pool:
+                worker.join()
+        return self.stats(time.time() - start)
+
+    def stats(self, secs: float):
+        """Return the throughput numbers."""
+        return {'games': self.games, 'positions': self.positions, 'secs': round(secs, 1),
+                'positions_per_sec': round(self.positions / secs, 1) if secs else 0.0, 'engines': self.workers}
@@ -17,59 +17,224 @@
 
 import logging
 import os
+import io
+import time
 import configparser
-import spur
-import paramiko
+import threading
+from threading import Lock
 
 from subprocess import DEVNULL
-from dgt.api import Event
-from utilities import EvtObserver
+from dgt.api import Event, Message
+from utilities import EvtObserver, MsgDisplay, tracer
+from scheduling import scheduler
 import chess.uci
 from chess import Board
 from uci.informer import Informer
 from uci.read import read_engine_ini
+from uci.resources import read_host, size_options
+
+
+_active = {'engine': None}  # the engine started last - for the /trace stats
+
+
+def engine_latency():
+    """Return the round trip stats of the engine started last."""
+    engine = _active['engine']
+    return engine.get_latency() if engine else {}
 
 
 class UciShell(object):
 
-    """Handle the uci engine shell."""
+    """Handle the uci engine shell - one persistent ssh connection shared by all remote engine actions."""
+
+    KEEPALIVE = 15  # secs between ssh keepalive packets (wifi routers drop idle connections)
+    RECONNECT_DELAY = 0.5  # first wait in secs before a reconnect, doubled each try
+    RECONNECT_MAX = 30  # never wait longer than this between two tries
+    RECONNECT_TRIES = 6
 
     def __init__(self, hostname=None, username=None, key_file=None, password=None):
         super(UciShell, self).__init__()
+        self.hostname = hostname
+        self.username = username
+        self.key_file = key_file
+        self.password = password
+        self.lock = Lock()
+        self.sftp = None
+        self.latency = RoundTrip()  # ssh round trips of the connection checks
+        self.connected = False
         if hostname:
             logging.info('connecting to [%s]', hostname)
-            if key_file:
-                self.shell = spur.SshShell(hostname=hostname, username=username, private_key_file=key_file,
-                                           missing_host_key=paramiko.AutoAddPolicy())
-            else:
-                self.shell = spur.SshShell(hostname=hostname, username=username, password=password,
-                                           missing_host_key=paramiko.AutoAddPolicy())
+            self.shell = self._create_shell()
+            self.connected = self._connect()
+            if not self.connected:
+                logging.error('no ssh connection to [%s] - giving up', hostname)
         else:
             self.shell = None
 
+    def _create_shell(self):
+        import spur  # only needed (and loaded) for a remote engine
+        import paramiko
+        if self.key_file:
+            return spur.SshShell(hostname=self.hostname, username=self.username, private_key_file=self.key_file,
+                                 missing_host_key=paramiko.AutoAddPolicy(), connect_timeout=10)
+        return spur.SshShell(hostname=self.hostname, username=self.username, password=self.password,
+                             missing_host_key=paramiko.AutoAddPolicy(), connect_timeout=10)
+
+    def _transport(self):
+        """Return the paramiko transport of the spur connection - None if not connected (or spur hides it)."""
+        client = getattr(self.shell, '_client', None)  # a spur 0.3 internal - if it's gone, use the public api only
+        return client.get_transport() if client else None
+
+    def ping(self):
+        """Measure one round trip of a (public api) remote command - raise spur's ConnectionError if down."""
+        start = time.time()
+        self.shell.run(['true'])
+        secs = time.time() - start
+        self.latency.add(secs)
+        return secs
+
+    def is_alive(self):
+        """Return if the ssh connection is up."""
+        if hasattr(self.shell, '_client'):  # cheap check without a round trip
+            transport = self._transport()
+            return bool(transport and transport.is_active())
+        try:
+            self.ping()
+            return True
+        except Exception:  # spur raises different errors for a broken connection
+            return False
+
+    def _connect(self):
+        """Open (or reopen) the ssh connection with exponential backoff."""
+        import spur
+        delay = self.RECONNECT_DELAY
+        for tries in range(self.RECONNECT_TRIES):
+            start = time.time()
+            try:
+                self.ping()  # opens the connection
+                transport = self._transport()
+                if transport:
+                    transport.set_keepalive(self.KEEPALIVE)
+                logging.debug('ssh connection to [%s] up after %.3fsecs', self.hostname, time.time() - start)
+                return True
+            except spur.ssh.ConnectionError as conn_exc:
+                logging.warning('ssh connection to [%s] failed (try %i): %s', self.hostname, tries + 1, conn_exc)
+                self.shell = self._create_shell()  # spur never retries a failed client
+                time.sleep(delay)
+                delay = min(delay * 2, self.RECONNECT_MAX)
+        return False
+
+    def _check(self):
+        if self.shell and not self.is_alive():
+            logging.warning('ssh connection to [%s] lost => reconnecting', self.hostname)
+            self.sftp = None
+            self.shell.close()
+            self.shell = self._create_shell()
+            self.connected = self._connect()
+
     def get_spur(self):
-        return self.shell
+        """Return the spur shell (reconnected if needed) or None for a local engine."""
+        with self.lock:
+            self._check()
+            return self.shell
+
+    def run(self, *args, **kwargs):
+        """Run a remote command on the persistent connection."""
+        return self.get_spur().run(*args, **kwargs)
+
+    def open(self, name: str, mode='r'):
+        """Read a (small) remote file - reusing one sftp channel instead of negotiating a new one each time."""
+        with self.lock:
+            self._check()
+            transport = self._transport()
+            try:
+                if transport is None:  # no access to spur's connection => one sftp session per file
+                    with self.shell.open(name, 'rb') as file:
+                        data = file.read()
+                else:
+                    if self.sftp is None or self.sftp.get_channel().closed:
+                        self.sftp = transport.open_sftp_client()
+                    with self.sftp.open(name, 'rb') as file:
+                        data = file.read()
+            except IOError:
+                raise FileNotFoundError(name)
+        return io.BytesIO(data) if 'b' in mode else io.StringIO(data.decode('utf-8'))
+
+    def close(self):
+        """Close the ssh connection."""
+        if self.shell:
+            self.shell.close()
+
+
+class RoundTrip(object):
+
+    """Keep simple latency stats (in secs) of uci round trips."""
+
+    def __init__(self):
+        super(RoundTrip, self).__init__()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, secs: float):
+        """Add a new measured round trip."""
+        self.count += 1
+        self.total += secs
+        self.max = max(self.max, secs)
+        self.last = secs
+
+    def get(self):
+        """Return the stats as a dict."""
+        avg = self.total / self.count if self.count else 0.0
+        return {'count': self.count, 'avg': avg, 'max': self.max, 'last': self.last}
 
 
 class UciEngine(object):
 
     """Handle the uci engine communication."""
 
-    def __init__(self, file: str, uci_shell: UciShell,  home=''):
+    RECOVER_TIMEOUT = 10  # max secs a command waits for the respawn of a crashed engine
+
+    def __init__(self, file: str, uci_shell: UciShell,  home='', args=None):
         super(UciEngine, self).__init__()
+        args = args or []  # extra command line args - for example uci.stub.stub_args() for the fake engine
         try:
+            self.uci_shell = uci_shell
             self.shell = uci_shell.get_spur()
             if home:
                 file = home + os.sep + file
-            if self.shell:
-                self.engine = chess.uci.spur_spawn_engine(self.shell, [file])
-            else:
-                self.engine = chess.uci.popen_engine(file, stderr=DEVNULL)
+            self.command = [file] + args
+            self.engine = self._spawn_process()
 
             self.file = file
+            self.informer = Informer()
+            self.go_time = None
+            self.trace_id = 0
+            self.latency = {'ping': RoundTrip(), 'search': RoundTrip()}
+            self.analysis_lines = 1  # MultiPV of the ponder search (analysis modes)
+            self.spec_lock = Lock()
+            self.spec_jobs = []  # (fen, game) of the predicted positions still to search
+            self.spec_time = {}  # uci time dict of the speculative searches
+            self.spec_fen = None  # fen of the running speculative search
+            self.spec_future = None  # future of the running speculative search (None: none running)
+            self.spec_moves = {}  # fen => BestMove of the finished speculative searches
+            self.spec_stats = {'searched': 0, 'hits': 0, 'misses': 0}
+            self.auto_resources = False
+            self.reserve = (1, 64)  # cores & MB of memory kept for picochess
+            self.host = None  # (cores, free MB) of the host running the engine - read once
+            self.resource_options = {}  # thread & hash options sent to the engine
+            self.supervisor = None  # thread respawning a crashed engine
+            self.spare = None  # warm spare engine (uci handshake done) for a fast respawn
+            self.use_spare = False
+            self.quitting = False
+            self.ready = threading.Event()  # cleared while a crashed engine gets respawned
+            self.ready.set()
+            self.search = None  # (kind, uci time dict, start time) of the running search - resumed after a crash
+            self.game = None  # position sent last - replayed after a crash
+            self.latency['recovery'] = RoundTrip()
             if self.engine:
-                handler = Informer()
-                self.engine.info_handlers.append(handler)
+                self.engine.info_handlers.append(self.informer)
                 self.engine.uci()
             else:
                 logging.error('engine executable [%s] not found', file)
@@ -79,13 +244,112 @@ class UciEngine(object):
 
             self.res = None
             self.level_support = False
-            self.installed_engines = read_engine_ini(self.shell, (file.rsplit(os.sep, 1))[0])
+            self.installed_engines = read_engine_ini(self.uci_shell if self.shell else None,
+                                                     (file.rsplit(os.sep, 1))[0])
 
         except OSError:
             logging.exception('OS error in starting engine')
         except TypeError:
             logging.exception('engine executable not found')
 
+    def _spawn_process(self):
+        if self.shell:
+            return chess.uci.spur_spawn_engine(self.shell, self.command)
+        engine = chess.uci.popen_engine(self.command, stderr=DEVNULL)
+        scheduler.pin_engine(engine.process.pid())  # a remote engine has the host for its own
+        return engine
+
+    def _spawn(self):
+        """Start a new engine process and do the uci handshake."""
+        engine = self._spawn_process()
+        engine.info_handlers.append(self.informer)
+        engine.uci()
+        return engine
+
+    def _spawn_spare(self):
+        try:
+            self.spare = self._spawn()
+            logging.debug('warm spare engine ready')
+        except (OSError, chess.uci.EngineTerminatedException):
+            logging.exception('warm spare engine not started')
+
+    def set_supervision(self, use_spare: bool):
+        """Respawn the engine after a crash - from a warm spare process (started now) if use_spare."""
+        self.use_spare = use_spare
+        if use_spare and not self.spare:
+            threading.Thread(target=self._spawn_spare, name='engine_spare').start()
+        if not self.supervisor:
+            self.supervisor = threading.Thread(target=self._supervise, name='engine_supervisor', daemon=True)
+            self.supervisor.start()
+
+    def _supervise(self):
+        while True:
+            engine = self.engine
+            engine.terminated.wait()
+            if self.quitting:
+                return
+            if engine is self.engine and not self._recover(engine):
+                return
+
+    def _wait_ready(self):
+        if self.ready.is_set():
+            return True
+        logging.debug('waiting for the engine respawn')
+        return self.ready.wait(self.RECOVER_TIMEOUT)
+
+    @staticmethod
+    def _remaining(time_dict: dict, turn: bool, secs: float):
+        """Return the time dict minus the secs already searched."""
+        msecs = int(secs * 1000)
+        time_dict = dict(time_dict)
+        if 'movetime' in time_dict:
+            time_dict['movetime'] = str(max(100, int(time_dict['movetime']) - msecs))
+        side = 'wtime' if turn else 'btime'
+        if side in time_dict:
+            time_dict[side] = str(max(100, int(time_dict[side]) - msecs))
+        return time_dict
+
+    def _recover(self, dead):
+        """Respawn the crashed engine, replay its options & position and resume the interrupted search."""
+        start = time.time()
+        self.ready.clear()
+        search = self.search
+        logging.error('engine terminated with code %s - respawning (search: %s)', dead.return_code, search)
+        try:
+            spare, self.spare = self.spare, None
+            if spare and not spare.terminated.is_set():
+                self.engine = spare
+            else:
+                self.engine = self._spawn()
+            options = dict(self.options)
+            options.update(self.resource_options)
+            if self.informer.multipv_lines > 1:
+                options['MultiPV'] = self.informer.multipv_lines
+            self.engine.setoption(options)
+            if self.game is not None:
+                self.engine.position(self.game)
+        except (OSError, chess.uci.EngineTerminatedException):
+            logging.exception('engine respawn failed')
+            MsgDisplay.show(Message.ENGINE_FAIL())
+            return False
+        finally:
+            self.ready.set()
+
+        if search and search is self.search:  # not stopped meanwhile
+            kind, time_dict, started = search
+            if kind == 'go':
+                self.go(self._remaining(time_dict, self.game.turn, time.time() - started))
+            elif kind == 'brain':
+                self.brain(dict(time_dict))
+            elif kind == 'ponder':
+                self.ponder()
+        secs = time.time() - start
+        self.latency['recovery'].add(secs)
+        logging.info('engine recovered in %.3fsecs', secs)
+        if self.use_spare:
+            threading.Thread(target=self._spawn_spare, name='engine_spare').start()
+        return True
+
     def get_name(self):
         """Get engine name."""
         return self.engine.name
@@ -100,6 +364,7 @@ class UciEngine(object):
 
     def send(self):
         """Send options to engine."""
+        self._wait_ready()
         logging.debug('setting engine with options %s', self.options)
         self.engine.setoption(self.options)
 
@@ -142,10 +407,43 @@ class UciEngine(object):
 
     def position(self, game: Board):
         """Set position."""
+        self._wait_ready()
+        self.game = game
         self.engine.position(game)
 
+    def ping(self):
+        """Measure one isready/readyok round trip - for a remote engine this is the ssh latency."""
+        self._wait_ready()
+        start = time.time()
+        self.engine.isready()
+        secs = time.time() - start
+        self.latency['ping'].add(secs)
+        logging.debug('engine ping: %.3fsecs', secs)
+        return secs
+
+    def get_latency(self):
+        """Return the measured round trip stats."""
+        latency = {name: trip.get() for name, trip in self.latency.items()}
+        if self.shell:
+            latency['ssh'] = self.uci_shell.latency.get()
+        return latency
+
+    def _log_search_time(self):
+        if self.go_time is None or not self.res:
+            return
+        wall = time.time() - self.go_time
+        self.go_time = None
+        engine_ms = self.informer.info.get('time')
+        if engine_ms is not None:
+            overhead = max(0.0, wall - engine_ms / 1000)
+            self.latency['search'].add(overhead)
+            logging.debug('search wall: %.3fsecs engine: %ims overhead: %.3fsecs', wall, engine_ms, overhead)
+
     def quit(self):
         """Quit engine."""
+        self.quitting = True
+        if self.spare:
+            self.spare.quit()
         if self.engine.quit():  # Ask nicely
             if self.engine.terminate():  # If you won't go nicely....
                 if self.engine.kill():  # Right that does it!
@@ -160,46 +458,168 @@ class UciEngine(object):
         """Stop engine."""
         logging.info('show_best old: %s new: %s', self.show_best, show_best)
         self.show_best = show_best
+        self.search = None  # dont resume it after a crash
+        with self.spec_lock:  # a stopped speculative search is cut => dont cache its move, nor start the next one
+            self.spec_jobs = []
+            self.spec_future = None
+        self._wait_ready()
         if self.is_waiting():
             logging.info('engine already stopped')
             return self.res
         try:
             self.engine.stop()
+            return self.future.result()
         except chess.uci.EngineTerminatedException:
             logging.error('Engine terminated')  # @todo find out, why this can happen!
-        return self.future.result()
+        return self.res
+
+    def set_analysis_lines(self, lines: int):
+        """Set the number of lines (MultiPV) the engine sends while pondering in the analysis modes."""
+        self.analysis_lines = max(1, lines)
+
+    def set_auto_resources(self, enabled: bool, reserve_cores: int, reserve_mb: int):
+        """Size the threads & hash options from the host (keeping the reserve for picochess) at startup."""
+        self.auto_resources = enabled
+        self.reserve = (reserve_cores, reserve_mb)
+
+    def _resources_send(self):
+        """Send the thread & hash options fitting the host - only if changed, cause a new hash means clearing it."""
+        if not self.auto_resources:
+            return
+        if self.host is None:
+            self.host = read_host(self.uci_shell if self.shell else None)
+            logging.debug('engine host has %s cores and %sMB free memory', self.host[0], self.host[1])
+        caps = {}
+        for eng in self.installed_engines:
+            if eng['file'] == self.get_file():
+                caps = eng
+                break
+        cores, (reserve_cores, reserve_mb) = self.host[0], self.reserve
+        if self.shell is None and scheduler.engine_cores:  # picochess' own affinity excludes the engine cores now
+            cores, reserve_cores = len(scheduler.engine_cores), 0  # and the reserve is already kept apart
+        sized = size_options(self.engine.options, cores, self.host[1], caps, reserve_cores, reserve_mb)
+        sized = {name: value for name, value in sized.items() if name not in self.options}  # a level file wins
+        if sized and sized != self.resource_options:
+            logging.debug('setting engine resources %s', sized)
+            self.engine.setoption(sized)
+            self.resource_options = sized
+
+    def _multipv_send(self, lines: int):
+        """Send the MultiPV option (if supported & changed) - a playing search always uses one line."""
+        if 'MultiPV' not in self.engine.options:
+            return
+        if lines != self.informer.multipv_lines:
+            self.engine.setoption({'MultiPV': lines})
+            self.informer.multipv_lines = lines
+
+    def speculate(self, games: list, time_dict: dict):
+        """Search the predicted positions one after the other - their best moves only go to the cache."""
+        with self.spec_lock:
+            self.spec_moves = {}
+            self.spec_jobs = [(game.fen(), game) for game in games]
+            self.spec_time = time_dict
+        self._speculate_next()
+
+    def _speculate_next(self):
+        with self.spec_lock:
+            if not self.spec_jobs:
+                self.spec_future = None
+                return
+            self.spec_fen, game = self.spec_jobs.pop(0)
+            logging.debug('speculative search on fen: %s', self.spec_fen)
+            self.search = None  # a crash ends the speculation
+            self.show_best = False
+            self.informer.silent = True  # the displays shouldnt see the search of a position not on the board
+            self._multipv_send(1)
+            self.go_time = None
+            self.engine.position(game)
+            self.future = self.spec_future = self.engine.go(async_callback=self.callback_speculate, **self.spec_time)
+
+    def callback_speculate(self, command):
+        """Callback function of a speculative search - cache the move and start the next search."""
+        try:
+            res = command.result()
+        except chess.uci.EngineTerminatedException:
+            logging.error('Engine terminated')  # @todo find out, why this can happen!
+            return
+        with self.spec_lock:
+            if command is not self.spec_future:  # cut by stop()
+                return
+            logging.debug('speculative best move: %s fen: %s', res, self.spec_fen)
+            self.spec_moves[self.spec_fen] = res
+            self.spec_stats['searched'] += 1
+        self._speculate_next()
+
+    def speculated(self, game: Board):
+        """Return the best move of a finished speculative search on this position (or None) and clear the cache."""
+        with self.spec_lock:
+            res = self.spec_moves.get(game.fen())
+            if self.spec_moves:
+                self.spec_stats['hits' if res else 'misses'] += 1
+                logging.debug('speculation %s - stats: %s', 'hit' if res else 'miss', self.spec_stats)
+            self.spec_moves = {}
+        return res
+
+    def is_speculating(self):
+        """Engine searching a predicted position."""
+        return self.spec_future is not None and not self.engine.idle
 
     def go(self, time_dict: dict):
         """Go engine."""
+        self._wait_ready()
         self.show_best = True
+        self.informer.silent = False
+        self._multipv_send(1)
+        self.search = ('go', dict(time_dict), time.time())
         time_dict['async_callback'] = self.callback
 
         # Observable.fire(Event.START_SEARCH())
+        self.go_time = time.time()
+        self.trace_id = tracer.current()
+        tracer.mark('engine_go', 'go')
         self.future = self.engine.go(**time_dict)
         return self.future
 
     def ponder(self):
         """Ponder engine."""
+        self._wait_ready()
         self.show_best = False
+        self.informer.silent = False
+        self._multipv_send(self.analysis_lines)
+        self.search = ('ponder', None, time.time())
 
         # Observable.fire(Event.START_SEARCH())
+        self.go_time = None  # a ponder search has no meaningful round trip
         self.future = self.engine.go(ponder=True, infinite=True, async_callback=self.callback)
         return self.future
 
     def brain(self, time_dict: dict):
         """Permanent brain."""
+        self._wait_ready()
         self.show_best = True
+        self.informer.silent = False
+        self.search = ('brain', dict(time_dict), time.time())
         time_dict['ponder'] = True
         time_dict['async_callback'] = self.callback3
+        self._multipv_send(1)
 
         # Observable.fire(Event.START_SEARCH())
+        self.go_time = time.time()
+        self.trace_id = tracer.current()
+        tracer.mark('engine_go', 'go')
         self.future = self.engine.go(**time_dict)
         return self.future
 
     def hit(self):
         """Send a ponder hit."""
         logging.info('show_best: %s', self.show_best)
+        self._wait_ready()
+        if self.search and self.search[0] == 'brain':  # from now on the engine's clock is running
+            self.search = ('go', self.search[1], time.time())
         self.engine.ponderhit()
+        self.go_time = time.time()
+        self.trace_id = tracer.current()
+        tracer.mark('engine_go', 'ponderhit')
         self.show_best = True
 
     def callback(self, command):
@@ -208,10 +628,17 @@ class UciEngine(object):
             self.res = command.result()
         except chess.uci.EngineTerminatedException:
             logging.error('Engine terminated')  # @todo find out, why this can happen!
+            if self.supervisor:  # the respawned engine resumes the search
+                return
             self.show_best = False
+        if command is self.future:
+            self.search = None
         logging.info('res: %s', self.res)
+        self._log_search_time()
         # Observable.fire(Event.STOP_SEARCH())
         if self.show_best and self.res:
+            tracer.set_current(self.trace_id)  # link the best move to the event which started the search
+            tracer.mark('engine_bestmove', 'bestmove')
             EvtObserver.fire(Event.BEST_MOVE(move=self.res.bestmove, ponder=self.res.ponder, inbook=False))
         else:
             logging.info('event best_move not fired')
@@ -222,17 +649,24 @@ class UciEngine(object):
             self.res = command.result()
         except chess.uci.EngineTerminatedException:
             logging.error('Engine terminated')  # @todo find out, why this can happen!
+            if self.supervisor:  # the respawned engine resumes the search
+                return
             self.show_best = False
+        if command is self.future:
+            self.search = None
         logging.info('res: %s', self.res)
+        self._log_search_time()
         # Observable.fire(Event.STOP_SEARCH())
         if self.show_best and self.res:
+            tracer.set_current(self.trace_id)  # link the best move to the event which started the search
+            tracer.mark('engine_bestmove', 'bestmove')
             EvtObserver.fire(Event.BEST_MOVE(move=self.res.bestmove, ponder=self.res.ponder, inbook=False))
         else:
             logging.info('event best_move not fired')
 
     def is_thinking(self):
         """Engine thinking."""
-        return not self.engine.idle and not self.engine.pondering
+        return not self.engine.idle and not self.engine.pondering and not self.is_speculating()
 
     def is_pondering(self):
         """Engine pondering."""
@@ -244,6 +678,8 @@ class UciEngine(object):
 
     def newgame(self, game: Board):
         """Engine sometimes need this to setup internal values."""
+        self._wait_ready()
+        self.game = game
         self.engine.ucinewgame()
         self.engine.position(game)
 
@@ -264,12 +700,17 @@ class UciEngine(object):
         parser = configparser.ConfigParser()
         parser.optionxform = str
 
+        if not options:
+            for eng in self.installed_engines:  # use the cached library instead of reading the file again
+                if eng['file'] == self.get_file() and eng['level_dict']:
+                    options = dict(list(eng['level_dict'].values())[-1])
+                    break
         if not options:
             if self.shell is None:
                 success = parser.read(self.get_file() + '.uci')
             else:
                 try:
-                    with self.shell.open(self.get_file() + '.uci', 'r') as file:
+                    with self.uci_shell.open(self.get_file() + '.uci', 'r') as file:
                         parser.read_file(file)
                     success = True
                 except FileNotFoundError:
@@ -277,10 +718,16 @@ class UciEngine(object):
             if success:
                 options = dict(parser[parser.sections().pop()])
 
+        if self.is_speculating():  # new options => dont change them while searching, and forget the old moves
+            self.stop()
+        self.spec_moves = {}
         self.level_support = bool(options)
         self.options = options
+        self._resources_send()
         self.chess960_send(game.has_chess960_castling_rights())
         if new_game:
             self.newgame(game)
+            logging.info('engine [%s] ping: %.3fsecs', self.get_name(), self.ping())  # idle here - a clean measure
+            _active['engine'] = self
             logging.debug('Loaded engine [%s]', self.get_name())
             logging.debug('Supported options [%s]', self.get_options())
@@ -31,17 +31,29 @@ class Informer(chess.uci.InfoHandler):
         self.allow_score = True
         self.allow_pv = True
         self.allow_depth = True
+        self.allow_analysis = True
+        self.multipv_lines = 1  # number of lines the engine sends (its MultiPV option)
+        self.lines = {}  # multipv number => newest line of the running search
+        self.lines_changed = False
+        self.silent = False  # True: a speculative search runs - dont fire any event
+
+    def _fire(self, event):
+        if not self.silent:
+            EvtObserver.fire(event)
 
     def on_go(self):
         """Engine sends GO."""
         self.allow_score = True
         self.allow_pv = True
         self.allow_depth = True
-        EvtObserver.fire(Event.START_SEARCH())
+        self.lines = {}
+        self.lines_changed = False
+        self._fire(Event.START_SEARCH())
         super().on_go()
 
     def on_bestmove(self, bestmove, ponder):
-        EvtObserver.fire(Event.STOP_SEARCH())
+        self.lines_changed = False  # the search is over - dont send its lines anymore
+        self._fire(Event.STOP_SEARCH())
         super().on_bestmove(bestmove, ponder)
 
     def _reset_allow_score(self):
@@ -69,6 +81,18 @@ class Informer(chess.uci.InfoHandler):
         else:
             return False
 
+    def _reset_allow_analysis(self):
+        self.allow_analysis = True
+        if self.lines_changed:  # send the lines which arrived while blocked
+            self._fire_analysis()
+
+    def _fire_analysis(self):
+        if self.allow_analysis:
+            self.allow_analysis = False
+            self.lines_changed = False
+            Timer(0.5, self._reset_allow_analysis).start()
+            self._fire(Event.NEW_ANALYSIS(lines=dict(self.lines)))
+
     def _allow_fire_depth(self):
         if self.allow_depth:
             self.allow_depth = False
@@ -79,18 +103,29 @@ class Informer(chess.uci.InfoHandler):
 
     def score(self, cp, mate, lowerbound, upperbound):
         """Engine sends SCORE."""
-        if self._allow_fire_score():
-            EvtObserver.fire(Event.NEW_SCORE(score=cp, mate=mate))
+        if self.info.get('multipv', 1) == 1 and self._allow_fire_score():
+            self._fire(Event.NEW_SCORE(score=cp, mate=mate))
         super().score(cp, mate, lowerbound, upperbound)
 
     def pv(self, moves):
         """Call when engine sends PV."""
-        if self._allow_fire_pv() and moves:
-            EvtObserver.fire(Event.NEW_PV(pv=moves))
+        if self.info.get('multipv', 1) == 1 and self._allow_fire_pv() and moves:
+            self._fire(Event.NEW_PV(pv=moves))
         super().pv(moves)
 
     def depth(self, dep):
         """Engine sends DEPTH."""
         if self._allow_fire_depth():
-            EvtObserver.fire(Event.NEW_DEPTH(depth=dep))
+            self._fire(Event.NEW_DEPTH(depth=dep))
         super().depth(dep)
+
+    def post_info(self):
+        """Engine info line processed - collect the multipv lines."""
+        num = self.info.get('multipv')
+        if num and self.multipv_lines > 1 and num in self.info['pv']:
+            score = self.info['score'].get(num)
+            self.lines[num] = {'depth': self.info.get('depth'), 'score': score.cp if score else None,
+                               'mate': score.mate if score else None, 'pv': self.info['pv'][num]}
+            self.lines_changed = True
+            self._fire_analysis()
+        super().post_info()
@@ -0,0 +1,289 @@
+# Copyright (C) 2013-2018 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import math
+import time
+import queue
+import random
+import logging
+import threading
+import itertools
+import configparser
+from collections import namedtuple
+
+import chess
+import chess.pgn
+import chess.uci
+import chess.polyglot
+from gamestate import GameBoard
+from dgt.util import GameResult
+from uci.batch import start_engine
+
+MAX_PLIES = 400  # a longer game is adjudicated as draw
+
+# level is None for an engine without levels, elo is the nominal one (engines.ini or an "Elo@" level) or None
+Player = namedtuple('Player', ['entry', 'level', 'elo'])
+
+
+def make_player(entry: dict, level=None):
+    """Return the Player of an engines.ini entry at the level given."""
+    if level and level.startswith('Elo@'):
+        elo = int(level[4:])
+    elif level is None and str(entry['elo']).isdigit():
+        elo = int(entry['elo'])
+    else:
+        elo = None
+    return Player(entry=entry, level=level, elo=elo)
+
+
+def player_name(player: Player):
+    """Return the name of the player as used in the pgn and the calibration file."""
+    return '{} {}'.format(player.entry['name'], player.level) if player.level else player.entry['name']
+
+
+def book_openings(book_file: str, count: int, plies: int, seed=None):
+    """Return count different opening boards - random (weighted) walks of plies through the polyglot book."""
+    rnd = random.Random(seed)
+    openings, fens = [], set()
+    with chess.polyglot.open_reader(book_file) as reader:
+        for _ in range(count * 10):  # a small book has less openings than asked for
+            board = chess.Board()
+            for _ in range(plies):
+                try:
+                    board.push(reader.weighted_choice(board, random=rnd).move())
+                except IndexError:  # out of book
+                    break
+            if board.fen() not in fens:
+                fens.add(board.fen())
+                openings.append(board)
+            if len(openings) == count:
+                break
+    return openings
+
+
+def estimate_elo(players: list, results: list, default_mean=1500, iterations=200):
+    """Return the elo of each player (maximum likelihood) - anchored to the mean nominal elo of the players."""
+    count = len(players)
+    games = [[0.0] * count for _ in range(count)]
+    score = [[0.0] * count for _ in range(count)]
+    for white, black, points in results:
+        games[white][black] += 1
+        games[black][white] += 1
+        score[white][black] += points
+        score[black][white] += 1 - points
+    for i, j in itertools.permutations(range(count), 2):
+        if games[i][j]:  # one virtual draw keeps a 100% (or 0%) score finite
+            games[i][j] += 1
+            score[i][j] += 0.5
+
+    ratings = [0.0] * count
+    for _ in range(iterations):
+        for i in range(count):
+            expected, slope = 0.0, 0.0
+            for j in range(count):
+                if games[i][j]:
+                    prob = 1 / (1 + 10 ** ((ratings[j] - ratings[i]) / 400))
+                    expected += games[i][j] * prob
+                    slope += games[i][j] * prob * (1 - prob) * math.log(10) / 400
+            if slope:
+                ratings[i] += max(-100.0, min(100.0, (sum(score[i]) - expected) / slope))  # newton step
+
+    nominal = [(rating, player.elo) for rating, player in zip(ratings, players) if player.elo is not None]
+    if nominal:
+        shift = sum(elo - rating for rating, elo in nominal) / len(nominal)
+    else:
+        shift = default_mean - sum(ratings) / count
+    return [round(rating + shift) for rating in ratings]
+
+
+class MatchWorker(threading.Thread):
+
+    """Play the game pairs of the job queue - with an own engine process for each of the two players."""
+
+    def __init__(self, match, jobs: queue.Queue):
+        super(MatchWorker, self).__init__(daemon=True)
+        self.match = match
+        self.jobs = jobs
+        self.engines = {}  # player index => (engine, info handler)
+        self.error = None  # why an engine couldn't be started - the worker stops then
+
+    def _engine(self, index: int):
+        if index not in self.engines:
+            player = self.match.players[index]
+            options = player.entry['level_dict'][player.level] if player.level else {}
+            self.engines[index] = start_engine(player.entry['file'], options)
+        return self.engines[index][0]
+
+    def _quit(self, keep: set):
+        for index in list(self.engines):
+            if index not in keep:
+                engine = self.engines.pop(index)[0]
+                try:
+                    engine.quit()
+                except chess.uci.EngineTerminatedException:
+                    pass
+
+    def play(self, white: int, black: int, opening: chess.Board):
+        """Play one game - return the points of white and the pgn game."""
+        board = GameBoard()
+        for move in opening.move_stack:
+            board.push(move)
+        engines = {chess.WHITE: self._engine(white), chess.BLACK: self._engine(black)}
+        base, inc = self.match.time_control
+        clock = {chess.WHITE: base, chess.BLACK: base}
+        for engine in engines.values():
+            engine.ucinewgame()
+        result, termination = None, 'normal'
+        while result is None:
+            engine = engines[board.turn]
+            engine.position(board)
+            start = time.time()
+            move = engine.go(wtime=int(clock[chess.WHITE] * 1000), btime=int(clock[chess.BLACK] * 1000),
+                             winc=int(inc * 1000), binc=int(inc * 1000)).bestmove
+            clock[board.turn] -= time.time() - start
+            if clock[board.turn] < 0:
+                result, termination = '0-1' if board.turn == chess.WHITE else '1-0', 'time forfeit'
+                break
+            clock[board.turn] += inc
+            if move is None or move not in board.legal_moves:
+                loser = self.match.players[white if board.turn == chess.WHITE else black]
+                logging.warning('illegal move [%s] from [%s]', move, player_name(loser))
+                result, termination = '0-1' if board.turn == chess.WHITE else '1-0', 'rules infraction'
+                break
+            board.push(move)
+            state = board.state()
+            if state.result == GameResult.MATE:
+                result = '1-0' if board.turn == chess.BLACK else '0-1'
+            elif state.result is not None or state.repetitions >= 3 or board.halfmove_clock >= 100:
+                result = '1/2-1/2'  # both engines would claim the draw
+            elif len(board.move_stack) >= MAX_PLIES:
+                result, termination = '1/2-1/2', 'adjudication'
+
+        game = chess.pgn.Game.from_board(board)
+        game.headers['Event'] = 'picochess calibration'
+        game.headers['White'] = player_name(self.match.players[white])
+        game.headers['Black'] = player_name(self.match.players[black])
+        game.headers['Result'] = result
+        game.headers['Termination'] = termination
+        game.headers['TimeControl'] = '{:g}+{:g}'.format(base, inc)
+        return {'1-0': 1.0, '0-1': 0.0}.get(result, 0.5), game
+
+    def run(self):
+        """Call by threading.Thread start() function."""
+        while self.error is None:
+            job = self.jobs.get()
+            if job is None:
+                break
+            first, second, opening = job
+            self._quit({first, second})
+            for white, black in ((first, second), (second, first)):  # the opening with both colors
+                try:
+                    points, game = self.play(white, black, opening)
+                except chess.uci.EngineTerminatedException:
+                    logging.warning('engine terminated in %s - %s', player_name(self.match.players[white]),
+                                    player_name(self.match.players[black]))
+                    self._quit(set())
+                    continue
+                except OSError as exc:
+                    logging.error('engine of %s - %s cant be started: %s', player_name(self.match.players[white]),
+                                  player_name(self.match.players[black]), exc)
+                    self.error = exc
+                    break
+                self.match.add_result(white, black, points, game)
+        self._quit(set())
+
+
+class Match(object):
+
+    """Play all players round robin on the book openings - concurrent games, one per core."""
+
+    def __init__(self, players: list, openings: list, time_control: tuple, workers: int, pgn_file=None):
+        super(Match, self).__init__()
+        self.players = players
+        self.openings = openings
+        self.time_control = time_control  # (base secs, increment secs)
+        self.workers = workers
+        self.pgn_file = pgn_file
+        self.results = []  # (white index, black index, points of white)
+        self.lock = threading.Lock()
+        self.start = None
+
+    def add_result(self, white: int, black: int, points: float, game: chess.pgn.Game):
+        """Store the result of a game (called by the workers)."""
+        with self.lock:
+            self.results.append((white, black, points))
+            if self.pgn_file:
+                with open(self.pgn_file, 'a', encoding='utf-8') as file:
+                    file.write(str(game) + '\n\n')
+        logging.debug('%s - %s %s', player_name(self.players[white]), player_name(self.players[black]),
+                      game.headers['Result'])
+
+    def run(self, progress=None):
+        """Play all games - progress(games, secs) is called every few seconds, raise RuntimeError if none was played."""
+        jobs = queue.Queue()
+        for opening in self.openings:  # opening after opening, so a stopped match is still balanced
+            for first, second in itertools.combinations(range(len(self.players)), 2):
+                jobs.put((first, second, opening))
+        workers = [MatchWorker(self, jobs) for _ in range(self.workers)]
+        for _ in workers:
+            jobs.put(None)
+        self.start = time.time()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            while worker.is_alive():
+                worker.join(5)
+                if progress:
+                    progress(len(self.results), time.time() - self.start)
+        if not self.results:
+            errors = [str(worker.error) for worker in workers if worker.error]
+            raise RuntimeError('no game could be played: {}'.format(errors[0] if errors else 'engines terminated'))
+        return self.stats()
+
+    def stats(self):
+        """Return the games played, their throughput and the elo estimates."""
+        with self.lock:
+            results = list(self.results)
+        secs = time.time() - self.start
+        elos = estimate_elo(self.players, results) if results else [None] * len(self.players)
+        table = []
+        for index, (player, elo) in enumerate(zip(self.players, elos)):
+            played = [points if white == index else 1 - points for white, black, points in results
+                      if index in (white, black)]
+            table.append({'name': player_name(player), 'nominal': player.elo, 'elo': elo, 'games': len(played),
+                          'score': sum(played)})
+        return {'games': len(results), 'secs': round(secs, 1),
+                'games_per_hour': round(len(results) * 3600 / secs, 1) if secs else 0.0, 'players': table}
+
+
+def write_calibration(file_name: str, players: list, stats: dict):
+    """Update the calibration file (one section per engine, one "level = elo" line per level) with the estimates."""
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    config.read(file_name)
+    for player, row in zip(players, stats['players']):
+        if row['elo'] is None:
+            continue
+        section = os.path.basename(player.entry['file'])
+        if not config.has_section(section):
+            config.add_section(section)
+        config[section][player.level or 'elo'] = str(row['elo'])
+        config[section][(player.level or 'elo') + '_games'] = str(row['games'])
+    with open(file_name + '.tmp', 'w') as file:
+        config.write(file)
+    os.replace(file_name + '.tmp', file_name)
@@ -17,25 +17,93 @@
 
 import platform
 import configparser
+import copy
 import os
+import shlex
+import logging
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
 from dgt.api import Dgt
 
+FILE_MARKER = '### picochess-file: '  # separates the files inside a remote manifest
 
-def read_engine_ini(engine_shell=None, engine_path=None):
-    """Read engines.ini and creates a library list out of it."""
-    config = configparser.ConfigParser()
-    config.optionxform = str
+engine_cache = {}  # (host, user, engine_path) => (stamp, library)
+cache_lock = Lock()
+
+
+def _local_stamp(engine_path: str):
+    """Return the modification times of engines.ini and all .uci files (used to validate the cache)."""
+    stamp = []
     try:
-        if engine_shell is None:
-            if not engine_path:
-                program_path = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
-                engine_path = program_path + os.sep + 'engines' + os.sep + platform.machine()
-            config.read(engine_path + os.sep + 'engines.ini')
-        else:
-            with engine_shell.open(engine_path + os.sep + 'engines.ini', 'r') as file:
-                config.read_file(file)
-    except FileNotFoundError:
+        for entry in os.scandir(engine_path):
+            if entry.name == 'engines.ini' or entry.name.endswith('.uci'):
+                stamp.append((entry.name, entry.stat().st_mtime_ns))
+    except OSError:
         pass
+    return tuple(sorted(stamp))
+
+
+def _read_local(engine_path: str, names: list):
+    """Return a dict file name => file content for the given local files."""
+    files = {}
+    for name in names:
+        try:
+            with open(engine_path + os.sep + name, 'r') as file:
+                files[name] = file.read()
+        except OSError:
+            pass
+    return files
+
+
+def _read_remote(engine_shell, engine_path: str):
+    """Return a dict file name => file content of engines.ini and all .uci files in a single transfer."""
+    script = 'cd {} && for f in engines.ini *.uci; do [ -f "$f" ] && echo "{}$f" && cat "$f" && echo; done; true'
+    try:
+        result = engine_shell.run(['sh', '-c', script.format(shlex.quote(engine_path), FILE_MARKER)],
+                                  encoding='utf-8')
+    except Exception as run_exc:  # no posix shell on the remote side => read the files one by one
+        logging.warning('remote manifest failed, reading files one by one: %s', run_exc)
+        return _read_remote_files(engine_shell, engine_path)
+
+    files = {}
+    name = None
+    for line in result.output.splitlines(keepends=True):
+        if line.startswith(FILE_MARKER):
+            name = line[len(FILE_MARKER):].strip()
+            files[name] = ''
+        elif name:
+            files[name] += line
+    return files
+
+
+def _read_remote_files(engine_shell, engine_path: str):
+    def _read(name):
+        try:
+            with engine_shell.open(engine_path + os.sep + name, 'r') as file:
+                return name, file.read()
+        except FileNotFoundError:
+            return name, None
+
+    files = dict([_read('engines.ini')])
+    if files['engines.ini'] is None:
+        return {}
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    config.read_string(files['engines.ini'])
+    # each sftp file opens its own channel on the same connection => dont wait for each round trip
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        for name, text in pool.map(_read, [section + '.uci' for section in config.sections()]):
+            if text is not None:
+                files[name] = text
+    return files
+
+
+def _build_library(engine_path: str, files: dict):
+    """Create the library list out of the file contents."""
+    config = configparser.ConfigParser()
+    config.optionxform = str
+    if 'engines.ini' in files:
+        config.read_string(files['engines.ini'])
 
     library = []
     for section in config.sections():
@@ -43,16 +111,8 @@ def read_engine_ini(engine_shell=None, engine_path=None):
         parser.optionxform = str
 
         level_dict = {}
-        if engine_shell is None:
-            success = parser.read(engine_path + os.sep + section + '.uci')
-        else:
-            try:
-                with engine_shell.open(engine_path + os.sep + section + '.uci', 'r') as file:
-                    parser.read_file(file)
-                success = True
-            except FileNotFoundError:
-                success = False
-        if success:
+        if section + '.uci' in files:
+            parser.read_string(files[section + '.uci'])
             for p_section in parser.sections():
                 level_dict[p_section] = {}
                 for option in parser.options(p_section):
@@ -67,7 +127,37 @@ def read_engine_ini(engine_shell=None, engine_path=None):
                 'level_dict': level_dict,
                 'text': text,
                 'name': confsect['name'],
-                'elo': confsect['elo']
+                'elo': confsect['elo'],
+                'max_threads': confsect.getint('max_threads', fallback=None),  # caps for the resource sizing
+                'max_hash': confsect.getint('max_hash', fallback=None)
             }
         )
     return library
+
+
+def read_engine_ini(engine_shell=None, engine_path=None, force=False):
+    """Read engines.ini and creates a library list out of it - cached, so only changed files are read again."""
+    if not engine_path:
+        program_path = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+        engine_path = program_path + os.sep + 'engines' + os.sep + platform.machine()
+
+    # not the shell's id(): python reuses it for a new shell once the old one is gone
+    key = (engine_shell.hostname, engine_shell.username, engine_path) if engine_shell else (None, None, engine_path)
+    with cache_lock:
+        if engine_shell is None:
+            stamp = _local_stamp(engine_path)
+            cached = engine_cache.get(key)
+            if cached and cached[0] == stamp and not force:
+                return copy.deepcopy(cached[1])
+            names = [name for name, _ in stamp]
+            library = _build_library(engine_path, _read_local(engine_path, names))
+        else:
+            # remote files cant be checked without a round trip => keep them until forced
+            cached = engine_cache.get(key)
+            if cached and not force:
+                return copy.deepcopy(cached[1])
+            stamp = None
+            library = _build_library(engine_path, _read_remote(engine_shell, engine_path))
+        engine_cache[key] = (stamp, library)
+        logging.debug('engine library [%s] read with %i engines', engine_path, len(library))
+    return copy.deepcopy(library)  # the callers may change their entries - never the cached ones
@@ -0,0 +1,89 @@
+# Copyright (C) 2013-2018 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import logging
+
+THREAD_OPTIONS = ('Threads', 'Cores', 'Max CPUs')  # the names engines use for their number of search threads
+HASH_OPTIONS = ('Hash',)
+HASH_SHARE = 4  # the engine gets 1/4 of the free memory (minus the reserve) - clearing a huge hash takes too long
+
+
+def _parse_meminfo(text: str):
+    """Return MemAvailable (MemFree on old kernels) in MB - or None."""
+    values = {}
+    for line in text.splitlines():
+        name, _, rest = line.partition(':')
+        parts = rest.split()
+        if parts and parts[0].isdigit():
+            values[name] = int(parts[0]) // 1024  # kB => MB
+    return values.get('MemAvailable', values.get('MemFree'))
+
+
+def read_host(uci_shell=None):
+    """Return (cores, free memory in MB) of the host running the engine - None for an unknown value."""
+    if uci_shell:
+        try:
+            result = uci_shell.run(['sh', '-c', 'getconf _NPROCESSORS_ONLN; cat /proc/meminfo'], encoding='utf-8')
+        except Exception as run_exc:  # no posix remote => keep the engine defaults
+            logging.warning('cant read the resources of the remote host: %s', run_exc)
+            return None, None
+        first, _, meminfo = result.output.partition('\n')
+        return int(first) if first.strip().isdigit() else None, _parse_meminfo(meminfo)
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    try:
+        with open('/proc/meminfo', 'r') as file:
+            return cores, _parse_meminfo(file.read())
+    except OSError:
+        return cores, None
+
+
+def _floor_pow2(value: int):
+    power = 1
+    while power * 2 <= value:
+        power *= 2
+    return power
+
+
+def _fit(engine_options: dict, names: tuple, value: int, sized: dict):
+    """Set the first supported option out of names to value (clipped to its min/max)."""
+    for name in names:
+        if name in engine_options:
+            option = engine_options[name]
+            if option.max is not None:
+                value = min(value, option.max)
+            if option.min is not None:
+                value = max(value, option.min)
+            sized[name] = value
+            return
+
+
+def size_options(engine_options: dict, cores: int, free_mb: int, caps: dict, reserve_cores=1, reserve_mb=64):
+    """Return the thread and hash uci options fitting the host - the reserve is kept for picochess itself."""
+    sized = {}
+    if cores:
+        threads = max(1, cores - reserve_cores)
+        if caps.get('max_threads'):
+            threads = min(threads, caps['max_threads'])
+        _fit(engine_options, THREAD_OPTIONS, threads, sized)
+    if free_mb:
+        hash_mb = _floor_pow2(max(1, (free_mb - reserve_mb) // HASH_SHARE))
+        if caps.get('max_hash'):
+            hash_mb = min(hash_mb, caps['max_hash'])
+        _fit(engine_options, HASH_OPTIONS, hash_mb, sized)
+    return sized
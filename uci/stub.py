@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2013-2018 Jean-Francois Romang (jromang@posteo.de)
+#                         Shivkumar Shivaji ()
+#                         Jürgen Précour (LocutusOfPenguin@posteo.de)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""A configurable fake uci engine (scripted moves, fixed latency, info flood, crashes) for benchmarks and tests."""
+
+import sys
+import os
+import time
+import argparse
+import threading
+
+STUB_FILE = os.path.abspath(__file__)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import chess  # noqa: E402 (needs the path above if started as a script)
+
+
+class StubEngine(object):
+
+    """Answer the uci protocol - the bestmove comes after a fixed time and is taken from a script if possible."""
+
+    INFO_TICK = 0.01  # secs between two info bursts
+
+    def __init__(self, latency: float, script: list, log_file=None, info_rate=0, crash_after=0, crash_mode='exit'):
+        super(StubEngine, self).__init__()
+        self.latency = latency
+        self.script = script
+        self.log_file = log_file
+        self.info_rate = info_rate  # info lines per sec while searching
+        self.crash_after = crash_after  # crash in the n-th search (0=never)
+        self.crash_mode = crash_mode
+        self.board = chess.Board()
+        self.lock = threading.Lock()
+        self.timer = None
+        self.searching = False
+        self.pondering = False
+        self.searches = 0
+        self.options = {}
+
+    def _write(self, line: str):
+        with self.lock:
+            sys.stdout.write(line + '\n')
+            sys.stdout.flush()
+
+    def _log(self, what: str, text=''):
+        if self.log_file:
+            with open(self.log_file, 'a') as log:
+                log.write('{:.6f} {} {}\n'.format(time.time(), what, text))
+
+    def _best_move(self):
+        ply = len(self.board.move_stack)
+        if ply < len(self.script):
+            move = chess.Move.from_uci(self.script[ply])
+            if move in self.board.legal_moves:
+                return move
+        return sorted(self.board.legal_moves, key=lambda mov: mov.uci())[0] if not self.board.is_game_over() else None
+
+    def _position(self, tokens: list):
+        if tokens[0] == 'startpos':
+            self.board = chess.Board()
+            tokens = tokens[1:]
+        elif tokens[0] == 'fen':
+            self.board = chess.Board(' '.join(tokens[1:7]))
+            tokens = tokens[7:]
+        if tokens and tokens[0] == 'moves':
+            for move in tokens[1:]:
+                self.board.push_uci(move)
+
+    def _finish(self):
+        with self.lock:
+            if not self.searching:
+                return
+            self.searching = False
+        move = self._best_move()
+        if move is None:
+            self._write('bestmove (none)')
+            self._log('bestmove', '(none)')
+            return
+        board = self.board.copy()
+        board.push(move)
+        ponder = sorted(board.legal_moves, key=lambda mov: mov.uci())[0] if not board.is_game_over() else None
+        msecs = int(self.latency * 1000)
+        self._write('info depth 1 seldepth 1 score cp 0 time {} nodes 1 pv {}'.format(msecs, move.uci()))
+        self._write('bestmove {}{}'.format(move.uci(), ' ponder ' + ponder.uci() if ponder else ''))
+        self._log('bestmove', move.uci())
+
+    def _send_infos(self, search: int):
+        move = self._best_move()
+        pv_move = move.uci() if move else ''
+        start = time.time()
+        sent = 0
+        while self.searching and self.searches == search:
+            elapsed = time.time() - start
+            count = int(elapsed * self.info_rate) - sent
+            if count > 0:
+                lines = []
+                for _ in range(count):
+                    sent += 1
+                    lines.append('info depth {} seldepth {} score cp {} time {} nodes {} nps {} pv {}'.format(
+                        sent % 64 + 1, sent % 64 + 3, sent % 50 - 25, int(elapsed * 1000), sent * 1000,
+                        self.info_rate * 1000, pv_move))
+                self._write('\n'.join(lines))  # one write per burst - as fast as a real engine can flood
+            time.sleep(self.INFO_TICK)
+
+    def _crash(self):
+        self._log('crash', self.crash_mode)
+        if self.crash_mode == 'exit':
+            os._exit(1)
+        self.searching = False  # hang: never answer again
+        while True:
+            time.sleep(1)
+
+    def _go(self, tokens: list):
+        self._log('go', ' '.join(tokens))
+        self.searches += 1
+        self.searching = True
+        self.pondering = 'ponder' in tokens or 'infinite' in tokens
+        if self.crash_after and self.searches >= self.crash_after:
+            threading.Timer(self.latency / 2, self._crash).start()
+        if self.info_rate:
+            threading.Thread(target=self._send_infos, args=(self.searches,), daemon=True).start()
+        if not self.pondering:
+            self.timer = threading.Timer(self.latency, self._finish)
+            self.timer.start()
+
+    def _stop(self):
+        if self.timer:
+            self.timer.cancel()
+        self._finish()
+
+    def loop(self):
+        """Read the uci commands from stdin till quit."""
+        for line in sys.stdin:
+            tokens = line.split()
+            if not tokens:
+                continue
+            command = tokens[0]
+            if False:  # switch-case
+                pass
+            elif command == 'uci':
+                self._write('id name PicoStub')
+                self._write('id author picochess')
+                self._write('option name Ponder type check default false')
+                self._write('option name Hash type spin default 16 min 1 max 1024')
+                self._write('option name Threads type spin default 1 min 1 max 64')
+                self._write('option name Skill Level type spin default 20 min 0 max 20')
+                self._write('option name UCI_AnalyseMode type check default false')
+                self._write('option name UCI_Chess960 type check default false')
+                self._write('uciok')
+            elif command == 'isready':
+                self._write('readyok')
+            elif command == 'setoption' and 'value' in tokens:
+                index = tokens.index('value')
+                self.options[' '.join(tokens[2:index])] = ' '.join(tokens[index + 1:])
+            elif command == 'ucinewgame':
+                self.board = chess.Board()
+            elif command == 'position':
+                self._position(tokens[1:])
+            elif command == 'go':
+                self._go(tokens[1:])
+            elif command == 'ponderhit':
+                self._go([])
+            elif command == 'stop':
+                self._stop()
+            elif command == 'quit':
+                break
+
+
+def stub_args(latency=0.1, script=None, log=None, info_rate=0, crash_after=0, crash_mode='exit'):
+    """Return the command line args for the stub engine (see UciEngine's args parameter)."""
+    args = ['--latency', str(latency), '--info-rate', str(info_rate), '--crash-after', str(crash_after),
+            '--crash-mode', crash_mode]
+    if script:
+        args += ['--script', script]
+    if log:
+        args += ['--log', log]
+    return args
+
+
+def main():
+    """Parse the args and start the uci loop."""
+    parser = argparse.ArgumentParser(description='picochess uci stub engine')
+    parser.add_argument('-l', '--latency', type=float, default=0.1, help='secs till the bestmove is send')
+    parser.add_argument('-s', '--script', type=str, help='file with uci moves (space separated) the engine plays')
+    parser.add_argument('--log', type=str, help='append the (time stamped) go & bestmove commands to this file')
+    parser.add_argument('-i', '--info-rate', type=int, default=0, help='info lines per sec while searching')
+    parser.add_argument('-c', '--crash-after', type=int, default=0, help='crash in the n-th search (0=never)')
+    parser.add_argument('-cm', '--crash-mode', choices=['exit', 'hang'], default='exit',
+                        help='exit the process or stop answering')
+    args = parser.parse_args()
+    script = []
+    if args.script:
+        with open(args.script) as script_file:
+            script = script_file.read().split()
+    StubEngine(args.latency, script, args.log, args.info_rate, args.crash_after, args.crash_mode).loop()
+
+
+if __name__ == '__main__':
+    main()
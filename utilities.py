@@ -25,10 +25,15 @@ import json
 import time
 import copy
 import configparser
+import itertools
+import threading
+import heapq
+from collections import deque, defaultdict
 
 from threading import Timer
 from subprocess import Popen, PIPE
 
+from logpipe import log_pipeline
 from dgt.translate import DgtTranslate
 from dgt.api import Dgt, Event, Message
 
@@ -37,13 +42,246 @@ from configobj import ConfigObj, ConfigObjError, DuplicateError
 # picochess version
 version = '09p'
 
-evtobserver_queue = queue.Queue()
+
+class EventQueue(object):
+
+    """Main event queue - user/board/engine events before clock times before engine infos (merged in place)."""
+
+    PRIO_USER = 0  # board, buttons, menu, best move... (FIFO between them - they change the game state)
+    PRIO_CLOCK = 1  # clock times - only the newest per device matters
+    PRIO_INFO = 2  # engine pv/score/depth/analysis - only the newest per kind matters
+
+    def __init__(self, maxsize=1000):
+        super(EventQueue, self).__init__()
+        self.maxsize = maxsize
+        self.heap = []  # entries: [prio, seq, event, put time, merge key, valid]
+        self.pending = {}  # merge key => entry
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.size = 0
+        self.stats_prio = {prio: {'count': 0, 'total': 0.0, 'max': 0.0}
+                           for prio in (self.PRIO_USER, self.PRIO_CLOCK, self.PRIO_INFO)}
+        self.merged = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.overflow = 0
+
+    def _classify(self, event):
+        """Return the priority and the merge key (or None) of an event."""
+        if isinstance(event, (Event.NEW_PV, Event.NEW_SCORE, Event.NEW_DEPTH, Event.NEW_ANALYSIS)):
+            return self.PRIO_INFO, repr(event)
+        if isinstance(event, Event.CLOCK_TIME):
+            return self.PRIO_CLOCK, repr(event) + event.dev
+        return self.PRIO_USER, None
+
+    def _flush_infos(self):
+        """Move the last (merged) infos of a finished search in front of its end event - and close them for merges."""
+        for key, entry in list(self.pending.items()):
+            if entry[0] == self.PRIO_INFO:
+                entry[-1] = False
+                del self.pending[key]
+                # same age as before, but the priority of the end event => delivered right before it
+                heapq.heappush(self.heap, [self.PRIO_USER, entry[1], entry[2], entry[3], None, True])
+                self.flushed += 1
+
+    def _drop_lowest(self):
+        """Queue is full - remove the oldest info or clock entry, return False if there is none."""
+        valids = [entry for entry in self.heap if entry[-1] and entry[0] != self.PRIO_USER]
+        if not valids:
+            return False  # user events change the game state - they are never dropped
+        entry = max(valids, key=lambda ent: (ent[0], -ent[1]))
+        entry[-1] = False
+        self.pending.pop(entry[4], None)
+        self.size -= 1
+        self.dropped += 1
+        logging.warning('event queue full - dropped %s', entry[2])
+        return True
+
+    def put(self, event, block=True, timeout=None):
+        """Put an event on the queue - never blocks (a full queue drops an info/clock event or grows)."""
+        prio, key = self._classify(event)
+        with self.condition:
+            if isinstance(event, (Event.BEST_MOVE, Event.STOP_SEARCH)):
+                self._flush_infos()
+            if key in self.pending:
+                self.pending[key][2] = event  # keep the place in the queue, but show the newest values
+                self.merged += 1
+                return
+            if self.size >= self.maxsize and not self._drop_lowest():
+                if self.size == self.maxsize:  # log it once per overflow
+                    logging.warning('event queue full of user events - growing past %i', self.maxsize)
+                self.overflow += 1
+            entry = [prio, next(self.counter), event, time.monotonic(), key, True]
+            if key:
+                self.pending[key] = entry
+            heapq.heappush(self.heap, entry)
+            self.size += 1
+            self.condition.notify()
+
+    def get(self, block=True, timeout=None):
+        """Return the most important (and then oldest) event."""
+        with self.condition:
+            end = None if timeout is None else time.monotonic() + timeout
+            while True:
+                while self.heap and not self.heap[0][-1]:
+                    heapq.heappop(self.heap)
+                if self.heap:
+                    break
+                remaining = None if end is None else end - time.monotonic()
+                if not block or (remaining is not None and remaining <= 0):
+                    raise queue.Empty
+                self.condition.wait(remaining)
+            prio, _, event, put_time, key, _ = heapq.heappop(self.heap)
+            if key:
+                del self.pending[key]
+            self.size -= 1
+            wait = time.monotonic() - put_time
+            stats = self.stats_prio[prio]
+            stats['count'] += 1
+            stats['total'] += wait
+            stats['max'] = max(stats['max'], wait)
+            return event
+
+    def task_done(self):
+        """Compatibility with queue.Queue."""
+        pass
+
+    def qsize(self):
+        """Return the number of waiting events."""
+        return self.size
+
+    def empty(self):
+        """Return if no event is waiting."""
+        return self.size == 0
+
+    def stats(self):
+        """Return the queue latency stats (in ms) per priority plus the merged & dropped counters."""
+        with self.condition:
+            result = {'size': self.size, 'merged': self.merged, 'flushed': self.flushed, 'dropped': self.dropped,
+                      'overflow': self.overflow}
+            for prio, name in ((self.PRIO_USER, 'user'), (self.PRIO_CLOCK, 'clock'), (self.PRIO_INFO, 'info')):
+                stats = self.stats_prio[prio]
+                avg = stats['total'] / stats['count'] if stats['count'] else 0.0
+                result[name] = {'count': stats['count'], 'avg_ms': round(avg * 1000, 3),
+                                'max_ms': round(stats['max'] * 1000, 3)}
+            return result
+
+
+evtobserver_queue = EventQueue()
 dgtobserver_queue = queue.Queue()
 
 msgdisplay_devices = []
 dgtdisplay_devices = []
 
 
+class Tracer(object):
+
+    """Follow each event through the pipeline (event => message => dgt) - cheap enough to always stay on."""
+
+    def __init__(self, size=4096):
+        super(Tracer, self).__init__()
+        self.enabled = True
+        self.records = deque(maxlen=size)  # (trace_id, stage, type, monotonic time, queue depth)
+        self.max_depth = defaultdict(int)
+        self.ids = itertools.count(1)
+        self.local = threading.local()
+
+    def current(self):
+        """Return the trace id the running thread is working on (or 0)."""
+        return getattr(self.local, 'trace_id', 0)
+
+    def set_current(self, trace_id: int):
+        """Set the trace id the running thread is working on."""
+        self.local.trace_id = trace_id
+
+    def tag(self, obj):
+        """Give an Event/Message/Dgt the trace id of the running thread or a new one."""
+        if not obj.trace_id:
+            obj.trace_id = self.current() or next(self.ids)
+
+    def stamp(self, obj, stage: str, que=None):
+        """Record that obj reached stage - and the depth of its queue."""
+        if self.enabled:
+            depth = que.qsize() if que else -1
+            if depth > self.max_depth[stage]:
+                self.max_depth[stage] = depth
+            self.records.append((obj.trace_id, stage, repr(obj), time.monotonic(), depth))
+
+    def mark(self, stage: str, name: str):
+        """Record a stage (without an Event/Message/Dgt object) for the running trace."""
+        if self.enabled:
+            self.records.append((self.current(), stage, name, time.monotonic(), -1))
+
+    def gauges(self):
+        """Return the current (and max seen) queue depths."""
+        current = {'evt_queue': evtobserver_queue.qsize(), 'dgt_queue': dgtobserver_queue.qsize()}
+        for display in msgdisplay_devices:
+            current['msg_queue ' + display.__class__.__name__] = display.msg_queue.qsize()
+        for display in dgtdisplay_devices:
+            current['dgt_queue ' + display.__class__.__name__] = display.dgt_queue.qsize()
+        return {'current': current, 'max': dict(self.max_depth)}
+
+    def traces(self, limit=50):
+        """Return the last traces - each with its stages (in ms since the first one)."""
+        grouped = {}
+        for trace_id, stage, name, stamp, depth in list(self.records):
+            grouped.setdefault(trace_id, []).append((stage, name, stamp, depth))
+        result = []
+        for trace_id in sorted(grouped)[-limit:]:
+            stages = grouped[trace_id]
+            first = stages[0][2]
+            result.append({'id': trace_id, 'total_ms': round((stages[-1][2] - first) * 1000, 3),
+                           'stages': [{'stage': stage, 'type': name, 'ms': round((stamp - first) * 1000, 3),
+                                       'depth': depth} for stage, name, stamp, depth in stages]})
+        return result
+
+
+tracer = Tracer()
+
+
+class EventDispatcher(object):
+
+    """Call the handler function registered for an event class - and count the time spent in each handler."""
+
+    def __init__(self):
+        super(EventDispatcher, self).__init__()
+        self.handlers = {}  # event class => handler function
+        self.timings = {}  # event class => [name, count, total secs, max secs]
+
+    def register(self, handlers: dict):
+        """Register the handler functions for the event classes."""
+        self.handlers.update(handlers)
+
+    def dispatch(self, event):
+        """Call the handler for the event - return False if there is none."""
+        evt_class = type(event)
+        handler = self.handlers.get(evt_class)
+        if handler is None:
+            return False
+        start = time.perf_counter()
+        handler(event)
+        secs = time.perf_counter() - start
+        timing = self.timings.get(evt_class)
+        if timing is None:
+            timing = self.timings[evt_class] = [repr(event), 0, 0.0, 0.0]
+        timing[1] += 1
+        timing[2] += secs
+        if secs > timing[3]:
+            timing[3] = secs
+        return True
+
+    def stats(self):
+        """Return the handler timings (in ms) - the most expensive handler first."""
+        result = []
+        for name, count, total, maxi in sorted(self.timings.values(), key=lambda timing: timing[2], reverse=True):
+            result.append({'event': name, 'count': count, 'total_ms': round(total * 1000, 3),
+                           'avg_ms': round(total / count * 1000, 3), 'max_ms': round(maxi * 1000, 3)})
+        return result
+
+
+evt_dispatcher = EventDispatcher()
+
+
 class EvtObserver(object):
 
     """Input devices are observable."""
@@ -54,6 +292,8 @@ class EvtObserver(object):
     @staticmethod
     def fire(evt: Event):
         """Put an event on the Queue."""
+        tracer.tag(evt)
+        tracer.stamp(evt, 'evt_fire', evtobserver_queue)
         evtobserver_queue.put(copy.deepcopy(evt))
 
 
@@ -67,6 +307,8 @@ class DgtObserver(object):
     @staticmethod
     def fire(dgt: Dgt):
         """Put an event on the Queue."""
+        tracer.tag(dgt)
+        tracer.stamp(dgt, 'dgt_fire', dgtobserver_queue)
         dgtobserver_queue.put(copy.deepcopy(dgt))
 
 
@@ -77,13 +319,27 @@ class MsgDisplay(object):
     def __init__(self):
         super(MsgDisplay, self).__init__()
         self.msg_queue = queue.Queue()
+        self.handlers = {}  # message class => handler function
         msgdisplay_devices.append(self)
 
+    def subscribe(self, handlers: dict):
+        """Register the handler functions for the message classes this device wants to receive."""
+        self.handlers.update(handlers)
+
+    def dispatch(self, message):
+        """Call the handler function registered for the message class."""
+        handler = self.handlers.get(type(message))
+        if handler:
+            handler(message)
+
     @staticmethod
     def show(msg: Message):
-        """Send a message on each display device."""
+        """Send a message on each display device which subscribed to its class."""
+        tracer.tag(msg)
+        tracer.stamp(msg, 'msg_show')
         for display in msgdisplay_devices:
-            display.msg_queue.put(copy.deepcopy(msg))
+            if type(msg) in display.handlers:
+                display.msg_queue.put(copy.deepcopy(msg))
 
 
 class DgtDisplay(object):
@@ -98,6 +354,7 @@ class DgtDisplay(object):
     @staticmethod
     def show(dgt: Dgt):
         """Send a message on each display device."""
+        tracer.stamp(dgt, 'dgt_show')
         for display in dgtdisplay_devices:
             display.dgt_queue.put(copy.deepcopy(dgt))
 
@@ -233,6 +490,8 @@ def shutdown(dgtpi: bool, dev: str):
     """Shutdown picochess."""
     logging.debug('shutting down system requested by (%s)', dev)
     time.sleep(3)  # give some time to send out the pgn file or speak the event
+    ini_store.flush()
+    log_pipeline.stop()
     if platform.system() == 'Windows':
         os.system('shutdown /s')
     elif dgtpi:
@@ -245,6 +504,8 @@ def reboot(dgtpi: bool, dev: str):
     """Reboot picochess."""
     logging.debug('rebooting system requested by (%s)', dev)
     time.sleep(3)  # give some time to send out the pgn file or speak the event
+    ini_store.flush()
+    log_pipeline.stop()
     if platform.system() == 'Windows':
         os.system('shutdown /r')
     elif dgtpi:
@@ -253,30 +514,180 @@ def reboot(dgtpi: bool, dev: str):
         os.system('reboot')
 
 
-def get_location():
-    """Return the location of the user and the external and interal ip adr."""
+def get_internal_ip():
+    """Return the internal ip adr (no packet is send, the socket only picks the outgoing interface)."""
     try:
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.settimeout(2)
         sock.connect(('8.8.8.8', 80))
         int_ip = sock.getsockname()[0]
         sock.close()
+        return int_ip
+    except OSError:
+        return None
 
-        response = urllib.request.urlopen('http://will6.de/freegeoip')
+
+def get_location(timeout=5):
+    """Return the location of the user and the external and interal ip adr."""
+    int_ip = get_internal_ip()
+    if int_ip is None:  # no network at all - dont wait for the timeout
+        return '?', None, None
+    try:
+        response = urllib.request.urlopen('http://will6.de/freegeoip', timeout=timeout)
         j = json.loads(response.read().decode())
         country_name = j['country_name'] + ' ' if 'country_name' in j else ''
         country_code = j['country_code'] + ' ' if 'country_code' in j else ''
         ext_ip = j['ip'] if 'ip' in j else None
         city = j['city'] + ', ' if 'city' in j else ''
         return (city + country_name + country_code).strip(), ext_ip, int_ip
-    except:
-        return '?', None, None
+    except (OSError, ValueError):
+        return '?', None, int_ip
+
+
+class LocationService(object):
+
+    """Provide the location & ip info at once from a cache file and refresh it in the background."""
+
+    RETRY_DELAYS = (0, 10, 20, 40, 80)  # network devices of a RaspberryPi need some time after a boot
+
+    def __init__(self, location='auto', cache_file='location.json', timeout=5):
+        super(LocationService, self).__init__()
+        self.location = location  # 'auto' => lookup online, everything else is used as offline location
+        self.cache_file = cache_file
+        self.timeout = timeout
+        self.timer = None
+
+    def cached(self):
+        """Return the last known info (or an empty one)."""
+        info = {'location': '?', 'ext_ip': None, 'int_ip': None}
+        try:
+            with open(self.cache_file) as cache:
+                info.update(json.load(cache))
+        except (OSError, ValueError):
+            pass
+        if self.location != 'auto':
+            info['location'] = self.location
+            info['ext_ip'] = None
+        return info
+
+    def _save(self, info: dict):
+        tmp_file = self.cache_file + '.tmp'
+        try:
+            with open(tmp_file, 'w') as cache:
+                json.dump(info, cache)
+            os.replace(tmp_file, self.cache_file)
+        except OSError:
+            logging.warning('cant write location cache [%s]', self.cache_file)
+
+    def _lookup(self, callback, tries: int):
+        if self.location == 'auto':
+            location, ext_ip, int_ip = get_location(self.timeout)
+            success = ext_ip is not None
+        else:
+            location, ext_ip, int_ip = self.location, None, get_internal_ip()
+            success = int_ip is not None
+        if success:
+            info = {'location': location, 'ext_ip': ext_ip, 'int_ip': int_ip}
+            if info != self.cached():
+                self._save(info)
+                callback(info)
+        elif tries < len(self.RETRY_DELAYS):
+            logging.debug('location lookup failed - retry in %isecs', self.RETRY_DELAYS[tries])
+            self._schedule(callback, tries)
+        else:
+            logging.info('location lookup failed - keep the cached info')
+
+    def _schedule(self, callback, tries: int):
+        self.timer = Timer(self.RETRY_DELAYS[tries], self._lookup, [callback, tries + 1])
+        self.timer.daemon = True
+        self.timer.start()
+
+    def refresh(self, callback):
+        """Lookup the info in the background - callback gets the info only if it changed."""
+        self._schedule(callback, 0)
+
+
+class IniStore(object):
+
+    """Collect the changes of picochess.ini and write them together (atomic) from a timer thread."""
+
+    DELETE = object()  # value of a pending key removal
+
+    def __init__(self, file_name='picochess.ini', delay=0.5):
+        super(IniStore, self).__init__()
+        self.file_name = file_name
+        self.delay = delay  # secs to wait for more changes (for example new level & new engine)
+        self.pending = {}  # key => value (or DELETE)
+        self.config = None  # ConfigObj as last written (reloaded if the file changed meanwhile)
+        self.mtime = None
+        self.timer = None
+        self.lock = threading.Lock()  # protects pending & timer
+        self.write_lock = threading.Lock()
+        self.writes = 0
+        self.changes = 0
+
+    def set(self, key: str, value):
+        """Set key to value - written after a short delay."""
+        with self.lock:
+            self.pending[key] = value
+            self.changes += 1
+            if self.timer:
+                self.timer.cancel()
+            self.timer = Timer(self.delay, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def delete(self, key: str):
+        """Remove key - written after a short delay."""
+        self.set(key, self.DELETE)
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.file_name)
+        except OSError:
+            mtime = None
+        if self.config is None or mtime != self.mtime:  # edited by hand (or another tool) meanwhile
+            self.config = ConfigObj(self.file_name)
+        return self.config
+
+    def flush(self):
+        """Write the pending changes now."""
+        with self.write_lock:
+            with self.lock:
+                if self.timer:
+                    self.timer.cancel()
+                    self.timer = None
+                pending, self.pending = self.pending, {}
+            if not pending:
+                return
+            try:
+                config = self._load()
+                for key, value in pending.items():
+                    if value is self.DELETE:
+                        config.pop(key, None)
+                    else:
+                        config[key] = value
+                temp_name = self.file_name + '.tmp'
+                with open(temp_name, 'wb') as file:
+                    config.write(file)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(temp_name, self.file_name)  # a power loss leaves the old or the new file - never a half one
+                self.mtime = os.path.getmtime(self.file_name)
+                self.writes += 1
+                logging.debug('written %s to %s', sorted(pending), self.file_name)
+            except (ConfigObjError, DuplicateError, OSError) as conf_exc:
+                self.config = None
+                logging.exception(conf_exc)
+
+    def stats(self):
+        """Return the number of changes and the file writes they needed."""
+        return {'changes': self.changes, 'writes': self.writes, 'pending': len(self.pending)}
+
+
+ini_store = IniStore()
 
 
 def write_picochess_ini(key: str, value):
     """Update picochess.ini config file with key/value."""
-    try:
-        config = ConfigObj('picochess.ini')
-        config[key] = value
-        config.write()
-    except (ConfigObjError, DuplicateError) as conf_exc:
-        logging.exception(conf_exc)
+    ini_store.set(key, value)
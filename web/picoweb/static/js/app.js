@@ -1431,6 +1431,33 @@ function multiPvDecrease() {
     }
 }
 
+function updateServerAnalysis(data) {
+    // multipv lines of the picochess engine - the browser engine (if running) owns the pv boxes
+    if (window.analysis) {
+        return;
+    }
+    if (data.reset) {
+        $('#pv_output').children().html('');
+        window.server_lines = {};
+    }
+    $.each(data.removed, function(index, num) {
+        $('#pv_' + num).html('');
+        delete window.server_lines[num];
+    });
+    $.each(data.lines, function(num, line) {
+        if (!$('#pv_' + num).length) {
+            $('#pv_output').append('<div id="pv_' + num + '" style="margin-bottom: 3vh;"></div>');
+        }
+        var score = line[2] !== null ? 'mate ' + line[2] : 'cp ' + (line[1] || 0);
+        var output = formatEngineOutput('info depth ' + line[0] + ' multipv ' + num + ' score ' + score + ' pv ' + line[3]);
+        if (output && output.pv_index) {
+            $('#pv_' + output.pv_index).html(output.line);
+        }
+        window.server_lines[num] = true;
+    });
+    $('#engineMultiPVStatus').html(Object.keys(window.server_lines).length + " line(s)");
+}
+
 function importPv(multipv) {
     stopAnalysis();
     var tmpGame = createGamePointer();
@@ -1687,6 +1714,7 @@ $(function() {
     });
     window.engine_lines = {};
     window.multipv = 1;
+    window.server_lines = {};
 
 // remote begin
     setOutsideRoom();
@@ -1777,6 +1805,9 @@ $(function() {
                 case 'Broadcast':
                     boardStatusEl.html(data.msg);
                     break;
+                case 'Analysis':
+                    updateServerAnalysis(data);
+                    break;
                 default:
                     console.warn(data);
             }